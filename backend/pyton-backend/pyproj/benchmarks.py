@@ -0,0 +1,1238 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the dashboard data path, on synthetic data.
+Run from: backend/pyton-backend/pyproj/
+
+    python3 benchmarks.py frame --rows 1000000
+    python3 benchmarks.py rules --rows 1000000
+    python3 benchmarks.py timestamps --rows 500000
+    python3 benchmarks.py future-labels --rows 100000 --screenshots 50000
+    python3 benchmarks.py idle --rows 500000
+    python3 benchmarks.py sections --rows 1000000 --budget-ms 5000
+    python3 benchmarks.py switches --rows 1000000
+    python3 benchmarks.py metrics-load --rows 1000000
+    python3 benchmarks.py columns --rows 44640
+    python3 benchmarks.py partitions --days 30
+    python3 benchmarks.py range --days 90
+    python3 benchmarks.py rollup --days 90
+    python3 benchmarks.py storage --days 14
+    python3 benchmarks.py journal --processes 4 --threads 8 --appends 250
+    python3 benchmarks.py analyze --jobs 400 --workers 4 --queue 32
+    python3 benchmarks.py label-cache --captures 240
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add project to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+import pandas as pd
+from PIL import Image, ImageDraw
+
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pyproj.settings')
+django.setup()
+
+from django.db import connection
+from django.utils import timezone as dj_timezone
+
+from pyapp.services import activity_processor, dashboard_data
+from pyapp.services import analyze_jobs, journal, label_cache, log_partitions, metrics_columns, metrics_snapshot, sql_store, switch_analytics
+from pyapp.services.activity_frame import COLUMNS, ActivityFrame
+from pyapp.services.activity_rollup import HourlyRollup
+from pyapp.services.productivity_rules import DEFAULT_RULES, RuleSet
+from pyapp.services.timestamp_decoder import TimestampDecoder
+from pyapp.utils import script_combiner
+
+APPS = [
+    ("Visual Studio Code", ["main.py — stormhacks2025", "dashboard_data.py — stormhacks2025"]),
+    ("Google Chrome", ["YouTube - Lofi Beats", "Stack Overflow - pandas merge_asof", "Reddit - r/python"]),
+    ("Slack", ["#general — StormHacks", "DM — teammate"]),
+    ("Notion", ["Weekly Planner — University"]),
+    ("Spotify", ["Discover Weekly"]),
+    ("Terminal", ["zsh — pyproj"]),
+    ("Figma", ["Tracklet dashboard"]),
+]
+
+
+def banner(title: str) -> None:
+    print("=" * 60)
+    print(title)
+    print("=" * 60)
+
+
+def timed(label: str, func, *args, repeat: int = 1):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    print(f"   {label:<40} {best * 1000:10.1f} ms")
+    return result
+
+
+def traced(label: str, func, *args):
+    gc.collect()
+    tracemalloc.start()
+    result = func(*args)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"   {label:<40} {current / 1e6:10.1f} MB (peak {peak / 1e6:.1f} MB)")
+    return result
+
+
+def synthetic_activity_rows(count: int, seed: int = 7) -> list[tuple]:
+    """Decoded activity rows at a 5 second cadence, in local time."""
+    rng = random.Random(seed)
+    local_tz = dj_timezone.get_current_timezone()
+    start = datetime(2025, 10, 5, 8, 0, 0, tzinfo=local_tz)
+    offset = int(start.utcoffset().total_seconds())
+    epoch0 = int(start.timestamp())
+    rows = []
+    app, windows = APPS[0]
+    for idx in range(count):
+        if rng.random() < 0.05:
+            app, windows = rng.choice(APPS)
+        idle = 0.0 if rng.random() < 0.8 else float(rng.randint(1, 30))
+        rows.append((epoch0 + idx * 5, offset, None, app, rng.choice(windows), idle))
+    return rows
+
+
+def build_frame(rows: list[tuple]) -> ActivityFrame:
+    frame = ActivityFrame()
+    activity_processor._append_rows(frame, rows)
+    return frame
+
+
+def build_dicts(frame: ActivityFrame) -> list[dict]:
+    return [frame.record(idx) for idx in range(len(frame))]
+
+
+def legacy_hourly_productivity(activities: list[dict]) -> list[dict]:
+    hourly = defaultdict(lambda: {"productive": 0.0, "unproductive": 0.0, "neutral": 0.0})
+    for record in activities:
+        hourly[record["timestamp_hour"]][record["productivity"]] += record["active_seconds"]
+    result = []
+    for hour in sorted(hourly):
+        data = hourly[hour]
+        total = sum(data.values())
+        result.append({
+            "hour": hour.isoformat(),
+            "productive": round(data["productive"] / total * 100, 2) if total else 0.0,
+            "unproductive": round(data["unproductive"] / total * 100, 2) if total else 0.0,
+        })
+    return result
+
+
+def legacy_context_switches(activities: list[dict]) -> list[dict]:
+    hourly = defaultdict(int)
+    prev_app = None
+    for record in activities:
+        if prev_app is not None and prev_app != record["app_name"]:
+            hourly[record["timestamp_hour"]] += 1
+        prev_app = record["app_name"]
+    return [{"hour": hour.isoformat(), "switches": hourly[hour]} for hour in sorted(hourly)]
+
+
+def build_sections(agg) -> None:
+    activity_processor.build_overview_data(agg)
+    activity_processor.build_timeline_data(agg)
+    activity_processor.compute_context_switches(agg)
+
+
+def legacy_classify_productivity(app_name: str, window_title: str) -> str:
+    """The per-call heuristic load_activity_data used before productivity_rules."""
+    app_lower = app_name.lower()
+    window_lower = window_title.lower()
+    productive_apps = {"cursor", "vs code", "terminal", "figma", "github"}
+    productive_patterns = ["stormhacks", "code", "development", "programming"]
+    unproductive_apps = {"spotify"}
+    unproductive_patterns = ["youtube", "twitter", "facebook", "reddit", "qualifying highlights"]
+    if any(prod in app_lower for prod in productive_apps):
+        return "productive"
+    if any(pattern in window_lower for pattern in productive_patterns):
+        return "productive"
+    if any(unprod in app_lower for unprod in unproductive_apps):
+        return "unproductive"
+    if any(pattern in window_lower for pattern in unproductive_patterns):
+        return "unproductive"
+    return "neutral"
+
+
+def bench_rules(args) -> None:
+    banner(f"Productivity rules engine vs legacy heuristic at {args.rows:,} lines")
+    pairs = [(row[3], row[4]) for row in synthetic_activity_rows(args.rows)]
+    ruleset = RuleSet(list(DEFAULT_RULES))
+
+    legacy = timed("legacy _classify_productivity", lambda: [legacy_classify_productivity(*p) for p in pairs])
+    compiled = timed("compiled rules + LRU", lambda: [ruleset.classify(*p) for p in pairs])
+    info = ruleset.classify.cache_info()
+    print(f"   LRU hits={info.hits:,} misses={info.misses:,}")
+
+    uncached = RuleSet(list(DEFAULT_RULES))
+    timed("compiled rules, no memo", lambda: [uncached._classify(*p) for p in pairs])
+
+    same = legacy == compiled
+    print(f"\n   Verdicts identical: {same}")
+    if not same:
+        sys.exit(1)
+
+
+def legacy_decode_timestamp(ts_str: str):
+    """Per-line path load_activity_data used before TimestampDecoder."""
+    dt = activity_processor._parse_iso_timestamp(ts_str)
+    if not dt:
+        return None
+    local_tz = dj_timezone.get_current_timezone()
+    dt_local = dt.astimezone(local_tz)
+    return int(dt_local.timestamp() // 1), int(dt_local.utcoffset().total_seconds())
+
+
+def bench_timestamps(args) -> None:
+    banner(f"Timestamp decoding at {args.rows:,} tracker timestamps")
+    local_tz = dj_timezone.get_current_timezone()
+    start = datetime(2025, 10, 5, 8, 0, 0)
+    # Spans the November DST change so the per-day offset cache is exercised
+    texts = [(start + timedelta(seconds=idx * 30)).isoformat() for idx in range(args.rows)]
+
+    legacy = timed("per-line fromisoformat + make_aware", lambda: [legacy_decode_timestamp(t) for t in texts])
+    decoder = TimestampDecoder(local_tz)
+    single = timed("TimestampDecoder.decode", lambda: [decoder.decode(t)[:2] for t in texts])
+    batch = timed("TimestampDecoder.decode_many", lambda: TimestampDecoder(local_tz).decode_many(texts))
+
+    same = legacy == single == list(zip(batch[0].tolist(), batch[1].tolist()))
+    print(f"\n   Outputs identical: {same}")
+    if not same:
+        sys.exit(1)
+
+
+def synthetic_combiner_frames(rows: int, screenshots: int, seed: int = 7) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    A post-backward-merge frame (about a third "unknown") and a screenshot log,
+    both minute-floored like _normalise_timestamps leaves them.
+    """
+    rng = np.random.default_rng(seed)
+    pairs = [(app, window) for app, windows in APPS for window in windows]
+    start = pd.Timestamp("2025-10-05 08:00")
+    span = rows // 2
+
+    act_pair = rng.integers(0, len(pairs), rows)
+    merged = pd.DataFrame({
+        "timestamp": start + pd.to_timedelta(np.sort(rng.integers(0, span, rows)), unit="min"),
+        "app_name_x": [pairs[i][0] for i in act_pair],
+        "window_title_x": [pairs[i][1] for i in act_pair],
+        "productive": np.where(rng.random(rows) < 0.35, "unknown", "true").astype(object),
+    })
+
+    ss_pair = rng.integers(0, len(pairs), screenshots)
+    ss_df = pd.DataFrame({
+        "timestamp": start + pd.to_timedelta(np.sort(rng.integers(0, span, screenshots)), unit="min"),
+        "app_name": [pairs[i][0] for i in ss_pair],
+        "window_title": [pairs[i][1] for i in ss_pair],
+        "productive": rng.choice(np.array([True, False, None], dtype=object), screenshots, p=[0.45, 0.45, 0.1]),
+    })
+    return merged, ss_df
+
+
+def legacy_infer_future_labels(merged: pd.DataFrame, ss_df: pd.DataFrame) -> pd.Series:
+    """The per-row apply label_activity_with_productivity used before merge_asof."""
+
+    def infer_future_label(row):
+        if row["productive"] != "unknown":
+            return row["productive"]
+
+        future_ss = ss_df[
+            (ss_df["timestamp"] > row["timestamp"])
+            & (ss_df["app_name"] == row.get("app_name_x"))
+            & (ss_df["window_title"] == row.get("window_title_x"))
+        ]
+        if not future_ss.empty:
+            future_ss = future_ss.sort_values("timestamp", kind="stable")
+            return future_ss.iloc[0]["productive"]
+        return "unknown"
+
+    return merged.apply(infer_future_label, axis=1)
+
+
+def bench_future_labels(args) -> None:
+    banner(f"Future-label inference at {args.rows:,} activity x {args.screenshots:,} screenshot rows")
+    merged, ss_df = synthetic_combiner_frames(args.rows, args.screenshots)
+    unknown = int((merged["productive"] == "unknown").sum())
+    print(f"   unknown rows: {unknown:,}")
+
+    timed("forward merge_asof (all rows)", script_combiner._infer_future_labels, merged, ss_df)
+
+    # The row-apply is O(unknown x screenshots), so it only runs on a prefix
+    sample = merged.head(args.legacy_rows).reset_index(drop=True)
+    sample_unknown = max(int((sample["productive"] == "unknown").sum()), 1)
+    start = time.perf_counter()
+    legacy_infer_future_labels(sample, ss_df)
+    elapsed = time.perf_counter() - start
+    print(f"   {f'row-apply ({len(sample):,} rows)':<40} {elapsed * 1000:10.1f} ms")
+    print(f"   {'row-apply (extrapolated, all rows)':<40} {elapsed * unknown / sample_unknown * 1000:10.1f} ms")
+
+
+def synthetic_metrics_frame(rows: int, seed: int = 7) -> pd.DataFrame:
+    """
+    A metrics.jsonl-shaped frame as pd.read_json returns it: one row a minute,
+    labels mostly true/false, and occasional stretches of long idle.
+    """
+    rng = np.random.default_rng(seed)
+    pairs = [(app, window) for app, windows in APPS for window in windows]
+    pair = rng.integers(0, len(pairs), rows)
+    idle = rng.choice([0, 0, 0, 5, 10, 20, 30], rows).astype(float)
+    # ~1% of rows start a run of 1-20 long-idle minutes
+    for start in np.flatnonzero(rng.random(rows) < 0.01):
+        idle[start:start + rng.integers(1, 21)] = rng.integers(300, 1500)
+    return pd.DataFrame({
+        "timestamp": pd.Timestamp("2025-10-05 08:00") + pd.to_timedelta(np.arange(rows), unit="min"),
+        "app_name": [pairs[i][0] for i in pair],
+        "window_title": [pairs[i][1] for i in pair],
+        "idle_seconds": idle,
+        "source_app_name": [pairs[i][0] for i in pair],
+        "source_window_title": [pairs[i][1] for i in pair],
+        "productive": rng.choice(np.array([True, False, "unknown"], dtype=object), rows, p=[0.5, 0.45, 0.05]),
+    })
+
+
+def legacy_idle_section(df: pd.DataFrame, threshold_seconds: int) -> dict:
+    """build_idle_section as it was before run-length segmentation."""
+    idle_group = df.groupby("timestamp_hour")["idle_seconds"].sum().reset_index(name="idle_seconds")
+    idle_points = [
+        {"name": row["timestamp_hour"].strftime("%H:%M"), "idleMin": round(row["idle_seconds"] / 60.0, 2)}
+        for _, row in idle_group.iterrows()
+    ]
+    long_breaks = []
+    current_break = None
+
+    def close(current):
+        duration = (current["end"] - current["start"]).total_seconds() / 60.0
+        return {
+            "start": current["start"].isoformat(),
+            "end": current["end"].isoformat(),
+            "durationMin": int(round(duration)),
+            "reason": "Extended idle",
+        }, duration
+
+    for _, row in df.iterrows():
+        idle_seconds = float(row["idle_seconds"])
+        ts = row["timestamp"]
+        if idle_seconds >= threshold_seconds:
+            start_time = ts - timedelta(seconds=idle_seconds)
+            if current_break is None:
+                current_break = {"start": start_time, "end": ts}
+            else:
+                current_break["end"] = ts
+        elif current_break is not None:
+            entry, duration = close(current_break)
+            if duration >= threshold_seconds / 60:
+                long_breaks.append(entry)
+            current_break = None
+    if current_break is not None:
+        long_breaks.append(close(current_break)[0])
+    return {"points": idle_points, "longBreaks": long_breaks}
+
+
+def bench_idle(args) -> None:
+    banner(f"Idle section long-break detection at {args.rows:,} metrics rows")
+    df = dashboard_data._prepare_metrics_dataframe(synthetic_metrics_frame(args.rows))
+    threshold = int(getattr(django.conf.settings, "TRACKLET_LONG_BREAK_SECONDS", 600))
+
+    section = timed("build_idle_section (run-length)", dashboard_data.build_idle_section, df, repeat=3)
+    legacy = timed("iterrows scan", legacy_idle_section, df, threshold)
+    print(f"   long breaks found: {len(section['longBreaks']):,}")
+
+    same = section["idleOverTime"]["points"] == legacy["points"] and section["longBreaks"] == legacy["longBreaks"]
+    print(f"\n   Outputs identical: {same}")
+    if not same:
+        sys.exit(1)
+
+
+def legacy_timeline_section(df: pd.DataFrame) -> dict:
+    """build_timeline_section's point and event loops before vectorisation."""
+    app_totals = df.groupby("app_name")["active_seconds"].sum().sort_values(ascending=False)
+    top_apps = list(app_totals.head(5).index)
+    grouped = df.groupby(["timestamp_hour", "app_name"])["active_seconds"].sum().unstack(fill_value=0.0)
+    points = []
+    for ts, row in grouped.iterrows():
+        point = {"name": ts.strftime("%H:%M")}
+        others = 0.0
+        for app in row.index:
+            minutes = round(row[app] / 60.0, 2)
+            if app in top_apps:
+                point[app] = minutes
+            else:
+                others += minutes
+        if others:
+            point["Other"] = round(others, 2)
+        points.append(point)
+    events = [
+        {
+            "ts": row["timestamp"].isoformat(),
+            "app": row["app_name"],
+            "window": row["window_title"],
+            "domain": None,
+            "idleSec": float(row["idle_seconds"]),
+            "category": row["productivity_label"],
+            "productivity": row["productivity_label"],
+        }
+        for _, row in df.tail(200).iterrows()
+    ]
+    return {"points": points, "events": events}
+
+
+def legacy_focus_section(df: pd.DataFrame) -> dict:
+    """build_focus_section's session loop and bucketing before vectorisation."""
+    focus_df = df[df["productive_bool"] == True].copy()  # noqa: E712
+    focus_df["gap"] = focus_df["timestamp"] - focus_df["timestamp"].shift(1)
+    focus_df["session_id"] = (
+        (focus_df["app_name"] != focus_df["app_name"].shift(1)) | (focus_df["gap"] > pd.Timedelta(minutes=5))
+    ).cumsum()
+    sessions = []
+    for session_id, group in focus_df.groupby("session_id"):
+        sessions.append({
+            "id": f"session-{int(session_id)}",
+            "start": group["timestamp"].iloc[0].isoformat(),
+            "end": (group["timestamp"].iloc[-1] + pd.Timedelta(minutes=1)).isoformat(),
+            "durationSec": int(group["active_seconds"].sum()),
+            "app": group["app_name"].iloc[-1],
+            "window": group["window_title"].iloc[-1],
+            "productivity": "productive",
+        })
+    buckets = [(0, 15), (15, 30), (30, 45), (45, 60), (60, 90), (90, None)]
+    counts = defaultdict(int)
+    for session in sessions:
+        minutes = session["durationSec"] / 60.0
+        for low, high in buckets:
+            if low <= minutes < (high if high is not None else float("inf")):
+                counts[f"{low}-{int(high)}m" if high is not None else f"{low}m+"] += 1
+                break
+    distribution = [
+        {"name": label, "sessions": counts.get(label, 0)}
+        for label in ("0-15m", "15-30m", "30-45m", "45-60m", "60-90m", "90m+")
+    ]
+    hourly_focus = focus_df.groupby("timestamp_hour")["productive_seconds"].sum()
+    trend = [{"name": ts.strftime("%H:%M"), "focus": round(value / 60.0 * 10, 2)} for ts, value in hourly_focus.items()]
+    return {"sessions": sessions[-10:], "distribution": distribution, "trend": trend}
+
+
+def metrics_sections(df: pd.DataFrame) -> dict:
+    return {
+        "idle": dashboard_data.build_idle_section(df),
+        "apps": dashboard_data.build_apps_section(df),
+        "timeline": dashboard_data.build_timeline_section(df),
+        "focus": dashboard_data.build_focus_section(df),
+    }
+
+
+def bench_sections(args) -> None:
+    banner(f"Metrics-based dashboard sections at {args.rows:,} rows")
+    print(f"\n1. Equivalence with the row loops at {args.verify_rows:,} rows")
+    small = dashboard_data._prepare_metrics_dataframe(synthetic_metrics_frame(args.verify_rows))
+    timeline = dashboard_data.build_timeline_section(small)
+    focus = dashboard_data.build_focus_section(small)
+    legacy_timeline = timed("legacy timeline loops", legacy_timeline_section, small)
+    legacy_focus = timed("legacy focus loops", legacy_focus_section, small)
+    same = (
+        timeline["dailyTimeline"]["points"] == legacy_timeline["points"]
+        and timeline["activityEvents"] == legacy_timeline["events"]
+        and focus["sessions"] == legacy_focus["sessions"]
+        and focus["sessionDistribution"]["points"] == legacy_focus["distribution"]
+        and focus["focusScoreTrend"]["points"] == legacy_focus["trend"]
+    )
+    print(f"   Outputs identical: {same}")
+
+    print(f"\n2. Build time at {args.rows:,} rows (best of 3)")
+    df = dashboard_data._prepare_metrics_dataframe(synthetic_metrics_frame(args.rows))
+    best = float("inf")
+    for name, builder in (
+        ("idle", dashboard_data.build_idle_section),
+        ("apps", dashboard_data.build_apps_section),
+        ("timeline", dashboard_data.build_timeline_section),
+        ("focus", dashboard_data.build_focus_section),
+    ):
+        timed(f"build_{name}_section", builder, df, repeat=3)
+    for _ in range(3):
+        lap = time.perf_counter()
+        metrics_sections(df)
+        best = min(best, time.perf_counter() - lap)
+    total_ms = best * 1000
+    print(f"   {'all four sections':<40} {total_ms:10.1f} ms")
+
+    over = args.budget_ms is not None and total_ms > args.budget_ms
+    if args.budget_ms is not None:
+        print(f"   Budget {args.budget_ms:,.0f} ms: {'EXCEEDED' if over else 'ok'}")
+    if not same or over:
+        sys.exit(1)
+
+
+def legacy_switch_analytics(df: pd.DataFrame) -> tuple[list[dict], list[dict]]:
+    """build_switches_section's per-hour apply and Counter before switch_analytics."""
+    counts = df.groupby("timestamp_hour").apply(
+        lambda group: int((group["app_name"] != group["app_name"].shift()).sum())
+    )
+    intensity = [{"name": ts.strftime("%H:%M"), "count": int(value)} for ts, value in counts.items()]
+    shifted = df.shift(1)
+    mask = df["app_name"] != shifted["app_name"]
+    transitions = df[mask & shifted["app_name"].notna()]
+    pairs = Counter(zip(shifted.loc[transitions.index, "app_name"], transitions["app_name"]))
+    top = [{"from": a, "to": b, "count": int(n)} for (a, b), n in pairs.most_common(8)]
+    return intensity, top
+
+
+def bench_switches(args) -> None:
+    banner(f"Switch intensity and top pairs at {args.rows:,} rows")
+    df = dashboard_data._prepare_metrics_dataframe(synthetic_metrics_frame(args.rows))
+    section = timed("build_switches_section", dashboard_data.build_switches_section, df, repeat=3)
+    intensity, top = timed("groupby.apply + shift + Counter", legacy_switch_analytics, df)
+    same = section["switchIntensity"]["points"] == intensity and section["topPairs"] == top
+
+    frame = build_frame(synthetic_activity_rows(args.rows))
+    agg = activity_processor._build_aggregate(frame)
+    names = [frame.apps[int(i)] for i in frame.app_id]
+    pairs = Counter(zip(names, names[1:]))
+    expected = [(a, b, n) for (a, b), n in pairs.most_common(20) if a != b][:8]
+    same = same and [(agg.app_names[a], agg.app_names[b], n) for a, b, n in agg.top_pairs] == expected
+
+    print(f"\n   Outputs identical: {same}")
+    if not same:
+        sys.exit(1)
+
+
+def legacy_prepare_metrics(frame: pd.DataFrame) -> pd.DataFrame:
+    """_prepare_metrics_dataframe before categoricals and the vectorised labels."""
+    df = frame.copy()
+    ts = pd.to_datetime(df.get("timestamp"), errors="coerce").dropna()
+    tz = dj_timezone.get_current_timezone()
+    try:
+        df["timestamp"] = ts.dt.tz_convert(tz)
+    except Exception:
+        try:
+            df["timestamp"] = ts.dt.tz_localize(tz)
+        except Exception:
+            df["timestamp"] = ts
+    df = df.sort_values("timestamp").reset_index(drop=True)
+    df["idle_seconds"] = pd.to_numeric(df.get("idle_seconds"), errors="coerce").fillna(0.0)
+    df["idle_seconds"] = df["idle_seconds"].clip(lower=0, upper=3600)
+    df["active_seconds"] = (60.0 - df["idle_seconds"].clip(upper=60.0)).clip(lower=0.0)
+    df["productive_bool"] = df.get("productive").apply(dashboard_data._normalise_bool)
+    df["productivity_label"] = df["productive_bool"].map(
+        {True: "productive", False: "unproductive"}
+    ).fillna("neutral")
+    df["timestamp_hour"] = df["timestamp"].dt.floor("H")
+    df["hour_label"] = df["timestamp"].apply(lambda ts: ts.strftime("%H:%M"))
+    df["app_name"] = df.get("app_name", "unknown").fillna("unknown")
+    df["window_title"] = df.get("window_title", "unknown").fillna("unknown")
+    df["productive_seconds"] = df["active_seconds"].where(df["productive_bool"] == True, 0.0)
+    df["unproductive_seconds"] = df["active_seconds"].where(df["productive_bool"] == False, 0.0)
+    return df
+
+
+def legacy_metrics_load(path: Path) -> pd.DataFrame:
+    return legacy_prepare_metrics(pd.read_json(path, lines=True))
+
+
+def lean_metrics_load(path: Path) -> pd.DataFrame:
+    return dashboard_data._prepare_metrics_dataframe(metrics_snapshot._parse(path.read_bytes()))
+
+
+def bench_metrics_load(args) -> None:
+    banner(f"metrics.jsonl load and prepare at {args.rows:,} rows")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "metrics.jsonl"
+        synthetic_metrics_frame(args.rows).to_json(path, orient="records", lines=True, date_format="iso")
+        print(f"   {'metrics.jsonl size':<40} {path.stat().st_size / 1e6:10.1f} MB")
+
+        print("\n1. Load time (best of 3)")
+        legacy = timed("read_json + object columns", legacy_metrics_load, path, repeat=3)
+        lean = timed("pruned chunks + categoricals", lean_metrics_load, path, repeat=3)
+
+        print("\n2. Allocation while loading")
+        traced("read_json + object columns", legacy_metrics_load, path)
+        traced("pruned chunks + categoricals", lean_metrics_load, path)
+
+    print("\n3. Resident frame (memory_usage(deep=True))")
+    legacy_bytes = legacy.memory_usage(deep=True).sum()
+    lean_bytes = lean.memory_usage(deep=True).sum()
+    print(f"   {'object columns':<40} {legacy_bytes / 1e6:10.1f} MB")
+    print(f"   {'categoricals':<40} {lean_bytes / 1e6:10.1f} MB ({legacy_bytes / lean_bytes:.1f}x smaller)")
+
+    same = (
+        metrics_sections(lean) == metrics_sections(legacy)
+        and dashboard_data.build_switches_section(lean) == dashboard_data.build_switches_section(legacy)
+    )
+    print(f"\n   Section outputs identical: {same}")
+    if not same:
+        sys.exit(1)
+
+
+def same_frame(left: pd.DataFrame, right: pd.DataFrame) -> bool:
+    try:
+        pd.testing.assert_frame_equal(left, right)
+    except AssertionError as exc:
+        print(f"   Mismatch: {str(exc).splitlines()[0]}")
+        return False
+    return True
+
+
+def bench_columns(args) -> None:
+    banner(f"metrics.jsonl columnar sidecar at {args.rows:,} rows")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "metrics.jsonl"
+        synthetic_metrics_frame(args.rows).to_json(path, orient="records", lines=True, date_format="iso")
+        data = path.read_bytes()
+        print(f"   {'metrics.jsonl size':<40} {len(data) / 1e6:10.1f} MB")
+
+        print("\n1. Write")
+        timed("full sidecar build", metrics_snapshot.update_columns, path, None, 0, data, b"")
+        # The combiner's steady state: a committed slice and a fresh tail appended
+        lines = data.splitlines(keepends=True)
+        split = len(lines) - max(2, len(lines) // 100)
+        head, added, tail = b"".join(lines[:split]), b"".join(lines[split:-1]), lines[-1]
+        path.write_bytes(head)
+        metrics_snapshot.update_columns(path, None, 0, head, b"")
+        previous = metrics_snapshot._version(path)
+        path.write_bytes(data)
+        timed(f"append {len(lines) - split:,} rows", metrics_snapshot.update_columns, path, previous, len(head), added, tail)
+
+        print("\n2. Load (best of 5)")
+        version = metrics_snapshot._version(path)
+        parsed = timed("parse JSONL", metrics_snapshot._parse, data, repeat=5)
+        mapped = timed(
+            "map sidecar", metrics_columns.read_columns, path, version, metrics_snapshot.CATEGORY_COLUMNS, repeat=5
+        )
+        same = mapped is not None and same_frame(mapped, parsed)
+    print(f"\n   Frames identical: {same}")
+    if not same:
+        sys.exit(1)
+
+
+def synthetic_activity_day(day: datetime, rows: int, seed: int) -> list[bytes]:
+    """One day of activity.jsonl lines as the tracker writes them."""
+    rng = random.Random(seed)
+    app, windows = APPS[0]
+    lines = []
+    for idx in range(rows):
+        if rng.random() < 0.05:
+            app, windows = rng.choice(APPS)
+        stamp = day + timedelta(seconds=idx * 86_400 // rows)
+        record = {
+            "timestamp": stamp.strftime("%Y-%m-%dT%H:%M:%S"),
+            "app_name": app,
+            "window_title": rng.choice(windows),
+            "idle_seconds": 0 if rng.random() < 0.8 else rng.randint(1, 30),
+        }
+        lines.append((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+    return lines
+
+
+def bench_partitions(args) -> None:
+    banner(f"Daily activity partitions: {args.days} days of {args.rows_per_day:,} rows")
+    first = datetime(2025, 9, 1)
+    days = [synthetic_activity_day(first + timedelta(days=n), args.rows_per_day, n) for n in range(args.days)]
+    whole = b"".join(b"".join(lines) for lines in days)
+    with tempfile.TemporaryDirectory() as tmp:
+        hot = Path(tmp) / "activity.jsonl"
+        log = log_partitions.PartitionedLog(hot)
+        start = time.perf_counter()
+        for n, lines in enumerate(days):
+            with hot.open("ab") as fh:
+                fh.write(b"".join(lines))
+            # Maintenance runs after midnight: the day just written is closed
+            today = (first + timedelta(days=n + 1)).date()
+            log.rotate(today)
+            log.compact(today, retention_days=args.days)
+        print(f"   {'rotate + compact, all days':<40} {(time.perf_counter() - start) * 1000:10.1f} ms")
+        stored = sum(entry.stat().st_size for entry in log.directory.iterdir())
+        print(f"   {'logical / stored size':<40} {len(whole) / 1e6:7.1f} / {stored / 1e6:.1f} MB")
+
+        print("\n1. Read (best of 3)")
+        full = timed("read_from(0), every partition", log.read_from, 0, repeat=3)
+        target = (first + timedelta(days=args.days // 2)).date()
+        one_day = timed("read_range(one day)", log.read_range, target, target, repeat=3)
+
+        exact = full.data == whole and full.start == 0 and log.end() == len(whole)
+        expected = b"".join(days[args.days // 2])
+        same_day = one_day == expected
+    print(f"\n   Logical log exact: {exact}; one-day range exact: {same_day}")
+    if not (exact and same_day):
+        sys.exit(1)
+
+
+def bench_range(args) -> None:
+    per_day = 86_400 // 5
+    banner(f"One-day window vs all history: {args.days} days of {per_day:,} rows")
+    rows = synthetic_activity_rows(args.days * per_day)
+    frame = build_frame(rows)
+    last_day = rows[-per_day:]
+    start, stop = last_day[0][0], last_day[-1][0] + 1
+
+    print("\n1. Aggregate (best of 3)")
+    timed("all history", activity_processor._build_aggregate, frame, repeat=3)
+    window = timed("between() for the last day", frame.between, start, stop, repeat=3)
+    ranged = timed("last day via between()", activity_processor._build_aggregate, window, repeat=3)
+
+    # Same day parsed on its own: the window must aggregate to the same payload
+    alone = activity_processor._build_aggregate(build_frame(last_day))
+    same = all(
+        build(ranged) == build(alone)
+        for build in (
+            activity_processor.build_overview_data,
+            activity_processor.build_timeline_data,
+            activity_processor.compute_context_switches,
+        )
+    )
+    print(f"\n   Window rows: {len(window):,}; outputs identical to a one-day frame: {same}")
+    if not same:
+        sys.exit(1)
+
+
+def bench_rollup(args) -> None:
+    per_day = 86_400 // 5
+    banner(f"Hourly rollup vs raw rows: {args.days} days of {per_day:,} rows")
+    rows = synthetic_activity_rows(args.days * per_day)
+    frame = build_frame(rows)
+
+    # Fold in daily batches, the way ingest sees the file grow
+    rollup = HourlyRollup()
+    for day in range(args.days):
+        rollup.fold({column: getattr(frame, column)[day * per_day:(day + 1) * per_day] for column in COLUMNS})
+    table = rollup.table()
+    print(f"\n   {len(frame):,} rows -> {len(table):,} rollup rows over {len(table.hours):,} hours")
+
+    same = True
+    for granularity in ("hour", "day", "week"):
+        print(f"\n{granularity} buckets, all history (best of 3)")
+        raw = timed("raw rows", activity_processor._build_aggregate, frame, granularity, repeat=3)
+        # The event feed and top pairs still come from the raw rows
+        summed = timed(
+            "rollup",
+            lambda: activity_processor._rollup_aggregate(
+                table,
+                frame.apps.values[: len(frame.apps)],
+                activity_processor._activity_events(frame),
+                switch_analytics.top_pairs(frame.app_id),
+                None,
+                None,
+                granularity,
+            ),
+            repeat=3,
+        )
+        for build in (activity_processor.build_overview_data, activity_processor.build_timeline_data):
+            same = same and build(raw) == build(summed)
+        switches = activity_processor.compute_context_switches
+        same = same and switches(raw) == switches(summed)
+    print(f"\n   Outputs identical: {same}")
+    if not same:
+        sys.exit(1)
+
+
+def synthetic_label_lines(first: datetime, days: int, per_day: int = 720, seed: int = 11) -> list[bytes]:
+    """
+    q_analysis.jsonl lines on whole minutes: some share a minute, every fifth
+    hour has none (beyond LABEL_TOLERANCE) and some verdicts are null.
+    """
+    rng = random.Random(seed)
+    lines = []
+    for idx in range(days * per_day):
+        if (idx // 30) % 5 == 4:
+            continue
+        stamp = (first + timedelta(seconds=idx * 86_400 // per_day)).replace(second=0)
+        for _ in range(2 if rng.random() < 0.1 else 1):
+            app, windows = rng.choice(APPS)
+            record = {
+                "timestamp": stamp.strftime("%Y-%m-%dT%H:%M:%S"),
+                "app_name": app,
+                "window_title": rng.choice(windows),
+                "productive": rng.choice((True, False, True, None)),
+            }
+            lines.append((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+    return lines
+
+
+def dashboard_sections(agg, df: pd.DataFrame) -> dict:
+    return {
+        "overview": activity_processor.build_overview_data(agg),
+        "activity_timeline": activity_processor.build_timeline_data(agg),
+        "switches": dashboard_data.build_activity_switches_section(agg),
+        **metrics_sections(df),
+    }
+
+
+def bench_storage(args) -> None:
+    per_day = 86_400 // 5
+    banner(f"Dashboard from the sqlite backend vs the JSONL files: {args.days} days of {per_day:,} rows")
+    first = datetime(2025, 9, 1)
+    activity = [line for n in range(args.days) for line in synthetic_activity_day(first + timedelta(days=n), per_day, n)]
+    labels = synthetic_label_lines(first, args.days)
+    last_day = dj_timezone.make_aware(first + timedelta(days=args.days - 1))
+    windows = {
+        "all history": (None, None),
+        "last day": (int(last_day.timestamp()), int((last_day + timedelta(days=1)).timestamp())),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        activity_file = Path(tmp) / "activity.jsonl"
+        history_file = Path(tmp) / "q_analysis.jsonl"
+        metrics_file = Path(tmp) / "metrics.jsonl"
+        activity_file.write_bytes(b"".join(activity))
+        history_file.write_bytes(b"".join(labels))
+
+        # JSONL backend: the ingested frame and the combiner's metrics.jsonl
+        records = [json.loads(line) for line in activity]
+        decoder = TimestampDecoder(dj_timezone.get_current_timezone())
+        frame = build_frame(activity_processor._decode_activities(records, decoder))
+        script_combiner.label_activity_with_productivity(str(history_file), str(activity_file), str(metrics_file))
+        parsed = metrics_snapshot.get_metrics_snapshot(metrics_file).frame
+
+        def window(metrics, start, stop):
+            query = dashboard_data.DashboardQuery(start, stop)
+            return dashboard_data._window_rows(metrics, dashboard_data._timestamp_index(metrics), query)
+
+        # Both sides prepare all their metrics rows and then window them, as the first
+        # request after new data does; the sqlite side's rows are the whole labelled join
+        def jsonl_dashboard(start, stop):
+            df = window(dashboard_data._prepare_metrics_dataframe(parsed), start, stop)
+            return dashboard_sections(activity_processor._build_aggregate(frame.between(start, stop)), df)
+
+        def sql_dashboard(start, stop):
+            df = window(dashboard_data._prepare_metrics_dataframe(sql_store._query_labelled(None, None)), start, stop)
+            return dashboard_sections(sql_store._query_aggregate(start, stop), df)
+
+        # A throwaway database file, so the project's db.sqlite3 is untouched
+        connection.settings_dict["TEST"]["NAME"] = str(Path(tmp) / "bench.sqlite3")
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            print("\n1. Import into WAL-mode SQLite")
+            timed(f"{len(activity):,} activity lines", sql_store.import_log, sql_store.SOURCE_ACTIVITY, activity_file)
+            timed(f"{len(labels):,} label lines", sql_store.import_log, sql_store.SOURCE_LABELS, history_file)
+
+            same = True
+            for step, (name, (start, stop)) in enumerate(windows.items(), start=2):
+                print(f"\n{step}. Dashboard sections, {name} (best of 3)")
+                expected = timed("JSONL: frame + parsed metrics.jsonl", jsonl_dashboard, start, stop, repeat=3)
+                actual = timed("sqlite: indexed queries", sql_dashboard, start, stop, repeat=3)
+                same = same and expected == actual
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    print(f"\n   Outputs identical: {same}")
+    if not same:
+        sys.exit(1)
+
+
+def journal_worker(path: str, proc: int, threads: int, appends: int, mode: str) -> tuple[list[tuple], int]:
+    """One analyze worker process: ``threads`` threads appending labels, via the journal or open/write/close."""
+    writer = journal.JournalWriter(path) if mode == "journal" else None
+    results = []
+    results_lock = threading.Lock()
+
+    def run(thread: int) -> None:
+        rng = random.Random(proc * 1000 + thread)
+        for n in range(appends):
+            app, windows = rng.choice(APPS)
+            entry = {
+                "timestamp": f"2025-10-05T{n * 24 // appends:02d}:00:00-07:00",
+                "app_name": app,
+                "window_title": rng.choice(windows) + " " * rng.randint(0, 400),
+                "productive": rng.random() < 0.6,
+                "proc": proc,
+                "thread": thread,
+                "n": n,
+            }
+            line = json.dumps(entry, ensure_ascii=False)
+            if writer is None:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+                    if mode == "fsync":
+                        f.flush()
+                        os.fsync(f.fileno())
+                continue
+            commit = writer.append(line)
+            with results_lock:
+                results.append((proc, thread, n, commit.seq, commit.offset, commit.end))
+
+    workers = [threading.Thread(target=run, args=(thread,)) for thread in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if writer is None:
+        return results, 0
+    writer.close()
+    return results, writer.batches
+
+
+def bench_journal(args) -> None:
+    total = args.processes * args.threads * args.appends
+    banner(f"q_analysis.jsonl appends: {args.processes} processes x {args.threads} threads x {args.appends}")
+    ctx = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = {}
+        modes = {
+            "open/write/close per line": "plain",
+            "open/write/fsync/close per line": "fsync",
+            "journal, group commit + fsync": "journal",
+        }
+        for name, mode in modes.items():
+            path = Path(tmp) / f"{mode}.jsonl"
+            log = log_partitions.PartitionedLog(path)
+            rotations = 0
+            with ctx.Pool(args.processes) as pool:
+                start = time.perf_counter()
+                pending = pool.starmap_async(
+                    journal_worker,
+                    [(str(path), proc, args.threads, args.appends, mode) for proc in range(args.processes)],
+                )
+                # Rotation runs alongside the writers in every mode, so the rates compare
+                # like for like; the unlocked modes can lose lines to its truncate
+                while not pending.ready():
+                    rotations += bool(log.rotate(datetime(2025, 10, 6).date()))
+                    time.sleep(args.rotate_ms / 1000)
+                outcome = pending.get()
+                elapsed = time.perf_counter() - start
+            batches = sum(count for _, count in outcome)
+            rate = f"{total / elapsed:10.0f} lines/s"
+            print(f"   {name:<40} {rate}" + (f"   ({total / batches:.1f} lines per fsync)" if batches else ""))
+            runs[name] = (log, [row for rows, _ in outcome for row in rows], rotations)
+
+        log, commits, rotations = runs["journal, group commit + fsync"]
+        data = log.read_from(0).data
+        lines = data.splitlines(keepends=True)
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                entries.append(None)
+        whole = len(lines) == total and None not in entries
+        seqs = sorted(seq for *_, seq, _, _ in commits) == list(range(1, total + 1))
+        exact = all(
+            data[offset:end] == lines[seq - 1]
+            and (entries[seq - 1]["proc"], entries[seq - 1]["thread"], entries[seq - 1]["n"]) == (proc, thread, n)
+            for proc, thread, n, seq, offset, end in commits
+        ) if whole else False
+        ordered = all(
+            [seq for *_, seq, _, _ in sorted(group)] == sorted(seq for *_, seq, _, _ in group)
+            for group in _group_by_thread(commits).values()
+        )
+        position = journal.committed(log.hot)
+        tail = position == journal.JournalPosition(total, len(data))
+        legacy_log = runs["open/write/close per line"][0]
+        legacy_lines = legacy_log.read_from(0).data.splitlines()
+
+    print(f"\n   Journal rotations: {rotations}; lines kept by open/write/close: {len(legacy_lines):,} of {total:,}")
+    print(f"   Every line whole: {whole}; seqs 1..{total:,}: {seqs}; offsets exact: {exact}")
+    print(f"   Per-thread order kept: {ordered}; sidecar at the end: {tail}")
+    if not (whole and seqs and exact and ordered and tail):
+        sys.exit(1)
+
+
+def _group_by_thread(commits: list[tuple]) -> dict[tuple, list[tuple]]:
+    groups = defaultdict(list)
+    for row in commits:
+        groups[row[:2]].append(row)
+    return groups
+
+
+def bench_analyze(args) -> None:
+    banner(f"Async analyze: {args.jobs} uploads, {args.workers} workers, queue of {args.queue}")
+    hang = args.jobs // 3
+    latencies: dict[str, float] = {}
+    latencies_lock = threading.Lock()
+
+    # Stands in for the Gemini round trip; one call hangs past the timeout
+    def fake_analyze(image: str, prompt: str) -> dict:
+        n = int(prompt)
+        delay = 2 * args.timeout if n == hang else random.uniform(0.2, 1.8) * args.latency_ms / 1000
+        time.sleep(delay)
+        with latencies_lock:
+            latencies[prompt] = delay
+        return {"app_name": "Terminal", "window_title": prompt, "productive": n % 2 == 0}
+
+    clock = iter(range(10**9))
+    with tempfile.TemporaryDirectory() as tmp:
+        history = Path(tmp) / "q_analysis.jsonl"
+        writer = journal.JournalWriter(history)
+        jobs = analyze_jobs.AnalyzeQueue(
+            fake_analyze,
+            lambda entry: writer.append(json.dumps(entry, ensure_ascii=False)),
+            workers=args.workers,
+            size=args.queue,
+            timeout=args.timeout,
+            clock=lambda: f"2025-10-05T12:00:00.{next(clock):09d}",
+        )
+        accepted: list[analyze_jobs.AnalyzeJob] = []
+        submit_ms: list[float] = []
+        refused = 0
+        retry_hints = set()
+        start = time.perf_counter()
+        for n in range(args.jobs):
+            image = Path(tmp) / f"upload-{n}.png"
+            image.write_bytes(b"png")
+            while True:
+                began = time.perf_counter()
+                try:
+                    job = jobs.submit(image, Path(tmp) / "latest.png", str(n))
+                except analyze_jobs.QueueFull as exc:
+                    refused += 1
+                    retry_hints.add(exc.retry_after)
+                    # A real client waits Retry-After; keep the queue saturated instead
+                    time.sleep(args.latency_ms / 1000 / args.workers)
+                    continue
+                submit_ms.append((time.perf_counter() - began) * 1000)
+                accepted.append(job)
+                break
+        deadline = time.monotonic() + 3 * args.timeout + 10
+        while time.monotonic() < deadline:
+            states = [jobs.status(job.id)["status"] for job in accepted]
+            if all(state in (analyze_jobs.DONE, analyze_jobs.FAILED) for state in states):
+                break
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        writer.close()
+        lines = [json.loads(line) for line in history.read_bytes().splitlines()]
+
+    statuses = [jobs.status(job.id) for job in accepted]
+    failed = [status for status in statuses if status["status"] == analyze_jobs.FAILED]
+    done = [status for status in statuses if status["status"] == analyze_jobs.DONE]
+    sync_ms = sorted(delay * 1000 for prompt, delay in latencies.items() if int(prompt) != hang)
+    print(f"   {'request time, sync (model call)':<40} p50 {sync_ms[len(sync_ms) // 2]:7.1f} ms   max {sync_ms[-1]:7.1f} ms")
+    submit_ms.sort()
+    print(f"   {'request time, async (enqueue)':<40} p50 {submit_ms[len(submit_ms) // 2]:7.3f} ms   max {submit_ms[-1]:7.3f} ms")
+    print(f"   {'wall time for every upload':<40} {elapsed * 1000:10.1f} ms")
+    print(f"   Refused with 503 while full: {refused:,} (Retry-After {min(retry_hints, default=0)}-{max(retry_hints, default=0)} s)")
+
+    in_order = [line["timestamp"] for line in lines] == sorted(line["timestamp"] for line in lines)
+    expected = [str(n) for n in range(args.jobs) if n != hang]
+    complete = [line["window_title"] for line in lines] == expected and len(done) == len(expected)
+    timed_out = [status["entry"] for status in failed] == [None] and "Timed out" in (failed[0]["error"] if failed else "")
+    seqs = [status["seq"] for status in done] == list(range(1, len(done) + 1))
+    print(f"\n   Appended in timestamp order: {in_order}; every other upload labelled once: {complete}")
+    print(f"   Hung call given up on: {timed_out}; status seqs match the file: {seqs}")
+    if not (in_order and complete and timed_out and seqs):
+        sys.exit(1)
+
+
+# Screen layouts a capture loop sees: (background, text colour, productive)
+SCREENS = {
+    "editor": ((30, 30, 30), (200, 220, 180), True),
+    "docs": ((250, 250, 250), (40, 40, 40), True),
+    "video": ((15, 15, 15), (240, 240, 240), False),
+    "feed": ((235, 238, 245), (30, 60, 120), False),
+}
+
+
+def synthetic_screen(kind: str, page: int, scroll: int, cursor: int, size=(1280, 720)) -> Image.Image:
+    """A screenshot-like image: title bar, sidebar and lines of text; ``page`` picks the text."""
+    background, ink, _ = SCREENS[kind]
+    rng = random.Random(f"{kind}-{page}")
+    width, height = size
+    image = Image.new("RGB", size, background)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, width, 30], fill=tuple(min(255, c + 30) for c in background))
+    draw.text((12, 8), f"{kind} — page {page}", fill=ink)
+    if kind == "video":
+        draw.rectangle([140, 60, width - 140, height - 120], fill=(rng.randint(60, 200), 40, rng.randint(60, 200)))
+    else:
+        draw.rectangle([0, 30, 180, height], fill=tuple(max(0, c - 12) for c in background))
+    words = ["def", "return", "self.value", "import numpy", "for i in range(10):", "the", "quarterly", "report"]
+    for line in range(40):
+        y = 44 + line * 16 - scroll * 16
+        if 30 < y < height and not (kind == "video" and 60 <= y <= height - 120):
+            draw.text((196, y), " ".join(rng.choice(words) for _ in range(rng.randint(1, 9))), fill=ink)
+    draw.rectangle([196 + cursor * 7, 44, 197 + cursor * 7, 58], fill=ink)
+    return image
+
+
+def bench_label_cache(args) -> None:
+    banner(f"Perceptual label cache: {args.captures} captures, TTL {args.ttl:.0f}s, distance {args.distance}")
+    rng = random.Random(5)
+    captures = []
+    kind, page, scroll = "editor", 0, 0
+    for n in range(args.captures):
+        # Mostly the same screen with a moved cursor or a scroll; now and then a new page or app
+        roll = rng.random()
+        if roll < 0.08:
+            kind, page, scroll = rng.choice(list(SCREENS)), rng.randrange(4), 0
+        elif roll < 0.16:
+            page = rng.randrange(4)
+        elif roll < 0.3:
+            scroll += 1
+        captures.append((n * 30.0, kind, page, scroll, rng.randrange(40)))
+
+    calls = 0
+
+    # Stands in for the Gemini call; answers from the scene the capture shows
+    def fake_analyze(image: str, prompt: str) -> dict:
+        nonlocal calls
+        calls += 1
+        time.sleep(args.latency_ms / 1000)
+        _, kind, page = Path(image).stem.split("-")
+        return {"app_name": kind, "window_title": f"{kind} — page {page}", "productive": SCREENS[kind][2]}
+
+    now = [0.0]
+    # The window the tracker last recorded: the scene on screen
+    focus: list[tuple[str, str]] = []
+    cache = label_cache.LabelCache(ttl=args.ttl, max_distance=args.distance, capacity=args.capacity, clock=lambda: now[0])
+    classify = cache.wrap(fake_analyze, lambda: focus[-1])
+    wrong = []
+    stale = []
+    classify_ms = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n, (at, kind, page, scroll, cursor) in enumerate(captures):
+            path = Path(tmp) / f"{n}-{kind}-{page}.png"
+            synthetic_screen(kind, page, scroll, cursor).save(path)
+            now[0] = at
+            focus.append((kind, f"{kind} — page {page}"))
+            began = time.perf_counter()
+            label = classify(str(path), "prompt")
+            classify_ms.append((time.perf_counter() - began) * 1000)
+            if label["productive"] != SCREENS[kind][2]:
+                wrong.append((n, kind, label))
+            if (label["app_name"], label["window_title"]) != focus[-1]:
+                stale.append((n, label))
+
+    stats = cache.stats()
+    saved = 1 - calls / len(captures)
+    print(f"   {'model calls, no cache':<40} {len(captures):10,}")
+    print(f"   {'model calls, with cache':<40} {calls:10,}   ({saved:.0%} saved)")
+    print(f"   {'classify time, p50 (a hit: decode + hash)':<40} {sorted(classify_ms)[len(classify_ms) // 2]:10.1f} ms")
+    print(f"   {'classify time, all captures':<40} {sum(classify_ms):10.1f} ms"
+          f"   (vs {len(captures) * args.latency_ms:,.0f} ms uncached at {args.latency_ms:.0f} ms a call)")
+    print(f"   Stats: {stats}")
+    print(f"\n   Labels that disagree with the screen: {len(wrong)}; with a stale app or title: {len(stale)}")
+    consistent = stats["hits"] + stats["misses"] == len(captures) and stats["misses"] == calls
+    if wrong or stale or not consistent:
+        sys.exit(1)
+
+
+def bench_frame(args) -> None:
+    banner(f"ActivityFrame vs list-of-dicts at {args.rows:,} rows")
+    rows = synthetic_activity_rows(args.rows)
+
+    print("\n1. Memory")
+    frame = traced("ActivityFrame", build_frame, rows)
+    print(f"   {'  (numeric columns)':<40} {frame.nbytes() / 1e6:10.1f} MB")
+    records = traced("list[dict] records", build_dicts, frame)
+
+    print("\n2. Reductions (best of 3)")
+    # _build_aggregate bypasses the memoised aggregate so every repeat does the work
+    agg = timed("fused aggregate (frame)", activity_processor._build_aggregate, frame, repeat=3)
+    timed("hourly productivity (dicts)", legacy_hourly_productivity, records, repeat=3)
+    timed("context switches (dicts)", legacy_context_switches, records, repeat=3)
+    timed("overview + timeline from aggregate", build_sections, agg, repeat=3)
+
+    same = (
+        activity_processor.compute_hourly_productivity(frame) == legacy_hourly_productivity(records)
+        and activity_processor.compute_context_switches(frame) == legacy_context_switches(records)
+    )
+    print(f"\n   Outputs identical: {same}")
+    if not same:
+        sys.exit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Dashboard data-path benchmarks.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    frame = sub.add_parser("frame", help="Columnar ActivityFrame memory and reductions")
+    frame.add_argument("--rows", type=int, default=1_000_000)
+    frame.set_defaults(func=bench_frame)
+
+    rules = sub.add_parser("rules", help="Compiled productivity rules vs the legacy heuristic")
+    rules.add_argument("--rows", type=int, default=1_000_000)
+    rules.set_defaults(func=bench_rules)
+
+    timestamps = sub.add_parser("timestamps", help="TimestampDecoder vs the per-line parse")
+    timestamps.add_argument("--rows", type=int, default=500_000)
+    timestamps.set_defaults(func=bench_timestamps)
+
+    future = sub.add_parser("future-labels", help="Forward merge_asof vs the per-row future-label apply")
+    future.add_argument("--rows", type=int, default=100_000)
+    future.add_argument("--screenshots", type=int, default=50_000)
+    future.add_argument("--legacy-rows", type=int, default=3_000)
+    future.set_defaults(func=bench_future_labels)
+
+    idle = sub.add_parser("idle", help="Run-length long-break detection vs the iterrows scan")
+    idle.add_argument("--rows", type=int, default=500_000)
+    idle.set_defaults(func=bench_idle)
+
+    sections = sub.add_parser("sections", help="Metrics-based section builders: equivalence and a time budget")
+    sections.add_argument("--rows", type=int, default=1_000_000)
+    sections.add_argument("--verify-rows", type=int, default=50_000)
+    sections.add_argument("--budget-ms", type=float, default=5_000, help="Fail if the four sections take longer")
+    sections.set_defaults(func=bench_sections)
+
+    switches = sub.add_parser("switches", help="switch_analytics vs groupby.apply and Counter")
+    switches.add_argument("--rows", type=int, default=1_000_000)
+    switches.set_defaults(func=bench_switches)
+
+    metrics_load = sub.add_parser("metrics-load", help="Column-pruned categorical metrics loader vs read_json")
+    metrics_load.add_argument("--rows", type=int, default=1_000_000)
+    metrics_load.set_defaults(func=bench_metrics_load)
+
+    columns = sub.add_parser("columns", help="Memory-mapped metrics sidecar vs parsing the JSONL")
+    columns.add_argument("--rows", type=int, default=44_640, help="Default: a 31-day month at one row a minute")
+    columns.set_defaults(func=bench_columns)
+
+    partitions = sub.add_parser("partitions", help="Rotated daily activity partitions: range reads and exactness")
+    partitions.add_argument("--days", type=int, default=30)
+    partitions.add_argument("--rows-per-day", type=int, default=17_280, help="Default: one row every 5 seconds")
+    partitions.set_defaults(func=bench_partitions)
+
+    ranged = sub.add_parser("range", help="Dashboard aggregate over a one-day window vs all history")
+    ranged.add_argument("--days", type=int, default=90)
+    ranged.set_defaults(func=bench_range)
+
+    rollup = sub.add_parser("rollup", help="Dashboard aggregate summed from the hourly rollup vs the raw rows")
+    rollup.add_argument("--days", type=int, default=90)
+    rollup.set_defaults(func=bench_rollup)
+
+    storage = sub.add_parser("storage", help="Dashboard sections from the sqlite storage backend vs the JSONL files")
+    storage.add_argument("--days", type=int, default=14)
+    storage.set_defaults(func=bench_storage)
+
+    appends = sub.add_parser("journal", help="Multi-process stress test of the q_analysis.jsonl journal writer")
+    appends.add_argument("--processes", type=int, default=4)
+    appends.add_argument("--threads", type=int, default=8)
+    appends.add_argument("--appends", type=int, default=250)
+    appends.add_argument("--rotate-ms", type=float, default=5.0)
+    appends.set_defaults(func=bench_journal)
+
+    analyze = sub.add_parser("analyze", help="Async analyze queue: enqueue latency, backpressure and append order")
+    analyze.add_argument("--jobs", type=int, default=400)
+    analyze.add_argument("--workers", type=int, default=4)
+    analyze.add_argument("--queue", type=int, default=32)
+    analyze.add_argument("--latency-ms", type=float, default=40.0)
+    analyze.add_argument("--timeout", type=float, default=1.0)
+    analyze.set_defaults(func=bench_analyze)
+
+    labels = sub.add_parser("label-cache", help="Perceptual-hash label cache on a synthetic capture stream")
+    labels.add_argument("--captures", type=int, default=240)
+    labels.add_argument("--ttl", type=float, default=300.0)
+    labels.add_argument("--distance", type=int, default=label_cache.DEFAULT_MAX_DISTANCE)
+    labels.add_argument("--capacity", type=int, default=label_cache.DEFAULT_CAPACITY)
+    labels.add_argument("--latency-ms", type=float, default=50.0)
+    labels.set_defaults(func=bench_label_cache)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+"""Configure Django before pytest imports the app's tests (``python -m pytest`` from here)."""
+import os
+import sys
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pyproj.settings")
+django.setup()
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from ...services import sql_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Import activity.jsonl and q_analysis.jsonl (with their daily partitions) into the "
+        "sqlite storage backend's tables. Safe to re-run: only lines past each log's cursor are read."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Empty the tables and import every retained line")
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            sql_store.reset()
+        for source, model in sql_store.MODELS.items():
+            path = sql_store.FILES[source]
+            if not path.exists():
+                self.stdout.write(f"{source}: {path} not found, skipped")
+                continue
+            lines = sql_store.import_log(source)
+            self.stdout.write(f"{source}: read {lines} new line(s); {model.objects.count()} row(s) stored")
+        if not sql_store.sqlite_enabled():
+            self.stdout.write("TRACKLET_STORAGE_BACKEND is not 'sqlite'; the dashboard keeps reading the JSONL files")
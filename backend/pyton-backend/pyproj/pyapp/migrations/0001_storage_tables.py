@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCursor',
+            fields=[
+                ('source', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('log_offset', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ActivityRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('log_offset', models.BigIntegerField(unique=True)),
+                ('epoch', models.BigIntegerField()),
+                ('utc_offset', models.IntegerField()),
+                ('minute', models.BigIntegerField()),
+                ('timestamp', models.CharField(max_length=64)),
+                ('app_name', models.CharField(max_length=255)),
+                ('window_title', models.TextField()),
+                ('idle_seconds', models.FloatField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['epoch', 'log_offset'], name='activity_epoch_idx'), models.Index(fields=['minute', 'log_offset'], name='activity_minute_idx'), models.Index(fields=['app_name', 'window_title'], name='activity_app_window_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScreenshotLabel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('log_offset', models.BigIntegerField(unique=True)),
+                ('epoch', models.BigIntegerField()),
+                ('utc_offset', models.IntegerField()),
+                ('minute', models.BigIntegerField()),
+                ('timestamp', models.CharField(max_length=64)),
+                ('app_name', models.CharField(max_length=255, null=True)),
+                ('window_title', models.TextField(null=True)),
+                ('productive', models.BooleanField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['minute', 'log_offset'], name='label_minute_idx'), models.Index(fields=['app_name', 'window_title', 'minute'], name='label_app_window_idx')],
+            },
+        ),
+    ]
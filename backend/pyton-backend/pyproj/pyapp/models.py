@@ -1,3 +1,47 @@
 from django.db import models
 
-# Create your models here.
+
+class ActivityRecord(models.Model):
+    """One activity.jsonl line, mirrored by the sqlite storage backend (see services/sql_store)."""
+
+    log_offset = models.BigIntegerField(unique=True)  # logical offset of the line in the partitioned log
+    epoch = models.BigIntegerField()  # UTC epoch seconds
+    utc_offset = models.IntegerField()  # local UTC offset in seconds at that instant
+    minute = models.BigIntegerField()  # local wall-clock minute as epoch seconds, the combiner's join key
+    timestamp = models.CharField(max_length=64)  # as written by the tracker
+    app_name = models.CharField(max_length=255)
+    window_title = models.TextField()
+    idle_seconds = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["epoch", "log_offset"], name="activity_epoch_idx"),
+            models.Index(fields=["minute", "log_offset"], name="activity_minute_idx"),
+            models.Index(fields=["app_name", "window_title"], name="activity_app_window_idx"),
+        ]
+
+
+class ScreenshotLabel(models.Model):
+    """One q_analysis.jsonl line (a screenshot's productivity label), mirrored like ActivityRecord."""
+
+    log_offset = models.BigIntegerField(unique=True)
+    epoch = models.BigIntegerField()
+    utc_offset = models.IntegerField()
+    minute = models.BigIntegerField()
+    timestamp = models.CharField(max_length=64)
+    app_name = models.CharField(max_length=255, null=True)
+    window_title = models.TextField(null=True)
+    productive = models.BooleanField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["minute", "log_offset"], name="label_minute_idx"),
+            models.Index(fields=["app_name", "window_title", "minute"], name="label_app_window_idx"),
+        ]
+
+
+class ImportCursor(models.Model):
+    """How far (logical offset) each JSONL log has been imported into its table."""
+
+    source = models.CharField(max_length=64, primary_key=True)
+    log_offset = models.BigIntegerField(default=0)
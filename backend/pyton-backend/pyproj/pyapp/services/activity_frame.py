@@ -0,0 +1,212 @@
+"""
+Columnar, array-backed storage for parsed activity.jsonl records.
+
+Each record is a row across a handful of NumPy columns instead of a 9-key dict
+with three datetime objects. App names and window titles are interned to
+integer ids through a StringTable, so repeated titles cost 4 bytes per row.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional
+
+import numpy as np
+
+PRODUCTIVITY_LABELS: tuple[str, ...] = ("neutral", "productive", "unproductive")
+PRODUCTIVITY_CODES: dict[str, int] = {label: code for code, label in enumerate(PRODUCTIVITY_LABELS)}
+NEUTRAL, PRODUCTIVE, UNPRODUCTIVE = 0, 1, 2
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Time buckets for charts; weeks start on Monday
+GRANULARITIES: tuple[str, ...] = ("hour", "day", "week")
+_BUCKET_SECONDS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+_MONDAY_SHIFT = 3 * 86400  # 1970-01-01 was a Thursday
+
+# name -> dtype, in storage order
+COLUMNS: dict[str, np.dtype] = {
+    "epoch": np.dtype(np.int64),  # UTC epoch seconds
+    "utc_offset": np.dtype(np.int32),  # local UTC offset in seconds at that instant
+    "idle_seconds": np.dtype(np.float32),
+    "active_seconds": np.dtype(np.float32),
+    "productivity": np.dtype(np.int8),  # index into PRODUCTIVITY_LABELS
+    "app_id": np.dtype(np.int32),
+    "window_id": np.dtype(np.int32),
+    "raw_id": np.dtype(np.int32),  # -1 when the raw timestamp is the canonical local ISO form
+}
+
+
+class StringTable:
+    """Append-only string interner; ids are stable for the life of the table."""
+
+    def __init__(self) -> None:
+        self._ids: dict[str, int] = {}
+        self.values: list[str] = []
+
+    def intern(self, value: str) -> int:
+        idx = self._ids.get(value)
+        if idx is None:
+            idx = len(self.values)
+            self._ids[value] = idx
+            self.values.append(value)
+        return idx
+
+    def __getitem__(self, idx: int) -> str:
+        return self.values[idx]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+def bucket_starts(local_seconds: np.ndarray, granularity: str = "hour") -> np.ndarray:
+    """Start of each value's local hour, day or week, in local epoch seconds."""
+    if granularity not in _BUCKET_SECONDS:
+        raise ValueError(f"Unknown granularity {granularity!r}; expected one of {', '.join(GRANULARITIES)}")
+    width = _BUCKET_SECONDS[granularity]
+    shift = _MONDAY_SHIFT if granularity == "week" else 0
+    shifted = local_seconds + shift
+    return shifted - shifted % width - shift
+
+
+def local_datetime(local_seconds: int, utc_offset: int) -> datetime:
+    """Aware datetime for a local wall-clock epoch value and its UTC offset."""
+    naive = _EPOCH + timedelta(seconds=int(local_seconds))
+    return naive.replace(tzinfo=timezone(timedelta(seconds=int(utc_offset))))
+
+
+class ActivityFrame:
+    """
+    Columnar activity store, sorted by timestamp.
+
+    Columns grow with amortised doubling. Readers should work on a snapshot()
+    which pins the current length; appends never mutate rows a snapshot can see
+    (re-sorting allocates fresh arrays). Windows from between() are read-only
+    views of the same columns.
+    """
+
+    def __init__(
+        self,
+        columns: Optional[dict[str, np.ndarray]] = None,
+        length: int = 0,
+        apps: Optional[StringTable] = None,
+        windows: Optional[StringTable] = None,
+        raws: Optional[StringTable] = None,
+        start: int = 0,
+    ) -> None:
+        self._columns = columns or {name: np.empty(0, dtype) for name, dtype in COLUMNS.items()}
+        self._length = length
+        self._start = start  # first row; non-zero only for windows returned by between()
+        self.apps = apps or StringTable()
+        self.windows = windows or StringTable()
+        self.raws = raws or StringTable()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        columns = self.__dict__.get("_columns")
+        if columns is not None and name in columns:
+            return columns[name][self._start : self._start + self._length]
+        raise AttributeError(name)
+
+    @property
+    def local_seconds(self) -> np.ndarray:
+        """Local wall-clock seconds since the epoch (for hour/day bucketing)."""
+        return self.epoch + self.utc_offset
+
+    @property
+    def hour_local(self) -> np.ndarray:
+        return bucket_starts(self.local_seconds, "hour")
+
+    def snapshot(self) -> "ActivityFrame":
+        return ActivityFrame(self._columns, self._length, self.apps, self.windows, self.raws, self._start)
+
+    def between(self, start: Optional[int] = None, stop: Optional[int] = None) -> "ActivityFrame":
+        """
+        Read-only window of the rows with ``start <= epoch < stop`` (UTC epoch
+        seconds; None leaves that side open). Rows are sorted by epoch, so the
+        bounds are two binary searches and the window shares the columns.
+        """
+        epoch = self.epoch
+        lo = 0 if start is None else int(np.searchsorted(epoch, start, side="left"))
+        hi = len(epoch) if stop is None else int(np.searchsorted(epoch, stop, side="left"))
+        hi = max(lo, hi)
+        return ActivityFrame(self._columns, hi - lo, self.apps, self.windows, self.raws, self._start + lo)
+
+    def clear(self) -> None:
+        self.__init__()
+
+    def extend(self, rows: dict[str, np.ndarray]) -> None:
+        """Append a batch of rows (one array per column, equal lengths)."""
+        count = len(rows["epoch"])
+        if not count:
+            return
+        needed = self._length + count
+        capacity = len(self._columns["epoch"])
+        if needed > capacity:
+            new_capacity = max(needed, capacity * 2, 1024)
+            grown = {}
+            for name, dtype in COLUMNS.items():
+                col = np.empty(new_capacity, dtype)
+                col[: self._length] = self._columns[name][: self._length]
+                grown[name] = col
+            self._columns = grown
+
+        in_order = self._length == 0 or rows["epoch"][0] >= self._columns["epoch"][self._length - 1]
+        for name, dtype in COLUMNS.items():
+            self._columns[name][self._length : needed] = np.asarray(rows[name], dtype=dtype)
+        self._length = needed
+
+        epoch = self.epoch
+        if not in_order or (count > 1 and np.any(np.diff(epoch[-count:]) < 0)):
+            # Rare: tracker clock went backwards. Copy, so pinned snapshots stay valid.
+            order = np.argsort(epoch, kind="stable")
+            self._columns = {
+                name: np.concatenate([col[: self._length][order], np.empty(len(col) - self._length, col.dtype)])
+                for name, col in self._columns.items()
+            }
+
+    def replace_column(self, name: str, values: np.ndarray) -> None:
+        """Swap in new values for one column (copy-on-write; snapshots keep the old ones)."""
+        col = np.empty(len(self._columns[name]), COLUMNS[name])
+        col[: self._length] = values
+        self._columns = {**self._columns, name: col}
+
+    def timestamp_raw(self, idx: int) -> str:
+        raw_id = int(self.raw_id[idx])
+        if raw_id >= 0:
+            return self.raws[raw_id]
+        local = _EPOCH + timedelta(seconds=int(self.epoch[idx]) + int(self.utc_offset[idx]))
+        return local.isoformat()
+
+    def record(self, idx: int) -> dict:
+        """Materialise one row in the legacy dict shape used by load_activity_data()."""
+        if idx < 0:
+            idx += self._length
+        if not 0 <= idx < self._length:
+            raise IndexError(idx)
+        offset = int(self.utc_offset[idx])
+        dt_local = local_datetime(int(self.epoch[idx]) + offset, offset)
+        productivity = PRODUCTIVITY_LABELS[int(self.productivity[idx])]
+        return {
+            "timestamp": dt_local,
+            "timestamp_iso": dt_local.isoformat(),
+            "timestamp_raw": self.timestamp_raw(idx),
+            "timestamp_hour": dt_local.replace(minute=0, second=0, microsecond=0),
+            "app_name": self.apps[int(self.app_id[idx])],
+            "window_title": self.windows[int(self.window_id[idx])],
+            "idle_seconds": float(self.idle_seconds[idx]),
+            "active_seconds": float(self.active_seconds[idx]),
+            "productivity": productivity,
+        }
+
+    def __getitem__(self, idx: int) -> dict:
+        return self.record(idx)
+
+    def __iter__(self) -> Iterator[dict]:
+        for idx in range(self._length):
+            yield self.record(idx)
+
+    def nbytes(self) -> int:
+        """Bytes held by the live portion of the numeric columns."""
+        return sum(col[self._start : self._start + self._length].nbytes for col in self._columns.values())
@@ -5,13 +5,31 @@ This module reads the raw activity log and computes accurate statistics.
 from __future__ import annotations
 
 import json
-from datetime import datetime, timezone
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
 from typing import Any, Optional
-from collections import defaultdict
 
+import numpy as np
 from django.utils import timezone as dj_timezone
 
-from .paths import ACTIVITY_FILE  # shared data directory path
+from .activity_frame import (
+    COLUMNS,
+    NEUTRAL,
+    PRODUCTIVE,
+    PRODUCTIVITY_CODES,
+    PRODUCTIVITY_LABELS,
+    UNPRODUCTIVE,
+    ActivityFrame,
+    bucket_starts,
+    local_datetime,
+)
+from .activity_rollup import HourlyRollup, RollupTable, load_rollup, save_rollup
+from .log_partitions import LogRead, PartitionedLog, partitioned_log
+from .paths import ACTIVITY_FILE, ROLLUP_FILE  # shared data directory path
+from .timestamp_decoder import TimestampDecoder
+from .productivity_rules import RuleSet, classify_productivity, get_ruleset
+from . import switch_analytics
 
 
 def _parse_activity_line(line: str) -> Optional[dict]:
@@ -44,178 +62,706 @@ def _parse_iso_timestamp(ts_str: str) -> Optional[datetime]:
         return None
 
 
-def _format_hour_label(dt: datetime) -> str:
-    """Format hour as 24-hour HH:MM using local time."""
-    return dt.strftime("%H:%M")
+# Chart labels per bucket granularity (see activity_frame.GRANULARITIES); hours are 24-hour HH:MM
+BUCKET_LABEL_FORMATS = {"hour": "%H:%M", "day": "%a %d", "week": "%b %d"}
+
+
+def format_bucket_label(dt: datetime, granularity: str = "hour") -> str:
+    """Format the start of an hour, day or week bucket using local time."""
+    return dt.strftime(BUCKET_LABEL_FORMATS[granularity])
 
 
 def _classify_productivity(app_name: str, window_title: str) -> str:
     """
     Classify activity as productive/unproductive/neutral based on app and window.
-    This is a simple heuristic - expand as needed.
+    Rules live in productivity_rules (configurable, hot-reloaded).
     """
-    app_lower = app_name.lower()
-    window_lower = window_title.lower()
-    
-    # Productive apps/patterns
-    productive_apps = {"cursor", "vs code", "terminal", "figma", "github"}
-    productive_patterns = ["stormhacks", "code", "development", "programming"]
-    
-    # Unproductive apps/patterns
-    unproductive_apps = {"spotify"}
-    unproductive_patterns = ["youtube", "twitter", "facebook", "reddit", "qualifying highlights"]
-    
-    # Check productive
-    if any(prod in app_lower for prod in productive_apps):
-        return "productive"
-    if any(pattern in window_lower for pattern in productive_patterns):
-        return "productive"
-    
-    # Check unproductive
-    if any(unprod in app_lower for unprod in unproductive_apps):
-        return "unproductive"
-    if any(pattern in window_lower for pattern in unproductive_patterns):
-        return "unproductive"
-    
-    # Default to neutral
-    return "neutral"
+    return classify_productivity(app_name, window_title)
+
+
+# Assumed tracker polling interval; each line accounts for this much wall time.
+POLL_INTERVAL_SECONDS = 5.0
+
+
+def _decode_activities(records: list[dict], decoder: TimestampDecoder) -> list[tuple]:
+    """
+    Turn raw activity.jsonl objects into columnar rows:
+    (epoch, utc_offset, raw_or_None, app_name, window_title, idle_seconds).
+    Timestamps for the whole chunk are decoded in one vectorised call.
+    """
+    raws = [data["timestamp"] for data in records]
+    epoch, offsets, canonical, ok = decoder.decode_many(raws)
+    rows = []
+    for data, raw, ts, offset, is_canonical, valid in zip(
+        records, raws, epoch.tolist(), offsets.tolist(), canonical.tolist(), ok.tolist()
+    ):
+        if not valid:
+            continue
+        rows.append((
+            ts,
+            offset,
+            # Only keep the raw string when it cannot be rebuilt from the local time
+            None if is_canonical else raw,
+            data.get("app_name", "Unknown"),
+            data.get("window_title", ""),
+            float(data.get("idle_seconds", 0)),
+        ))
+    return rows
+
+
+@dataclass
+class _IngestCursor:
+    """Process-wide position in activity.jsonl plus the frame and hourly rollup built so far."""
+
+    offset: int = 0
+    inode: int = 0
+    size: int = 0
+    mtime_ns: int = 0
+    last_bytes: bytes = b""  # the bytes just before ``offset``, as they were ingested
+    tz_key: str = ""
+    rules_version: tuple = ()
+    decoder: Optional[TimestampDecoder] = None
+    frame: ActivityFrame = field(default_factory=ActivityFrame)
+    rollup: HourlyRollup = field(default_factory=HourlyRollup)
+    saved_rollup: Optional[tuple] = None  # (offset, rules version) last written to ROLLUP_FILE
+
+    def reset(self) -> None:
+        self.offset = 0
+        self.inode = 0
+        self.size = 0
+        self.mtime_ns = 0
+        self.last_bytes = b""
+        self.tz_key = ""
+        self.rules_version = ()
+        self.decoder = None
+        self.frame = ActivityFrame()
+        self.rollup = HourlyRollup()
+        self.saved_rollup = None
+
+
+_INGEST_LOCK = threading.Lock()
+_CURSOR = _IngestCursor()
+
+# How much of what was already ingested is re-read to notice a rewrite in place;
+# a tracker line is about 150 bytes, so this covers the last line or two
+CURSOR_CHECK_BYTES = 256
+
+
+def _append_rows(frame: ActivityFrame, rows: list[tuple], ruleset: Optional[RuleSet] = None) -> dict:
+    """Intern strings, classify and append decoded rows to the frame; returns the appended columns."""
+    classify = (ruleset or get_ruleset()).classify
+    epoch, offsets, idle, productivity, app_ids, window_ids, raw_ids = ([] for _ in range(7))
+    for ts, offset, raw, app_name, window_title, idle_seconds in rows:
+        epoch.append(ts)
+        offsets.append(offset)
+        idle.append(idle_seconds)
+        productivity.append(PRODUCTIVITY_CODES[classify(app_name, window_title)])
+        app_ids.append(frame.apps.intern(app_name))
+        window_ids.append(frame.windows.intern(window_title))
+        raw_ids.append(-1 if raw is None else frame.raws.intern(raw))
+
+    idle_arr = np.asarray(idle, dtype=np.float64)
+    # Calculate active time (assuming 5-second polling interval)
+    active = np.maximum(0.0, POLL_INTERVAL_SECONDS - np.minimum(idle_arr, POLL_INTERVAL_SECONDS))
+    values = {
+        "epoch": epoch,
+        "utc_offset": offsets,
+        "idle_seconds": idle_arr,
+        "active_seconds": active,
+        "productivity": productivity,
+        "app_id": app_ids,
+        "window_id": window_ids,
+        "raw_id": raw_ids,
+    }
+    # Stored dtypes, so a rollup folded from the batch sums exactly what the frame holds
+    batch = {name: np.asarray(values[name], dtype=dtype) for name, dtype in COLUMNS.items()}
+    frame.extend(batch)
+    return batch
+
+
+def _reclassify(frame: ActivityFrame, ruleset: RuleSet) -> None:
+    """Re-run the rules over every distinct (app, window) pair already in the frame."""
+    if not len(frame):
+        return
+    pairs = np.stack([frame.app_id, frame.window_id], axis=1)
+    unique_pairs, inverse = np.unique(pairs, axis=0, return_inverse=True)
+    codes = np.array(
+        [
+            PRODUCTIVITY_CODES[ruleset.classify(frame.apps[int(app_id)], frame.windows[int(window_id)])]
+            for app_id, window_id in unique_pairs
+        ],
+        dtype=np.int8,
+    )
+    frame.replace_column("productivity", codes[inverse.ravel()])
+
+
+def _restore_rollup(end: int, tz_key: str, ruleset: RuleSet) -> None:
+    """
+    Start the rollup from ROLLUP_FILE when it was saved for this timezone and
+    log, seeding the frame's app ids from it; otherwise start an empty one.
+    Caller holds _INGEST_LOCK with a freshly reset cursor.
+    """
+    saved = load_rollup(ROLLUP_FILE)
+    if saved is not None and saved[0].tz_key == tz_key and saved[0].offset <= end:
+        rollup, apps = saved
+        for name in apps:
+            _CURSOR.frame.apps.intern(name)
+        _CURSOR.rollup = rollup
+        _CURSOR.saved_rollup = (rollup.offset, rollup.rules_version)
+    else:
+        _CURSOR.rollup = HourlyRollup(tz_key, ruleset.version)
+
+
+def _ingest_lines(data: bytes, ruleset: RuleSet) -> Optional[dict]:
+    lines = data.decode("utf-8", errors="replace").splitlines()
+    records = [record for record in map(_parse_activity_line, lines) if record]
+    rows = _decode_activities(records, _CURSOR.decoder)
+    return _append_rows(_CURSOR.frame, rows, ruleset) if rows else None
+
+
+def _restart_cursor(inode: int, local_tz, end: int, ruleset: RuleSet, resume: bool = True) -> None:
+    """
+    Reset the cursor to the start of the log for ``local_tz``. The rollup resumes
+    from ROLLUP_FILE only when ``resume``. Caller holds _INGEST_LOCK.
+    """
+    _CURSOR.reset()
+    _CURSOR.inode = inode
+    _CURSOR.tz_key = str(local_tz)
+    _CURSOR.decoder = TimestampDecoder(local_tz)
+    if resume:
+        _restore_rollup(end, _CURSOR.tz_key, ruleset)
+    else:
+        _CURSOR.rollup = HourlyRollup(_CURSOR.tz_key, ruleset.version)
+
+
+def _read_past_cursor(log: PartitionedLog) -> Optional[LogRead]:
+    """
+    The log from the cursor on, read from a little before it so the bytes
+    already ingested can be compared with what is there now. None when they
+    differ: the file was truncated and rewritten to at least its old size.
+    """
+    start = _CURSOR.offset - len(_CURSOR.last_bytes)
+    read = log.read_from(start)
+    # Retention may have taken the bytes before the cursor; nothing to compare then
+    if read.start == start and not read.data.startswith(_CURSOR.last_bytes):
+        return None
+    skip = max(0, _CURSOR.offset - read.start)
+    return LogRead(read.data[skip:], read.start + skip, read.end)
+
+
+def _ingest_new_lines() -> None:
+    """
+    Parse only the bytes appended to activity.jsonl since the last call, and
+    fold them into the hourly rollup. Offsets are logical offsets into the
+    partitioned log, so rotating the hot file into daily partitions does not
+    disturb the cursor. Falls back to a full rescan when the file was
+    truncated or replaced (inode change, or the bytes before the cursor are
+    no longer the ones ingested), the cursor fell behind retention, or the
+    active timezone changed; the rollup then resumes from ROLLUP_FILE, unless
+    the file was rewritten in place and the saved rollup describes old lines.
+    Caller holds _INGEST_LOCK.
+    """
+    stat = ACTIVITY_FILE.stat()
+    log = partitioned_log(ACTIVITY_FILE)
+    end = log.end()
+    local_tz = dj_timezone.get_current_timezone()
+    ruleset = get_ruleset()
+
+    if (
+        stat.st_ino != _CURSOR.inode
+        or end < _CURSOR.offset
+        or str(local_tz) != _CURSOR.tz_key
+    ):
+        _restart_cursor(stat.st_ino, local_tz, end, ruleset)
+
+    if ruleset.version != _CURSOR.rules_version:
+        _reclassify(_CURSOR.frame, ruleset)
+        _CURSOR.rules_version = ruleset.version
+
+    _CURSOR.size = end
+    # Appends always move mtime; an unchanged mtime and size mean nothing to read
+    if end > _CURSOR.offset or stat.st_mtime_ns != _CURSOR.mtime_ns:
+        read = _read_past_cursor(log)
+        if read is None:
+            _restart_cursor(stat.st_ino, local_tz, end, ruleset, resume=False)
+            _CURSOR.rules_version = ruleset.version
+            read = log.read_from(0)
+        _CURSOR.mtime_ns = stat.st_mtime_ns
+        if read.start != _CURSOR.offset:
+            # Rows between the cursor and read.start were deleted by retention;
+            # app ids stay, as the rollup refers to them
+            if len(_CURSOR.frame):
+                _CURSOR.frame = ActivityFrame(apps=_CURSOR.frame.apps)
+            _CURSOR.offset = read.start
+            _CURSOR.last_bytes = b""
+        chunk = read.data
+
+        # Only consume complete lines; a trailing fragment is accepted only when it
+        # already parses (final line without newline), otherwise it is re-read later.
+        end = chunk.rfind(b"\n") + 1
+        tail = chunk[end:]
+        if tail.strip() and _parse_activity_line(tail.decode("utf-8", errors="replace")):
+            end = len(chunk)
+
+        # Lines before the rollup's offset were folded before a restart
+        rollup = _CURSOR.rollup
+        split = min(max(rollup.offset - _CURSOR.offset, 0), end)
+        _ingest_lines(chunk[:split], ruleset)
+        batch = _ingest_lines(chunk[split:end], ruleset)
+        if batch is not None:
+            rollup.fold(batch)
+        _CURSOR.offset += end
+        _CURSOR.last_bytes = (_CURSOR.last_bytes + chunk[:end])[-CURSOR_CHECK_BYTES:]
+        rollup.offset = _CURSOR.offset
+
+    if _CURSOR.rollup.rules_version != ruleset.version:
+        _CURSOR.rollup.rebuild(_CURSOR.frame, ruleset.version)
+
+
+def _load_activity() -> tuple[ActivityFrame, RollupTable]:
+    with _INGEST_LOCK:
+        if not ACTIVITY_FILE.exists():
+            _CURSOR.reset()
+            return ActivityFrame(), _CURSOR.rollup.table()
+        _ingest_new_lines()
+        return _CURSOR.frame.snapshot(), _CURSOR.rollup.table()
+
+
+def load_activity_frame() -> ActivityFrame:
+    """
+    Load and parse all retained activity: the daily partitions plus activity.jsonl.
+    Returns a columnar ActivityFrame snapshot sorted by timestamp.
+
+    Rows are kept in a process-wide append-only frame, so repeated calls only
+    parse lines appended since the previous call. ``frame[i]`` still yields the
+    legacy enriched dict for callers that want one row at a time.
+    """
+    return _load_activity()[0]
 
 
 def load_activity_data() -> list[dict]:
     """
     Load and parse all activity from activity.jsonl.
     Returns list of enriched activity records with parsed timestamps.
+
+    Builds one dict per row from load_activity_frame(); the dashboard reads the
+    frame directly.
     """
-    if not ACTIVITY_FILE.exists():
-        return []
-    
-    activities = []
-    with open(ACTIVITY_FILE, "r", encoding="utf-8") as f:
-        for line in f:
-            data = _parse_activity_line(line)
-            if not data:
-                continue
-            
-            # Parse timestamp
-            dt = _parse_iso_timestamp(data["timestamp"])
-            if not dt:
-                continue
-            
-            # Convert to local timezone (noop if already local)
-            local_tz = dj_timezone.get_current_timezone()
-            dt_local = dt.astimezone(local_tz)
-            
-            # Enrich the record
-            record = {
-                "timestamp": dt_local,
-                "timestamp_iso": dt_local.isoformat(),
-                "timestamp_raw": data.get("timestamp", ""),
-                "timestamp_hour": dt_local.replace(minute=0, second=0, microsecond=0),
-                "app_name": data.get("app_name", "Unknown"),
-                "window_title": data.get("window_title", ""),
-                "idle_seconds": float(data.get("idle_seconds", 0)),
-            }
-            
-            # Calculate active time (assuming 5-second polling interval)
-            poll_interval = 5.0
-            active_seconds = max(0, poll_interval - min(record["idle_seconds"], poll_interval))
-            record["active_seconds"] = active_seconds
-            
-            # Classify productivity
-            record["productivity"] = _classify_productivity(
-                record["app_name"], 
-                record["window_title"]
-            )
-            
-            activities.append(record)
-    
-    # Sort by timestamp
-    activities.sort(key=lambda x: x["timestamp"])
-    return activities
+    return list(load_activity_frame())
+
+
+# A tracker line older than this no longer says what is on screen
+FOREGROUND_MAX_AGE_SECONDS = 6 * POLL_INTERVAL_SECONDS
+# Bytes read from the end of activity.jsonl to find its last line
+_TAIL_BYTES = 4096
+
+
+def foreground_window(max_age: float = FOREGROUND_MAX_AGE_SECONDS) -> Optional[tuple[str, str]]:
+    """
+    (app_name, window_title) of the last line the tracker wrote to
+    activity.jsonl, or None when there is no line from the last ``max_age``
+    seconds (tracker stopped, or the file was just rotated).
+    """
+    try:
+        with ACTIVITY_FILE.open("rb") as fh:
+            size = fh.seek(0, 2)
+            fh.seek(max(0, size - _TAIL_BYTES))
+            tail = fh.read()
+    except OSError:
+        return None
+    for line in reversed(tail.splitlines()):
+        data = _parse_activity_line(line.decode("utf-8", errors="replace"))
+        if data is None:
+            continue
+        stamp = _parse_iso_timestamp(data["timestamp"])
+        if stamp is None or dj_timezone.now().timestamp() - stamp.timestamp() > max_age:
+            return None
+        return data["app_name"], data.get("window_title", "")
+    return None
+
+
+def save_activity_rollup() -> bool:
+    """
+    Ingest new lines and write the hourly rollup to ROLLUP_FILE if it changed
+    since the last save. Returns whether a file was written.
+    """
+    with _INGEST_LOCK:
+        if not ACTIVITY_FILE.exists():
+            return False
+        _ingest_new_lines()
+        rollup = _CURSOR.rollup
+        state = (rollup.offset, rollup.rules_version)
+        if state == _CURSOR.saved_rollup:
+            return False
+        saved = load_rollup(ROLLUP_FILE)
+        if saved is not None and saved[0].tz_key == rollup.tz_key and saved[0].offset > rollup.offset:
+            # Another process is further along; its file already covers ours
+            return False
+        save_rollup(ROLLUP_FILE, rollup, list(_CURSOR.frame.apps.values))
+        _CURSOR.saved_rollup = state
+        return True
+
+
+# Size of the activity feed shown on the timeline page.
+EVENT_FEED_LIMIT = 200
+# Days in the overview's weeklyProductivity series
+WEEKLY_DAYS = 7
+
+
+@dataclass(frozen=True)
+class ActivityAggregate:
+    """
+    Every accumulator the dashboard sections read, filled in one pass over a
+    frame. The ``hour_*`` series are per time bucket: hours by default, or
+    days or weeks per ``granularity``.
+    """
+
+    hours: np.ndarray  # local wall-clock bucket starts, ascending
+    hour_offsets: np.ndarray  # UTC offset of each bucket's first row
+    hour_seconds: np.ndarray  # (buckets, 3) active seconds per productivity code
+    hour_switches: np.ndarray  # app switches attributed to each bucket
+    hour_segments: np.ndarray  # app segments per bucket: its first row plus switches inside it
+    hour_app_minutes: np.ndarray  # (buckets, apps) active minutes
+    hour_app_present: np.ndarray  # (buckets, apps) whether the app was seen in that bucket
+    app_ranking: np.ndarray  # seen app ids by total minutes desc, first-seen tiebreak
+    totals: np.ndarray  # (3,) active seconds per productivity code
+    idle_seconds: float
+    app_names: list[str]
+    events: list[dict]  # most recent EVENT_FEED_LIMIT records in feed shape
+    top_pairs: list[tuple[int, int, int]]  # most frequent (from app id, to app id, count)
+    days: np.ndarray  # local day starts of the last WEEKLY_DAYS days with rows
+    day_offsets: np.ndarray
+    day_seconds: np.ndarray  # (days, 3) active seconds per productivity code
+    granularity: str = "hour"
+
+
+# Last aggregate built, keyed on the identity of its sources (frame columns,
+# rollup table), the row window and the granularity
+_AGGREGATE_CACHE: dict[str, Any] = {"sources": (), "key": None, "aggregate": None}
+_AGGREGATE_LOCK = threading.Lock()
+
+
+def _hour_iso(hour_local: int, utc_offset: int) -> str:
+    return local_datetime(hour_local, utc_offset).isoformat()
+
+
+def _activity_events(activities: ActivityFrame, limit: int = EVENT_FEED_LIMIT) -> list[dict]:
+    """Most recent ``limit`` records in the activity feed shape."""
+    return activity_events_between(activities, max(0, len(activities) - limit), len(activities))
+
+
+def activity_events_between(activities: ActivityFrame, start: int, stop: int) -> list[dict]:
+    """Rows ``start:stop`` of the frame in the activity feed shape."""
+    events = []
+    for idx in range(max(0, start), min(stop, len(activities))):
+        productivity = PRODUCTIVITY_LABELS[int(activities.productivity[idx])]
+        events.append({
+            # Show the original timestamp string from the JSON source (no reformatting)
+            "ts": activities.timestamp_raw(idx),
+            "app": activities.apps[int(activities.app_id[idx])],
+            "window": activities.windows[int(activities.window_id[idx])],
+            "domain": None,  # Could extract from window_title if needed
+            "idleSec": int(activities.idle_seconds[idx]),
+            "category": productivity,
+            "productivity": productivity,
+        })
+    return events
 
 
-def compute_hourly_productivity(activities: list[dict]) -> list[dict]:
+def _recent_days(activities: ActivityFrame, days: int = WEEKLY_DAYS) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Day starts, their UTC offsets and (days, 3) active seconds for the frame's last ``days`` local days."""
+    n_codes = len(PRODUCTIVITY_LABELS)
+    if not len(activities):
+        return np.empty(0, np.int64), np.empty(0, np.int32), np.empty((0, n_codes))
+    # Binary search to the tail; the extra day covers UTC offset changes
+    recent = activities.between(int(activities.epoch[-1]) - (days + 1) * 86400)
+    day_local = bucket_starts(recent.local_seconds, "day")
+    keep = np.flatnonzero(day_local >= day_local.max() - (days - 1) * 86400)
+    starts, first, inverse = np.unique(day_local[keep], return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    seconds = np.bincount(
+        inverse * n_codes + recent.productivity[keep],
+        weights=recent.active_seconds[keep].astype(np.float64),
+        minlength=len(starts) * n_codes,
+    ).reshape(len(starts), n_codes)
+    return starts, recent.utc_offset[keep][first], seconds
+
+
+def _build_aggregate(activities: ActivityFrame, granularity: str = "hour") -> ActivityAggregate:
+    n_codes = len(PRODUCTIVITY_LABELS)
+    n_apps = len(activities.apps)
+
+    # Bucket every row once; all accumulators key off `inverse`
+    buckets = bucket_starts(activities.local_seconds, granularity)
+    hours, first, inverse = np.unique(buckets, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    n_hours = len(hours)
+    active = activities.active_seconds.astype(np.float64)
+    codes = activities.productivity
+    app_ids = activities.app_id
+
+    hour_seconds = np.bincount(
+        inverse * n_codes + codes, weights=active, minlength=n_hours * n_codes
+    ).reshape(n_hours, n_codes)
+
+    # A switch is attributed to the hour of the record that follows the change
+    changed = np.flatnonzero(switch_analytics.change_mask(app_ids))
+    hour_switches = np.bincount(inverse[changed], minlength=n_hours)
+
+    app_keys = inverse * n_apps + app_ids
+    hour_app_minutes = np.bincount(
+        app_keys, weights=active / 60.0, minlength=n_hours * n_apps
+    ).reshape(n_hours, n_apps)
+    hour_app_present = np.bincount(app_keys, minlength=n_hours * n_apps).reshape(n_hours, n_apps) > 0
+
+    seen_apps, first_seen = np.unique(app_ids, return_index=True)
+    app_totals = hour_app_minutes[:, seen_apps].sum(axis=0)
+    app_ranking = seen_apps[np.lexsort((first_seen, -app_totals))]
+    days, day_offsets, day_seconds = _recent_days(activities)
+
+    return ActivityAggregate(
+        hours=hours,
+        hour_offsets=activities.utc_offset[first],
+        hour_seconds=hour_seconds,
+        hour_switches=hour_switches,
+        hour_segments=switch_analytics.hour_segments(app_ids, inverse, n_hours),
+        hour_app_minutes=hour_app_minutes,
+        hour_app_present=hour_app_present,
+        app_ranking=app_ranking,
+        totals=np.bincount(codes, weights=active, minlength=n_codes),
+        # Idle time counts the time the user was away
+        idle_seconds=float(activities.idle_seconds.astype(np.float64).sum()),
+        app_names=list(activities.apps.values[:n_apps]),
+        events=_activity_events(activities),
+        top_pairs=switch_analytics.top_pairs(app_ids),
+        days=days,
+        day_offsets=day_offsets,
+        day_seconds=day_seconds,
+        granularity=granularity,
+    )
+
+
+def _rollup_aggregate(
+    table: RollupTable,
+    app_names: list[str],
+    events: list[dict],
+    top_pairs: list[tuple[int, int, int]],
+    start: Optional[int],
+    stop: Optional[int],
+    granularity: str = "hour",
+) -> ActivityAggregate:
+    """
+    The aggregate of the hours starting in [start, stop), summed from a
+    rollup table whose app ids index ``app_names``. The event feed and top
+    pairs need the raw rows, so callers supply them for the same window.
+    """
+    n_codes = len(PRODUCTIVITY_LABELS)
+    n_apps = len(app_names)
+
+    hour_epochs = table.hours - table.hour_offsets
+    selected = np.ones(len(table.hours), dtype=bool)
+    if start is not None:
+        selected &= hour_epochs >= start
+    if stop is not None:
+        selected &= hour_epochs < stop
+    hours = table.hours[selected]
+    in_window = np.isin(table.keys["hour"], hours)
+    keys = {name: values[in_window] for name, values in table.keys.items()}
+    active = keys["active"]
+    codes = keys["productivity"].astype(np.int64)
+    app_ids = keys["app"].astype(np.int64)
+
+    buckets, first_hour = np.unique(bucket_starts(hours, granularity), return_index=True)
+    n_buckets = len(buckets)
+    key_bucket = np.searchsorted(buckets, bucket_starts(keys["hour"], granularity))
+
+    hour_seconds = np.bincount(
+        key_bucket * n_codes + codes, weights=active, minlength=n_buckets * n_codes
+    ).reshape(n_buckets, n_codes)
+    hour_switches = np.bincount(key_bucket, weights=keys["switches"], minlength=n_buckets).astype(np.int64)
+    first_switch = table.first_switch[selected][first_hour].astype(np.int64)
+    if n_buckets and first_switch[0]:
+        # The change into the window's first sample is not a switch within it
+        hour_switches[0] -= 1
+        first_switch[0] = 0
+
+    app_keys = key_bucket * n_apps + app_ids
+    hour_app_minutes = np.bincount(
+        app_keys, weights=active / 60.0, minlength=n_buckets * n_apps
+    ).reshape(n_buckets, n_apps)
+    hour_app_present = np.bincount(app_keys, minlength=n_buckets * n_apps).reshape(n_buckets, n_apps) > 0
+
+    # Key rows are in first-appearance order, which gives the same tiebreak as row order
+    seen_apps, first_seen = np.unique(app_ids, return_index=True)
+    app_totals = hour_app_minutes[:, seen_apps].sum(axis=0)
+    app_ranking = seen_apps[np.lexsort((first_seen, -app_totals))]
+
+    day_of_key = bucket_starts(keys["hour"], "day")
+    recent = np.empty(0, dtype=np.intp)
+    if len(day_of_key):
+        recent = np.flatnonzero(day_of_key >= day_of_key.max() - (WEEKLY_DAYS - 1) * 86400)
+    days, day_inverse = np.unique(day_of_key[recent], return_inverse=True)
+    day_seconds = np.bincount(
+        day_inverse.ravel() * n_codes + codes[recent], weights=active[recent], minlength=len(days) * n_codes
+    ).reshape(len(days), n_codes)
+    hour_days, first_of_day = np.unique(bucket_starts(hours, "day"), return_index=True)
+    day_offsets = table.hour_offsets[selected][first_of_day][np.searchsorted(hour_days, days)]
+
+    return ActivityAggregate(
+        hours=buckets,
+        hour_offsets=table.hour_offsets[selected][first_hour],
+        hour_seconds=hour_seconds,
+        hour_switches=hour_switches,
+        hour_segments=hour_switches + 1 - first_switch,
+        hour_app_minutes=hour_app_minutes,
+        hour_app_present=hour_app_present,
+        app_ranking=app_ranking,
+        totals=np.bincount(codes, weights=active, minlength=n_codes),
+        idle_seconds=float(keys["idle"].sum()),
+        app_names=list(app_names),
+        events=events,
+        top_pairs=top_pairs,
+        days=days,
+        day_offsets=day_offsets,
+        day_seconds=day_seconds,
+        granularity=granularity,
+    )
+
+
+def _memoised(sources: tuple, key: tuple, build) -> ActivityAggregate:
+    with _AGGREGATE_LOCK:
+        cached = _AGGREGATE_CACHE["aggregate"]
+        if (
+            cached is not None
+            and len(_AGGREGATE_CACHE["sources"]) == len(sources)
+            and all(old is new for old, new in zip(_AGGREGATE_CACHE["sources"], sources))
+            and _AGGREGATE_CACHE["key"] == key
+        ):
+            return cached
+    aggregate = build()
+    with _AGGREGATE_LOCK:
+        _AGGREGATE_CACHE.update(sources=sources, key=key, aggregate=aggregate)
+    return aggregate
+
+
+def aggregate_activity(activities: ActivityFrame | ActivityAggregate, granularity: str = "hour") -> ActivityAggregate:
+    """
+    Fused aggregation over a frame: per-bucket productivity seconds, switches
+    and per-app minutes, app totals and the event feed tail, all in one pass.
+    Buckets are local hours, days or weeks per ``granularity``. The last result
+    is memoised, so every section builder shares one aggregate.
+    """
+    if isinstance(activities, ActivityAggregate):
+        return activities
+    return _memoised(
+        (activities._columns,),
+        ("frame", activities._start, len(activities), granularity),
+        lambda: _build_aggregate(activities, granularity),
+    )
+
+
+def _hour_aligned(epoch: Optional[int]) -> bool:
+    if epoch is None:
+        return True
+    local = datetime.fromtimestamp(epoch, dj_timezone.get_current_timezone())
+    return local.minute == 0 and local.second == 0 and local.microsecond == 0
+
+
+def activity_aggregate(
+    start: Optional[int] = None,
+    stop: Optional[int] = None,
+    granularity: str = "hour",
+) -> ActivityAggregate:
+    """
+    The aggregate for activity with ``start <= epoch < stop`` (None leaves a
+    side open). Windows on local hour boundaries, which every date-based query
+    is, are summed from the hourly rollup and include hours whose raw lines
+    retention has deleted; other windows are aggregated from the raw rows.
+    """
+    activities, table = _load_activity()
+    window = activities.between(start, stop)
+    if not (_hour_aligned(start) and _hour_aligned(stop)):
+        return aggregate_activity(window, granularity)
+    return _memoised(
+        (activities._columns, table),
+        ("rollup", window._start, len(window), start, stop, granularity),
+        lambda: _rollup_aggregate(
+            table,
+            window.apps.values[: len(window.apps)],
+            _activity_events(window),
+            switch_analytics.top_pairs(window.app_id),
+            start,
+            stop,
+            granularity,
+        ),
+    )
+
+
+def compute_hourly_productivity(activities: ActivityFrame | ActivityAggregate) -> list[dict]:
     """
     Compute hourly productive/unproductive percentages.
     Returns list of {hour, productive, unproductive} dicts.
     """
-    if not activities:
+    agg = aggregate_activity(activities)
+    if not len(agg.hours):
         return []
-    
-    # Group by hour
-    hourly_data = defaultdict(lambda: {"productive": 0.0, "unproductive": 0.0, "neutral": 0.0})
-    
-    for record in activities:
-        hour = record["timestamp_hour"]
-        active_secs = record["active_seconds"]
-        productivity = record["productivity"]
-        
-        if productivity == "productive":
-            hourly_data[hour]["productive"] += active_secs
-        elif productivity == "unproductive":
-            hourly_data[hour]["unproductive"] += active_secs
-        else:
-            hourly_data[hour]["neutral"] += active_secs
-    
-    # Convert to percentages
+
+    totals = agg.hour_seconds.sum(axis=1)
+
     result = []
-    for hour in sorted(hourly_data.keys()):
-        data = hourly_data[hour]
-        total = data["productive"] + data["unproductive"] + data["neutral"]
-        
+    for idx in range(len(agg.hours)):
+        total = totals[idx]
         if total > 0:
-            prod_pct = (data["productive"] / total) * 100
-            unprod_pct = (data["unproductive"] / total) * 100
+            prod_pct = (agg.hour_seconds[idx, PRODUCTIVE] / total) * 100
+            unprod_pct = (agg.hour_seconds[idx, UNPRODUCTIVE] / total) * 100
         else:
             prod_pct = 0.0
             unprod_pct = 0.0
-        
+
         result.append({
-            "hour": hour.isoformat(),
-            "productive": round(prod_pct, 2),
-            "unproductive": round(unprod_pct, 2),
+            "hour": _hour_iso(agg.hours[idx], agg.hour_offsets[idx]),
+            "productive": round(float(prod_pct), 2),
+            "unproductive": round(float(unprod_pct), 2),
         })
-    
+
     return result
 
 
-def compute_context_switches(activities: list[dict]) -> list[dict]:
+def compute_context_switches(activities: ActivityFrame | ActivityAggregate) -> list[dict]:
     """
     Count context switches (app changes) per hour.
     Returns list of {hour, switches} dicts.
     """
-    if not activities:
-        return []
-    
-    hourly_switches = defaultdict(int)
-    prev_app = None
-    
-    for record in activities:
-        current_app = record["app_name"]
-        
-        # Count a switch if app changed
-        if prev_app is not None and prev_app != current_app:
-            hour = record["timestamp_hour"]
-            hourly_switches[hour] += 1
-        
-        prev_app = current_app
-    
-    result = []
-    for hour in sorted(hourly_switches.keys()):
-        result.append({
-            "hour": hour.isoformat(),
-            "switches": hourly_switches[hour],
-        })
-    
-    return result
+    agg = aggregate_activity(activities)
+    return [
+        {"hour": _hour_iso(agg.hours[idx], agg.hour_offsets[idx]), "switches": int(agg.hour_switches[idx])}
+        for idx in np.flatnonzero(agg.hour_switches)
+    ]
+
+
+def compute_daily_productivity(activities: ActivityFrame | ActivityAggregate) -> list[dict]:
+    """
+    Productive share of active time for each of the last WEEKLY_DAYS days
+    that had any. Returns list of {day, productivity} dicts.
+    """
+    agg = aggregate_activity(activities)
+    totals = agg.day_seconds.sum(axis=1)
+    return [
+        {
+            "day": _hour_iso(agg.days[idx], agg.day_offsets[idx]),
+            "productivity": round(float(agg.day_seconds[idx, PRODUCTIVE] / totals[idx] * 100), 2),
+        }
+        for idx in np.flatnonzero(totals > 0)
+    ]
 
 
-def compute_productivity_summary(activities: list[dict]) -> dict:
+def compute_productivity_summary(activities: ActivityFrame | ActivityAggregate) -> dict:
     """
     Compute overall productivity summary in minutes.
     Returns {productive, unproductive, idle, total_minutes}.
     """
-    if not activities:
+    agg = aggregate_activity(activities)
+    if not len(agg.hours):
         return {
             "productive": 0.0,
             "unproductive": 0.0,
@@ -223,91 +769,58 @@ def compute_productivity_summary(activities: list[dict]) -> dict:
             "neutral": 0.0,
             "total_minutes": 0.0,
         }
-    
-    totals = {"productive": 0.0, "unproductive": 0.0, "idle": 0.0, "neutral": 0.0}
-    
-    for record in activities:
-        active_secs = record["active_seconds"]
-        idle_secs = record["idle_seconds"]
-        productivity = record["productivity"]
-        
-        # Count active time by productivity
-        if productivity == "productive":
-            totals["productive"] += active_secs
-        elif productivity == "unproductive":
-            totals["unproductive"] += active_secs
-        else:
-            totals["neutral"] += active_secs
-        
-        # Count idle time (time user was away)
-        totals["idle"] += idle_secs
-    
+
     # Convert to minutes
     result = {
-        "productive": round(totals["productive"] / 60, 2),
-        "unproductive": round(totals["unproductive"] / 60, 2),
-        "idle": round(totals["idle"] / 60, 2),
-        "neutral": round(totals["neutral"] / 60, 2),
+        "productive": round(float(agg.totals[PRODUCTIVE]) / 60, 2),
+        "unproductive": round(float(agg.totals[UNPRODUCTIVE]) / 60, 2),
+        "idle": round(agg.idle_seconds / 60, 2),
+        "neutral": round(float(agg.totals[NEUTRAL]) / 60, 2),
     }
-    
+
     result["total_minutes"] = sum(result.values())
-    
+
     return result
 
 
-def build_timeline_data(activities: list[dict]) -> dict:
+def build_timeline_data(activities: ActivityFrame | ActivityAggregate) -> dict:
     """
     Build timeline data for the frontend.
     Returns {dailyTimeline, activityEvents} formatted for the UI.
     """
-    if not activities:
+    agg = aggregate_activity(activities)
+    if not len(agg.hours):
         return {
             "dailyTimeline": {"points": [], "config": {}},
             "activityEvents": [],
         }
-    
-    # Group by hour and app for stacked timeline
-    hourly_by_app = defaultdict(lambda: defaultdict(float))
-    
-    for record in activities:
-        hour = record["timestamp_hour"]
-        app = record["app_name"]
-        minutes = record["active_seconds"] / 60.0
-        hourly_by_app[hour][app] += minutes
-    
-    # Get top 5 apps by total time
-    app_totals = defaultdict(float)
-    for hour_data in hourly_by_app.values():
-        for app, minutes in hour_data.items():
-            app_totals[app] += minutes
-    
-    top_apps = sorted(app_totals.items(), key=lambda x: x[1], reverse=True)[:5]
-    top_app_names = [app for app, _ in top_apps]
-    
+
+    # Top 5 apps by total time get their own series; the rest fold into "Other"
+    top_ids = agg.app_ranking[:5]
+    top_mask = np.zeros(len(agg.app_names), dtype=bool)
+    top_mask[top_ids] = True
+
     # Build timeline points
     timeline_points = []
-    for hour in sorted(hourly_by_app.keys()):
-        point = {"name": _format_hour_label(hour)}
-        
-        hour_data = hourly_by_app[hour]
-        others = 0.0
-        
-        for app, minutes in hour_data.items():
-            if app in top_app_names:
-                point[app] = round(minutes, 2)
-            else:
-                others += minutes
-        
+    for idx in range(len(agg.hours)):
+        point = {"name": format_bucket_label(local_datetime(agg.hours[idx], agg.hour_offsets[idx]), agg.granularity)}
+
+        row_present = agg.hour_app_present[idx]
+        for app_id in top_ids:
+            if row_present[app_id]:
+                point[agg.app_names[int(app_id)]] = round(float(agg.hour_app_minutes[idx, app_id]), 2)
+
+        others = float(agg.hour_app_minutes[idx, row_present & ~top_mask].sum())
         if others > 0:
             point["Other"] = round(others, 2)
-        
+
         timeline_points.append(point)
-    
+
     # Build config for chart colors
     all_apps = set()
     for point in timeline_points:
         all_apps.update(k for k in point.keys() if k != "name")
-    
+
     colors = [
         "hsl(var(--chart-1))",
         "hsl(var(--chart-2))",
@@ -315,44 +828,32 @@ def build_timeline_data(activities: list[dict]) -> dict:
         "hsl(var(--chart-4))",
         "hsl(var(--chart-5))",
     ]
-    
+
     config = {}
     for i, app in enumerate(sorted(all_apps)):
         config[app] = {
             "label": app,
             "color": colors[i % len(colors)],
         }
-    
-    # Build activity events (last 200 for the feed)
-    events = []
-    for record in activities[-200:]:
-        events.append({
-            # Show the original timestamp string from the JSON source (no reformatting)
-            "ts": record.get("timestamp_raw") or record["timestamp_iso"],
-            "app": record["app_name"],
-            "window": record["window_title"],
-            "domain": None,  # Could extract from window_title if needed
-            "idleSec": int(record["idle_seconds"]),
-            "category": record["productivity"],
-            "productivity": record["productivity"],
-        })
-    
+
     return {
         "dailyTimeline": {
             "points": timeline_points,
             "config": config,
         },
-        "activityEvents": events,
+        "activityEvents": agg.events,
     }
 
 
-def build_overview_data(activities: list[dict]) -> dict:
+def build_overview_data(activities: ActivityFrame | ActivityAggregate) -> dict:
     """
     Build overview section data for the dashboard.
     """
-    summary = compute_productivity_summary(activities)
-    hourly_prod = compute_hourly_productivity(activities)
-    context_switches = compute_context_switches(activities)
+    agg = aggregate_activity(activities)
+    summary = compute_productivity_summary(agg)
+    hourly_prod = compute_hourly_productivity(agg)
+    context_switches = compute_context_switches(agg)
+    daily_prod = compute_daily_productivity(agg)
     
     # Productivity breakdown donut
     slices = []
@@ -381,7 +882,7 @@ def build_overview_data(activities: list[dict]) -> dict:
         dt = _parse_iso_timestamp(item["hour"])
         if dt:
             hourly_points.append({
-                "name": _format_hour_label(dt),
+                "name": format_bucket_label(dt, agg.granularity),
                 "productive": item["productive"],
                 "unproductive": item["unproductive"],
             })
@@ -397,13 +898,27 @@ def build_overview_data(activities: list[dict]) -> dict:
         dt = _parse_iso_timestamp(item["hour"])
         if dt:
             context_points.append({
-                "name": _format_hour_label(dt),
+                "name": format_bucket_label(dt, agg.granularity),
                 "switches": item["switches"],
             })
     
     context_config = {
         "switches": {"label": "Switches", "color": "hsl(var(--chart-1))"},
     }
+
+    # Day-over-day productivity; the header compares the last two points
+    weekly_points = []
+    for item in daily_prod:
+        dt = _parse_iso_timestamp(item["day"])
+        if dt:
+            weekly_points.append({
+                "name": dt.strftime("%a"),
+                "productivity": item["productivity"],
+            })
+
+    weekly_config = {
+        "productivity": {"label": "Productivity", "color": "hsl(var(--chart-2))"},
+    }
     
     return {
         "productivityBreakdown": {
@@ -419,7 +934,7 @@ def build_overview_data(activities: list[dict]) -> dict:
             "config": context_config,
         },
         "weeklyProductivity": {
-            "points": [],  # Would need historical data
-            "config": {},
+            "points": weekly_points,
+            "config": weekly_config,
         },
     }
@@ -0,0 +1,225 @@
+"""
+Hourly rollup of activity.jsonl, maintained as rows are ingested.
+
+One key row per (local hour, app, productivity) holds active and idle
+seconds, the sample count and the app switches that landed on that key (a
+switch belongs to the sample after the change). One row per hour holds its
+UTC offset and whether its first sample was a switch, which gives the hour's
+app segments: 1 + switches - first_switch. Every hourly dashboard chart can be
+summed from these few hundred rows instead of the raw samples.
+
+The rollup is saved to activity.rollup.npz with the logical offset of
+activity.jsonl it covers (see log_partitions), so hours whose raw lines
+retention has since deleted keep their charts. App ids are those of the
+ingest frame's StringTable, which is seeded from the saved app names.
+"""
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from .activity_frame import ActivityFrame, bucket_starts
+
+FORMAT_VERSION = 1
+
+# name -> dtype of the key rows, in storage order
+KEY_COLUMNS: dict[str, np.dtype] = {
+    "hour": np.dtype(np.int64),  # local wall-clock hour start, epoch seconds
+    "app": np.dtype(np.int32),
+    "productivity": np.dtype(np.int8),
+    "active": np.dtype(np.float64),
+    "idle": np.dtype(np.float64),
+    "samples": np.dtype(np.int64),
+    "switches": np.dtype(np.int64),
+}
+_SUMMED = ("active", "idle", "samples", "switches")
+
+
+@dataclass(frozen=True)
+class RollupTable:
+    """
+    Read-only arrays of a rollup at one moment. Key rows are sorted by hour
+    and, within an hour, by first appearance; hours are ascending.
+    """
+
+    keys: dict[str, np.ndarray]
+    hours: np.ndarray
+    hour_offsets: np.ndarray
+    first_switch: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.keys["hour"])
+
+
+class HourlyRollup:
+    """Mutable rollup; callers serialise access (activity_processor holds its ingest lock)."""
+
+    def __init__(self, tz_key: str = "", rules_version: tuple = ()) -> None:
+        self.tz_key = tz_key
+        self.rules_version = tuple(rules_version)
+        self.offset = 0  # logical offset of activity.jsonl folded so far
+        self.last_app = -1  # app id of the last folded sample
+        self._positions: dict[tuple[int, int, int], int] = {}
+        self._columns: dict[str, list] = {name: [] for name in KEY_COLUMNS}
+        self._hours: dict[int, tuple[int, bool]] = {}  # hour -> (utc offset, first sample was a switch)
+        self._table: Optional[RollupTable] = None
+
+    def __len__(self) -> int:
+        return len(self._columns["hour"])
+
+    def fold(self, batch: dict) -> None:
+        """
+        Add samples that follow everything folded so far. ``batch`` holds one
+        array per ActivityFrame column (epoch, utc_offset, app_id, productivity,
+        active_seconds, idle_seconds), in file order.
+        """
+        epoch = np.asarray(batch["epoch"], dtype=np.int64)
+        if not len(epoch):
+            return
+        offsets = np.asarray(batch["utc_offset"], dtype=np.int64)
+        hours = bucket_starts(epoch + offsets, "hour")
+        apps = np.asarray(batch["app_id"], dtype=np.int64)
+        codes = np.asarray(batch["productivity"], dtype=np.int64)
+
+        previous = np.concatenate(([self.last_app], apps[:-1]))
+        switches = (apps != previous) & (previous >= 0)
+
+        new_hours, first = np.unique(hours, return_index=True)
+        for hour, pos in zip(new_hours.tolist(), first.tolist()):
+            if hour not in self._hours:
+                self._hours[hour] = (int(offsets[pos]), bool(switches[pos]))
+
+        # One integer per (hour, app, productivity), so the grouping is a 1-D unique
+        width = int(apps.max()) + 1
+        composite = ((hours // 3600) * width + apps) * 3 + codes
+        keys, first, inverse = np.unique(composite, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+        sums = {
+            "active": np.bincount(inverse, weights=np.asarray(batch["active_seconds"], np.float64), minlength=len(keys)),
+            "idle": np.bincount(inverse, weights=np.asarray(batch["idle_seconds"], np.float64), minlength=len(keys)),
+            "samples": np.bincount(inverse, minlength=len(keys)),
+            "switches": np.bincount(inverse, weights=switches, minlength=len(keys)).astype(np.int64),
+        }
+        columns = self._columns
+        for idx in np.argsort(first, kind="stable").tolist():
+            pos = first[idx]
+            key = (int(hours[pos]), int(apps[pos]), int(codes[pos]))
+            slot = self._positions.get(key)
+            if slot is None:
+                self._positions[key] = len(columns["hour"])
+                for name, value in zip(("hour", "app", "productivity"), key):
+                    columns[name].append(value)
+                for name in _SUMMED:
+                    columns[name].append(sums[name][idx].item())
+            else:
+                for name in _SUMMED:
+                    columns[name][slot] += sums[name][idx].item()
+
+        self.last_app = int(apps[-1])
+        self._table = None
+
+    def rebuild(self, frame: ActivityFrame, rules_version: tuple) -> None:
+        """
+        Re-fold every hour the frame covers (after a rules change re-labelled
+        it). Older hours, whose raw lines are gone, keep their recorded labels.
+        """
+        self.rules_version = tuple(rules_version)
+        if not len(frame):
+            return
+        cutoff = int(frame.hour_local.min())
+        keep = [pos for pos, hour in enumerate(self._columns["hour"]) if hour < cutoff]
+        self._columns = {name: [values[pos] for pos in keep] for name, values in self._columns.items()}
+        self._positions = {
+            (hour, app, code): pos
+            for pos, (hour, app, code) in enumerate(
+                zip(self._columns["hour"], self._columns["app"], self._columns["productivity"])
+            )
+        }
+        self._hours = {hour: value for hour, value in self._hours.items() if hour < cutoff}
+        self.last_app = -1
+        self.fold(
+            {
+                "epoch": frame.epoch,
+                "utc_offset": frame.utc_offset,
+                "app_id": frame.app_id,
+                "productivity": frame.productivity,
+                "active_seconds": frame.active_seconds,
+                "idle_seconds": frame.idle_seconds,
+            }
+        )
+        self._table = None
+
+    def table(self) -> RollupTable:
+        """Arrays for readers; the same object is returned until the next change."""
+        if self._table is None:
+            keys = {name: np.asarray(self._columns[name], dtype=dtype) for name, dtype in KEY_COLUMNS.items()}
+            # Keys were appended in first-appearance order; a stable sort keeps it within each hour
+            order = np.argsort(keys["hour"], kind="stable")
+            keys = {name: values[order] for name, values in keys.items()}
+            hours = np.array(sorted(self._hours), dtype=np.int64)
+            self._table = RollupTable(
+                keys=keys,
+                hours=hours,
+                hour_offsets=np.array([self._hours[hour][0] for hour in hours.tolist()], dtype=np.int32),
+                first_switch=np.array([self._hours[hour][1] for hour in hours.tolist()], dtype=bool),
+            )
+        return self._table
+
+
+def save_rollup(path: Path, rollup: HourlyRollup, apps: list[str]) -> None:
+    """Write ``rollup`` (with the app names its ids refer to) atomically."""
+    table = rollup.table()
+    meta = {
+        "version": FORMAT_VERSION,
+        "tz_key": rollup.tz_key,
+        "rules_version": list(rollup.rules_version),
+        "offset": rollup.offset,
+        "last_app": rollup.last_app,
+        "apps": apps,
+    }
+    arrays = {f"key_{name}": values for name, values in table.keys.items()}
+    arrays.update(hours=table.hours, hour_offsets=table.hour_offsets, first_switch=table.first_switch)
+    arrays["meta"] = np.frombuffer(json.dumps(meta, ensure_ascii=False).encode("utf-8"), dtype=np.uint8)
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    with tmp.open("wb") as fh:
+        np.savez(fh, **arrays)
+    tmp.replace(path)
+
+
+def load_rollup(path: Path) -> Optional[tuple[HourlyRollup, list[str]]]:
+    """The saved rollup and its app names, or None when there is no usable file."""
+    try:
+        with np.load(path) as archive:
+            meta = json.loads(archive["meta"].tobytes().decode("utf-8"))
+            if meta.get("version") != FORMAT_VERSION:
+                return None
+            keys = {name: archive[f"key_{name}"] for name in KEY_COLUMNS}
+            hours, hour_offsets, first_switch = archive["hours"], archive["hour_offsets"], archive["first_switch"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+    rollup = HourlyRollup(meta["tz_key"], tuple(_freeze(meta["rules_version"])))
+    rollup.offset = int(meta["offset"])
+    rollup.last_app = int(meta["last_app"])
+    rollup._columns = {name: values.tolist() for name, values in keys.items()}
+    rollup._positions = {
+        (hour, app, code): pos
+        for pos, (hour, app, code) in enumerate(
+            zip(rollup._columns["hour"], rollup._columns["app"], rollup._columns["productivity"])
+        )
+    }
+    rollup._hours = {
+        hour: (offset, first)
+        for hour, offset, first in zip(hours.tolist(), hour_offsets.tolist(), first_switch.tolist())
+    }
+    return rollup, list(meta["apps"])
+
+
+def _freeze(value):
+    # JSON turns the rules version's tuples into lists
+    return tuple(_freeze(item) for item in value) if isinstance(value, list) else value
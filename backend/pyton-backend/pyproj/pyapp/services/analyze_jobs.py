@@ -0,0 +1,394 @@
+"""
+Background classification for POST /api/analyze/.
+
+The view saves each upload under a name of its own and enqueues a job; a pool
+of worker threads makes the Gemini call (or reuses the label of a
+near-identical recent screenshot of the same window, see label_cache.py)
+while the client polls /api/analyze/<id>/. The queue is bounded: when it is
+full, submit() raises QueueFull and the view answers 503 with a Retry-After
+estimate.
+
+Labels reach q_analysis.jsonl in the order the screenshots were accepted,
+whatever order the model calls finish in. Each job takes a ticket when it is
+queued, and a finished job is appended only after every earlier ticket has
+been appended or given up on. A call still running ANALYZE_TIMEOUT_SECONDS
+after it started is given up on, so it cannot hold back the jobs behind it;
+its late result is dropped. A watchdog thread checks for such calls, so they
+are given up on even when every worker is stuck, and each one given up on is
+handed to a fresh worker's slot: the stuck thread exits once its call returns
+(gemini_api bounds the call with an HTTP timeout). An entry's timestamp is
+taken with its ticket, when the screenshot is accepted, so the file stays in
+timestamp order.
+
+Jobs run in the server process that accepted them, but each status change is
+also written to JOBS_DIR/<id>.json, so a poll that reaches another worker
+process finds the job there. Those files go when the job leaves the history,
+or after JOB_FILE_MAX_AGE_SECONDS if the process that owned it is gone.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from .label_cache import DEFAULT_MAX_DISTANCE, DEFAULT_TTL_SECONDS, LabelCache
+from .paths import SCREENSHOT_DIR
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 32
+ANALYZE_TIMEOUT_SECONDS = 120.0
+# Finished jobs kept for the status route
+JOB_HISTORY = 1000
+# Status files left by processes that exited before their jobs left the history
+JOB_FILE_MAX_AGE_SECONDS = 24 * 3600
+# Retry-After guess before any call has finished, and its ceiling
+DEFAULT_JOB_SECONDS = 5.0
+MAX_RETRY_AFTER_SECONDS = 300
+
+PENDING_DIR = SCREENSHOT_DIR / "pending"
+JOBS_DIR = SCREENSHOT_DIR / "jobs"
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"Analyze queue is full; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+@dataclass
+class AnalyzeJob:
+    id: str
+    ticket: int
+    image: Path  # the upload, under PENDING_DIR until analysed
+    target: Path  # where it is moved afterwards (SCREENSHOT_DIR/<upload name>)
+    prompt: str
+    timestamp: str
+    status: str = QUEUED
+    entry: Optional[dict] = None
+    seq: Optional[int] = None
+    error: Optional[str] = None
+    started: Optional[float] = None  # time.monotonic()
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "timestamp": self.timestamp,
+            "filename": self.target.name,
+            "entry": self.entry,
+            "seq": self.seq,
+            "error": self.error,
+        }
+
+
+def local_timestamp() -> str:
+    """Local time to the second, as q_analysis.jsonl records it."""
+    return timezone.localtime(timezone.now()).replace(microsecond=0).isoformat(timespec="seconds")
+
+
+class AnalyzeQueue:
+    def __init__(
+        self,
+        analyze: Callable[[str, str], dict],
+        append: Callable[[dict], Any],
+        workers: int = DEFAULT_WORKERS,
+        size: int = DEFAULT_QUEUE_SIZE,
+        timeout: float = ANALYZE_TIMEOUT_SECONDS,
+        clock: Callable[[], str] = local_timestamp,
+        store: Optional[Path] = None,
+    ) -> None:
+        self.workers = workers
+        self.timeout = timeout
+        # Directory of per-job status files shared with other processes; None keeps jobs in memory
+        self.store = store
+        self._analyze = analyze
+        self._append = append
+        self._clock = clock
+        self._queue: queue.Queue[AnalyzeJob] = queue.Queue(size)
+        self._lock = threading.Lock()
+        # Serializes appends; taken before _lock, never inside it
+        self._append_lock = threading.Lock()
+        self._jobs: OrderedDict[str, AnalyzeJob] = OrderedDict()
+        self._issued = 0
+        self._next_ticket = 0
+        # Tickets not yet appended or given up on, and the results waiting on earlier ones
+        self._open: dict[int, AnalyzeJob] = {}
+        self._ready: dict[int, tuple[Optional[dict], Optional[str]]] = {}
+        self._durations: deque[float] = deque(maxlen=32)
+        self._threads: list[threading.Thread] = []
+        self._spawned = 0
+        # Calls given up on whose threads are still inside them
+        self._stuck = 0
+
+    # -- submitting ---------------------------------------------------------
+
+    def submit(self, image: Path, target: Path, prompt: str) -> AnalyzeJob:
+        """Queue ``image`` for classification; raises QueueFull instead of waiting."""
+        with self._lock:
+            if not self._threads:
+                for _ in range(self.workers):
+                    self._spawn_worker()
+                threading.Thread(target=self._watch, name="analyze-watchdog", daemon=True).start()
+            job = AnalyzeJob(uuid.uuid4().hex, self._issued, image, target, prompt, self._clock())
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFull(self._retry_after()) from None
+            # Tickets and timestamps follow queue order because all three happen under the lock
+            self._issued += 1
+            self._open[job.ticket] = job
+            self._jobs[job.id] = job
+            self._persist(job)
+            while len(self._jobs) > JOB_HISTORY:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.status not in (DONE, FAILED):
+                    break
+                self._jobs.popitem(last=False)
+                if self.store is not None:
+                    (self.store / f"{oldest.id}.json").unlink(missing_ok=True)
+        return job
+
+    def full(self) -> bool:
+        return self._queue.full()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts: dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                "workers": self.workers,
+                "queued": self._queue.qsize(),
+                "capacity": self._queue.maxsize,
+                "stuck": self._stuck,
+                "jobs": counts,
+            }
+
+    def retry_after(self) -> int:
+        with self._lock:
+            return self._retry_after()
+
+    def _retry_after(self) -> int:
+        """Seconds until a queue slot should be free: the backlog over the pool's throughput."""
+        mean = sum(self._durations) / len(self._durations) if self._durations else DEFAULT_JOB_SECONDS
+        waiting = self._queue.qsize() + self.workers
+        return max(1, min(MAX_RETRY_AFTER_SECONDS, math.ceil(waiting * mean / self.workers)))
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """The job's status, from this process or, failing that, the status file its own process wrote."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job.as_dict()
+        return _read_status(self.store, job_id) if self.store is not None else None
+
+    def _persist(self, job: AnalyzeJob) -> None:
+        """Write ``job``'s status file; the caller holds self._lock, so writes keep their order."""
+        if self.store is None:
+            return
+        path = self.store / f"{job.id}.json"
+        tmp = path.with_name(path.name + ".tmp")
+        try:
+            self.store.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(job.as_dict(), ensure_ascii=False), encoding="utf-8")
+            tmp.replace(path)
+        except OSError as exc:
+            LOG.warning("Could not write the status of job %s: %s", job.id, exc)
+
+    # -- working ------------------------------------------------------------
+
+    def _spawn_worker(self) -> None:
+        """Start a worker thread; the caller holds self._lock."""
+        thread = threading.Thread(target=self._work, name=f"analyze-worker-{self._spawned}", daemon=True)
+        self._spawned += 1
+        thread.start()
+        self._threads = [worker for worker in self._threads if worker.is_alive()] + [thread]
+
+    def _watch(self) -> None:
+        # Expires a stuck call at the head of the line even when no worker is free to
+        while True:
+            time.sleep(min(1.0, self.timeout / 4))
+            self._release()
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                job.status = RUNNING
+                job.started = time.monotonic()
+                self._persist(job)
+            result = error = None
+            try:
+                result = self._analyze(str(job.image), job.prompt)
+            except Exception as exc:
+                LOG.exception("Screenshot analysis failed for job %s", job.id)
+                error = f"{type(exc).__name__}: {exc}"
+            try:
+                os.replace(job.image, job.target)
+            except OSError:
+                LOG.warning("Could not move %s to %s", job.image, job.target)
+            with self._lock:
+                self._durations.append(time.monotonic() - job.started)
+                if job.ticket not in self._open:
+                    # Given up on, and a new worker took this one's place
+                    self._stuck -= 1
+                    return
+                self._ready[job.ticket] = (result, error)
+            self._release()
+
+    def _release(self) -> None:
+        """Append finished jobs in ticket order, up to the first one still running."""
+        with self._append_lock:
+            while True:
+                with self._lock:
+                    job = self._open.get(self._next_ticket)
+                    if job is None:
+                        return
+                    if job.ticket not in self._ready:
+                        if job.started is None or time.monotonic() - job.started < self.timeout:
+                            return
+                        LOG.warning("Analysis for job %s timed out; appending later jobs without it", job.id)
+                        del self._open[job.ticket]
+                        self._next_ticket += 1
+                        job.status, job.error = FAILED, f"Timed out after {self.timeout:.0f}s"
+                        self._persist(job)
+                        # Its thread is still blocked in the call; the pool keeps its size
+                        self._stuck += 1
+                        self._spawn_worker()
+                        continue
+                    result, error = self._ready.pop(job.ticket)
+                    del self._open[job.ticket]
+                    self._next_ticket += 1
+                    if error is not None:
+                        job.status, job.error = FAILED, error
+                        self._persist(job)
+                        continue
+                entry = {
+                    "timestamp": job.timestamp,
+                    "app_name": result.get("app_name", "unknown"),
+                    "window_title": result.get("window_title", "unknown"),
+                    "productive": result.get("productive", None),
+                }
+                try:
+                    commit = self._append(entry)
+                except Exception as exc:
+                    LOG.exception("Appending the label for job %s failed", job.id)
+                    with self._lock:
+                        job.status, job.error = FAILED, f"{type(exc).__name__}: {exc}"
+                        self._persist(job)
+                    continue
+                with self._lock:
+                    job.entry = entry
+                    job.seq = getattr(commit, "seq", None)
+                    job.status = DONE
+                    self._persist(job)
+
+
+def _read_status(store: Path, job_id: str) -> Optional[dict]:
+    if not _JOB_ID.fullmatch(job_id):
+        return None
+    try:
+        return json.loads((store / f"{job_id}.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _prune_status_files(store: Path, max_age: float = JOB_FILE_MAX_AGE_SECONDS) -> None:
+    cutoff = time.time() - max_age
+    for path in store.glob("*.json"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+
+_QUEUE: Optional[AnalyzeQueue] = None
+_LABEL_CACHE: Optional[LabelCache] = None
+_QUEUE_LOCK = threading.Lock()
+
+
+def _pool_size() -> tuple[int, int]:
+    """(workers, queue size) from the settings."""
+    return (
+        int(getattr(settings, "TRACKLET_ANALYZE_WORKERS", DEFAULT_WORKERS)),
+        int(getattr(settings, "TRACKLET_ANALYZE_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)),
+    )
+
+
+def _label_cache() -> Optional[LabelCache]:
+    """A label cache as the settings ask for it; None when TRACKLET_LABEL_CACHE_TTL turns it off."""
+    ttl = float(getattr(settings, "TRACKLET_LABEL_CACHE_TTL", DEFAULT_TTL_SECONDS))
+    if ttl <= 0:
+        return None
+    return LabelCache(
+        ttl=ttl,
+        max_distance=int(getattr(settings, "TRACKLET_LABEL_CACHE_DISTANCE", DEFAULT_MAX_DISTANCE)),
+    )
+
+
+def analyze_queue() -> AnalyzeQueue:
+    """The process-wide queue: Gemini classification appended to q_analysis.jsonl."""
+    global _QUEUE, _LABEL_CACHE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            # Imported here: the Gemini SDK and the storage backends are only needed once jobs run
+            from ..utils.gemini_api import analyze_image
+            from .activity_processor import foreground_window
+            from .history_store import append_history
+
+            analyze = analyze_image
+            _LABEL_CACHE = _label_cache()
+            if _LABEL_CACHE is not None:
+                analyze = _LABEL_CACHE.wrap(analyze_image, foreground_window)
+            _prune_status_files(JOBS_DIR)
+            workers, size = _pool_size()
+            _QUEUE = AnalyzeQueue(analyze, append_history, workers=workers, size=size, store=JOBS_DIR)
+        return _QUEUE
+
+
+def job_status(job_id: str) -> Optional[dict]:
+    """A job's status for the status route, whichever server process accepted it; None if unknown."""
+    jobs = _QUEUE
+    return jobs.status(job_id) if jobs is not None else _read_status(JOBS_DIR, job_id)
+
+
+def analyze_stats() -> dict:
+    """
+    Queue depth and job counts, plus the label cache's hits and misses (None
+    when it is off). Before this process has taken an upload it reports zeros
+    rather than starting the workers (and needing GEMINI_API_KEY).
+    """
+    with _QUEUE_LOCK:
+        jobs, cache = _QUEUE, _LABEL_CACHE
+    if jobs is None:
+        workers, size = _pool_size()
+        idle = {"workers": workers, "queued": 0, "capacity": size, "stuck": 0, "jobs": {}}
+        cache = _label_cache()
+        return {"queue": idle, "labelCache": cache.stats() if cache is not None else None}
+    return {"queue": jobs.stats(), "labelCache": cache.stats() if cache is not None else None}
+
+
+def pending_path(filename: str) -> Path:
+    """A fresh path under PENDING_DIR for an upload, keeping ``filename``'s extension."""
+    PENDING_DIR.mkdir(parents=True, exist_ok=True)
+    return PENDING_DIR / f"{uuid.uuid4().hex}{Path(filename).suffix}"
@@ -2,17 +2,17 @@
 
 import json
 import logging
+import os
 import threading
 import time
 import uuid
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Optional
 
 from ..services.paths import (
     ACTIVITY_FILE,
-    DATA_DIR,
     METRICS_FILE,
     CONTEXT_SWITCHES_FILE,
     HOURLY_FILE,
@@ -20,34 +20,81 @@ from ..services.paths import (
     SUMMARY_FILE,
     HISTORY_FILE,
 )
+from ..services import log_partitions, sql_store
+from ..services.journal import journal_writer
+from ..services.activity_processor import save_activity_rollup
+from ..services.metrics_snapshot import metrics_frame
 from ..utils.contex_switches import compute_context_switches
 from ..utils.hourly_breakdown import compute_hourly_productivity
-from ..utils.monitor import is_unproductive_streak
+from ..utils.monitor import update_monitor_status
 from ..utils.prod_breakdown import compute_productivity_stats
-from ..utils.script_combiner import label_activity_with_productivity
+from ..utils.script_combiner import update_metrics_incremental
+
+try:  # Optional: wake on filesystem events instead of waiting for the next poll
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # pragma: no cover - stat polling only
+    FileSystemEventHandler = object
+    Observer = None
 
 LOG = logging.getLogger(__name__)
 
 ANALYSIS_FILE = HISTORY_FILE
 
+# Stat-poll cadence, and how long inputs must sit still before a run so a burst
+# of tracker appends becomes one combiner pass.
+POLL_INTERVAL_SECONDS = 2.0
+SETTLE_SECONDS = 1.0
+MAX_SETTLE_SECONDS = 10.0
+RETRY_SECONDS = 15.0
+
 
 @dataclass(frozen=True)
 class TaskSpec:
+    """
+    A node in the task graph. It is due when the fingerprint of its ``inputs``
+    differs from its last successful run, once every task in ``after`` is idle.
+    ``func`` returns False when it could not run (it is retried later).
+    """
+
     name: str
-    interval: int
-    func: Callable[[], None]
+    func: Callable[[], bool]
+    inputs: tuple[Path, ...]
+    after: tuple[str, ...] = ()
+
+
+@dataclass
+class _TaskState:
+    fingerprint: Optional[tuple] = None
+    retry_at: float = 0.0
+    runs: int = 0
+    failures: int = 0
+    last_run_at: Optional[str] = None
+    last_duration_ms: Optional[float] = None
+    last_ok: Optional[bool] = None
 
 
 _START_LOCK = threading.Lock()
 _STARTED = False
 _STOP_EVENT = threading.Event()
+_WAKE_EVENT = threading.Event()
 _THREADS: list[threading.Thread] = []
+_OBSERVER = None
+_STATS_LOCK = threading.Lock()
+_STATE: dict[str, _TaskState] = {}
+# Bumped whenever task_stats() would change, so cached views of it can tell
+_STATS_VERSION = 0
 
 
 def _metrics_ready() -> bool:
     return METRICS_FILE.exists() and METRICS_FILE.stat().st_size > 0
 
 
+def _metrics_snapshot_frame():
+    """The shared parsed metrics.jsonl; derived tasks in one pass reuse the same parse."""
+    return metrics_frame(METRICS_FILE)
+
+
 def _atomic_write_json(path: Path, payload) -> None:
     text = json.dumps(payload, ensure_ascii=False, indent=2) + "\n"
     tmp = path.with_suffix(path.suffix + f".{uuid.uuid4().hex}.tmp")
@@ -56,142 +103,289 @@ def _atomic_write_json(path: Path, payload) -> None:
     tmp.replace(path)
 
 
-def _run_combiner() -> None:
-    try:
-        act_exists = ACTIVITY_FILE.exists()
-        ss_exists = ANALYSIS_FILE.exists()
-        met_exists = METRICS_FILE.exists()
-        act_size = ACTIVITY_FILE.stat().st_size if act_exists else 0
-        ss_size = ANALYSIS_FILE.stat().st_size if ss_exists else 0
-        met_size_before = METRICS_FILE.stat().st_size if met_exists else 0
-        act_mtime = ACTIVITY_FILE.stat().st_mtime if act_exists else 0
-        ss_mtime = ANALYSIS_FILE.stat().st_mtime if ss_exists else 0
-        met_mtime_before = METRICS_FILE.stat().st_mtime if met_exists else 0
-        LOG.info(
-            "Combiner input: activity(size=%s, mtime=%s) q_analysis(size=%s, mtime=%s) metrics(size=%s, mtime=%s)",
-            act_size,
-            act_mtime,
-            ss_size,
-            ss_mtime,
-            met_size_before,
-            met_mtime_before,
-        )
+def _fingerprint(paths: tuple[Path, ...]) -> tuple:
+    result = []
+    for path in paths:
+        try:
+            stat = path.stat()
+            result.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            result.append(None)
+    return tuple(result)
+
 
-        rows = label_activity_with_productivity(
+def _run_combiner() -> bool:
+    try:
+        rows = update_metrics_incremental(
             str(ANALYSIS_FILE),
             str(ACTIVITY_FILE),
             str(METRICS_FILE),
         )
-        met_size_after = METRICS_FILE.stat().st_size if METRICS_FILE.exists() else 0
-        met_mtime_after = METRICS_FILE.stat().st_mtime if METRICS_FILE.exists() else 0
-        LOG.info(
-            "Updated metrics.jsonl with %s rows (size %s -> %s, mtime=%s)",
-            rows,
-            met_size_before,
-            met_size_after,
-            met_mtime_after,
-        )
+        if rows:
+            LOG.info(
+                "Updated metrics.jsonl with %s rows (size=%s)",
+                rows,
+                METRICS_FILE.stat().st_size if METRICS_FILE.exists() else 0,
+            )
+        return True
     except FileNotFoundError as exc:
         LOG.warning("Source data not found yet; combiner will retry: %s", exc)
     except ValueError as exc:
         LOG.warning("Combiner skipped: %s", exc)
     except Exception:
         LOG.exception("Combiner task failed")
+    return False
 
 
-def _run_context_switches() -> None:
+def _run_context_switches() -> bool:
     if not _metrics_ready():
-        return
+        return False
     try:
-        data = compute_context_switches(METRICS_FILE)
+        data = compute_context_switches(_metrics_snapshot_frame())
         _atomic_write_json(CONTEXT_SWITCHES_FILE, data)
+        return True
     except Exception:
         LOG.exception("Context switches task failed")
+        return False
 
 
-def _run_hourly_breakdown() -> None:
+def _run_hourly_breakdown() -> bool:
     if not _metrics_ready():
-        return
+        return False
     try:
-        data = compute_hourly_productivity(METRICS_FILE)
+        data = compute_hourly_productivity(_metrics_snapshot_frame())
         _atomic_write_json(HOURLY_FILE, data)
+        return True
     except Exception:
         LOG.exception("Hourly breakdown task failed")
+        return False
 
 
-def _run_productivity_summary() -> None:
+def _run_productivity_summary() -> bool:
     if not _metrics_ready():
-        return
+        return False
     try:
-        data = compute_productivity_stats(METRICS_FILE)
+        data = compute_productivity_stats(_metrics_snapshot_frame())
         _atomic_write_json(SUMMARY_FILE, data)
+        return True
     except Exception:
         LOG.exception("Productivity summary task failed")
+        return False
 
 
-def _run_monitor() -> None:
+def _run_monitor() -> bool:
     if not _metrics_ready():
-        return
+        return False
     try:
-        unproductive = is_unproductive_streak(METRICS_FILE)
-        payload = {
-            "unproductive_streak": bool(unproductive),
-            "checked_at": datetime.now(timezone.utc).isoformat(),
-        }
+        previous = None
+        if MONITOR_FILE.exists():
+            try:
+                previous = json.loads(MONITOR_FILE.read_text(encoding="utf-8"))
+            except ValueError:
+                previous = None
+        # Reads metrics.jsonl backwards from the end; no full parse needed
+        payload = update_monitor_status(METRICS_FILE, previous)
         _atomic_write_json(MONITOR_FILE, payload)
+        return True
     except Exception:
         LOG.exception("Monitor task failed")
+        return False
+
+
+def _run_activity_rollup() -> bool:
+    try:
+        if save_activity_rollup():
+            LOG.debug("Saved the hourly activity rollup")
+        return True
+    except Exception:
+        LOG.exception("Activity rollup task failed")
+        return False
+
+
+def _run_sql_import() -> bool:
+    if not sql_store.sqlite_enabled():
+        return True
+    try:
+        sql_store.sync()
+        return True
+    except Exception:
+        LOG.exception("SQLite import task failed")
+        return False
 
 
+def _run_log_maintenance() -> bool:
+    try:
+        for path in (ACTIVITY_FILE, ANALYSIS_FILE):
+            log_partitions.maintain(path)
+        return True
+    except Exception:
+        LOG.exception("Log rotation failed")
+        return False
+
+
+# In dependency order. Derived tasks key on metrics.jsonl, which only changes
+# when the combiner commits output, so they never see a half-updated file.
 _TASKS: tuple[TaskSpec, ...] = (
-    TaskSpec("combiner", 15, _run_combiner),
-    TaskSpec("context_switches", 60, _run_context_switches),
-    TaskSpec("hourly_breakdown", 60, _run_hourly_breakdown),
-    TaskSpec("productivity_summary", 60, _run_productivity_summary),
-    TaskSpec("monitor", 30, _run_monitor),
+    TaskSpec("combiner", _run_combiner, (ACTIVITY_FILE, ANALYSIS_FILE)),
+    # Independent of the combiner (offsets are logical); listed after it so a
+    # pass reads the hot files before they are rotated
+    TaskSpec("log_rotation", _run_log_maintenance, (ACTIVITY_FILE, ANALYSIS_FILE)),
+    # Persists the rollup the dashboard keeps in memory, so charts outlive retention
+    TaskSpec("activity_rollup", _run_activity_rollup, (ACTIVITY_FILE,)),
+    # Keeps the sqlite storage backend's tables up to the logs between dashboard reads
+    TaskSpec("sql_import", _run_sql_import, (ACTIVITY_FILE, ANALYSIS_FILE)),
+    TaskSpec("context_switches", _run_context_switches, (METRICS_FILE,), after=("combiner",)),
+    TaskSpec("hourly_breakdown", _run_hourly_breakdown, (METRICS_FILE,), after=("combiner",)),
+    TaskSpec("productivity_summary", _run_productivity_summary, (METRICS_FILE,), after=("combiner",)),
+    TaskSpec("monitor", _run_monitor, (METRICS_FILE,), after=("combiner",)),
 )
 
 
-def _worker(task: TaskSpec) -> None:
-    LOG.info("Background task '%s' started (interval=%ss)", task.name, task.interval)
+def _run_task(task: TaskSpec, state: _TaskState, fingerprint: tuple) -> None:
+    global _STATS_VERSION
+    started_at = datetime.now(timezone.utc).isoformat()
+    start = time.perf_counter()
+    try:
+        ok = bool(task.func())
+    except Exception:
+        LOG.exception("Unhandled error in task '%s'", task.name)
+        ok = False
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    with _STATS_LOCK:
+        _STATS_VERSION += 1
+        state.runs += 1
+        state.last_run_at = started_at
+        state.last_duration_ms = round(elapsed_ms, 2)
+        state.last_ok = ok
+        if ok:
+            state.fingerprint = fingerprint
+            state.retry_at = 0.0
+        else:
+            state.failures += 1
+            state.retry_at = time.monotonic() + RETRY_SECONDS
+
+
+def _run_due_tasks() -> None:
+    """One pass over the graph in order; a task runs at most once per pass."""
+    failed: set[str] = set()
+    now = time.monotonic()
+    for task in _TASKS:
+        state = _STATE[task.name]
+        if any(dep in failed for dep in task.after):
+            failed.add(task.name)
+            continue
+        fingerprint = _fingerprint(task.inputs)
+        if fingerprint == state.fingerprint or state.retry_at > now:
+            continue
+        _run_task(task, state, fingerprint)
+        if not state.last_ok:
+            failed.add(task.name)
+
+
+def _scheduler() -> None:
+    LOG.info("Background scheduler started (%s tasks, poll=%ss)", len(_TASKS), POLL_INTERVAL_SECONDS)
+    sources = tuple(dict.fromkeys(path for task in _TASKS if not task.after for path in task.inputs))
+    seen = None
     while not _STOP_EVENT.is_set():
-        start = time.monotonic()
-        try:
-            task.func()
-        except Exception:
-            LOG.exception("Unhandled error in task '%s'", task.name)
-        elapsed = time.monotonic() - start
-        sleep_for = max(task.interval - elapsed, 1)
-        if _STOP_EVENT.wait(sleep_for):
+        # Coalesce bursts: wait (bounded) until the source files stop changing
+        current = _fingerprint(sources)
+        deadline = time.monotonic() + MAX_SETTLE_SECONDS
+        while current != seen and time.monotonic() < deadline:
+            settle = SETTLE_SECONDS if seen is not None else 0
+            seen = current
+            if _STOP_EVENT.wait(settle):
+                break
+            current = _fingerprint(sources)
+        if _STOP_EVENT.is_set():
             break
-    LOG.info("Background task '%s' stopped", task.name)
+        _run_due_tasks()
+        _WAKE_EVENT.wait(POLL_INTERVAL_SECONDS)
+        _WAKE_EVENT.clear()
+    LOG.info("Background scheduler stopped")
+
+
+class _WakeHandler(FileSystemEventHandler):
+    def __init__(self, names: set[str]) -> None:
+        super().__init__()
+        self._names = names
+
+    def on_any_event(self, event) -> None:
+        if os.path.basename(getattr(event, "src_path", "")) in self._names:
+            _WAKE_EVENT.set()
+
+
+def _start_observer() -> None:
+    global _OBSERVER
+    if Observer is None:
+        return
+    sources = [path for task in _TASKS if not task.after for path in task.inputs]
+    try:
+        observer = Observer()
+        handler = _WakeHandler({path.name for path in sources})
+        for directory in {path.parent for path in sources if path.parent.exists()}:
+            observer.schedule(handler, str(directory), recursive=False)
+        observer.daemon = True
+        observer.start()
+        _OBSERVER = observer
+    except Exception:
+        LOG.warning("File watcher unavailable; using stat polling only", exc_info=True)
+
+
+def task_stats() -> dict[str, dict]:
+    """Per-task run counters and last-run timing, for status displays."""
+    with _STATS_LOCK:
+        return {
+            name: {
+                "runs": state.runs,
+                "failures": state.failures,
+                "lastRunAt": state.last_run_at,
+                "lastDurationMs": state.last_duration_ms,
+                "lastOk": state.last_ok,
+            }
+            for name, state in _STATE.items()
+        }
+
+
+def task_stats_version() -> int:
+    """Changes whenever task_stats() does."""
+    with _STATS_LOCK:
+        return _STATS_VERSION
+
+
+def _wake_on_commit(position) -> None:
+    """Labels appended in this process are picked up now instead of at the next poll."""
+    _WAKE_EVENT.set()
 
 
 def start_background_tasks() -> None:
-    global _STARTED
+    global _STARTED, _STATS_VERSION
     with _START_LOCK:
         if _STARTED:
             return
         _STOP_EVENT.clear()
-        for spec in _TASKS:
-            thread = threading.Thread(
-                target=_worker,
-                name=f"pyapp-bg-{spec.name}",
-                args=(spec,),
-                daemon=True,
-            )
-            thread.start()
-            _THREADS.append(thread)
+        with _STATS_LOCK:
+            _STATS_VERSION += 1
+            for spec in _TASKS:
+                _STATE.setdefault(spec.name, _TaskState())
+        _start_observer()
+        journal_writer(ANALYSIS_FILE).add_listener(_wake_on_commit)
+        thread = threading.Thread(target=_scheduler, name="pyapp-bg-scheduler", daemon=True)
+        thread.start()
+        _THREADS.append(thread)
         _STARTED = True
-        LOG.info("Started %s background task(s)", len(_TASKS))
+        LOG.info("Started background scheduler for %s task(s)", len(_TASKS))
 
 
 def stop_background_tasks(timeout: float | None = 5.0) -> None:
-    global _STARTED
+    global _STARTED, _OBSERVER
     with _START_LOCK:
         if not _STARTED:
             return
         _STOP_EVENT.set()
+        _WAKE_EVENT.set()
+        if _OBSERVER is not None:
+            _OBSERVER.stop()
+            _OBSERVER = None
         for thread in _THREADS:
             thread.join(timeout=timeout)
         _THREADS.clear()
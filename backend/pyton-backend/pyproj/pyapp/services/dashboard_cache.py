@@ -0,0 +1,130 @@
+"""
+Serialized /api/dashboard/ responses, cached against their input files.
+
+The payload is a pure function of a handful of files, so the encoded body is
+kept alongside the (inode, size, mtime_ns) fingerprint of those files and
+reused until one changes. Each body carries a strong ETag (a hash of the
+bytes). Concurrent requests that miss the cache wait for a single rebuild.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Hashable, Optional
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .paths import (
+    ACTIVITY_FILE,
+    CONTEXT_SWITCHES_FILE,
+    HOURLY_FILE,
+    METRICS_FILE,
+    MONITOR_FILE,
+    SUMMARY_FILE,
+)
+from .productivity_rules import rules_path
+
+
+def dashboard_inputs() -> tuple[Path, ...]:
+    """Every file the full payload reads; the rules file is resolved through settings."""
+    return (
+        ACTIVITY_FILE,
+        METRICS_FILE,
+        CONTEXT_SWITCHES_FILE,
+        HOURLY_FILE,
+        SUMMARY_FILE,
+        MONITOR_FILE,
+        rules_path(),
+    )
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    fingerprint: tuple
+    body: bytes
+    etag: str
+
+
+def fingerprint(paths: Optional[tuple[Path, ...]] = None) -> tuple:
+    result = []
+    if paths is None:
+        paths = dashboard_inputs()
+    for path in paths:
+        try:
+            stat = path.stat()
+            result.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            result.append(None)
+    return tuple(result)
+
+
+def encode_response(payload: dict) -> bytes:
+    """The JSON body JsonResponse would send for ``payload``."""
+    body = {"data": payload, "generated_at": timezone.now().isoformat()}
+    return json.dumps(body, cls=DjangoJSONEncoder).encode("utf-8")
+
+
+# Keys include the requested date range, so keep only the most recently built
+MAX_ENTRIES = 64
+
+_LOCK = threading.Lock()
+_BUILD_LOCKS: dict[Hashable, threading.Lock] = {}
+_ENTRIES: dict[Hashable, CachedResponse] = {}
+
+
+def cached_response(
+    key: Hashable,
+    build: Callable[[], dict],
+    paths: Optional[tuple[Path, ...]] = None,
+    version: Optional[Callable[[], Hashable]] = None,
+) -> CachedResponse:
+    """
+    Return the cached body for ``key`` if ``paths`` and ``version()`` are
+    unchanged, otherwise rebuild it with ``build()``. Only one thread rebuilds
+    a given key; the others block on it and reuse its result.
+    """
+    if paths is None:
+        paths = dashboard_inputs()
+
+    def state() -> tuple:
+        return (fingerprint(paths), version() if version is not None else None)
+
+    current = state()
+    entry = _ENTRIES.get(key)
+    if entry is not None and entry.fingerprint == current:
+        return entry
+
+    with _LOCK:
+        build_lock = _BUILD_LOCKS.setdefault(key, threading.Lock())
+    with build_lock:
+        # Someone else may have rebuilt while we waited
+        current = state()
+        entry = _ENTRIES.get(key)
+        if entry is not None and entry.fingerprint == current:
+            return entry
+
+        body = encode_response(build())
+        etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+        entry = CachedResponse(current, body, etag)
+        with _LOCK:
+            _ENTRIES.pop(key, None)
+            _ENTRIES[key] = entry
+            while len(_ENTRIES) > MAX_ENTRIES:
+                oldest = next(iter(_ENTRIES))
+                del _ENTRIES[oldest]
+                _BUILD_LOCKS.pop(oldest, None)
+        return entry
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """RFC 9110 If-None-Match check (weak comparison, as the spec requires for GET)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
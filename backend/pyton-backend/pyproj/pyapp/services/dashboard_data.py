@@ -1,24 +1,38 @@
 from __future__ import annotations
 
 import json
-from collections import Counter
-from datetime import timedelta
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
 
+import numpy as np
 import pandas as pd
 from django.conf import settings
 from django.utils import timezone
 
 from .paths import (
+    ACTIVITY_FILE,
     CONTEXT_SWITCHES_FILE,
+    HISTORY_FILE,
     HOURLY_FILE,
     METRICS_FILE,
     MONITOR_FILE,
+    RULES_FILE,
     SUMMARY_FILE,
 )
+from .background_tasks import task_stats, task_stats_version
+from .dashboard_cache import fingerprint
+from .metrics_snapshot import get_metrics_snapshot
+from .productivity_rules import get_ruleset, rules_path
+from . import sql_store, switch_analytics
+from .activity_frame import GRANULARITIES, local_datetime
 from .activity_processor import (
-    load_activity_data,
+    BUCKET_LABEL_FORMATS,
+    ActivityAggregate,
+    activity_aggregate,
+    format_bucket_label,
     build_overview_data,
     build_timeline_data,
     compute_context_switches,
@@ -40,6 +54,29 @@ COLORS = {
 }
 
 
+@dataclass(frozen=True)
+class DashboardQuery:
+    """Time window and chart bucket size of a dashboard request."""
+
+    start: Optional[int] = None  # UTC epoch seconds, inclusive; None for the oldest row
+    stop: Optional[int] = None  # UTC epoch seconds, exclusive; None for the newest row
+    granularity: str = "hour"
+
+    def __post_init__(self) -> None:
+        if self.granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+        if self.start is not None and self.stop is not None and self.stop <= self.start:
+            raise ValueError("'to' must be after 'from'")
+
+    @property
+    def windowed(self) -> bool:
+        return self.start is not None or self.stop is not None
+
+
+# All of history by hour: the default payload
+ALL_HISTORY = DashboardQuery()
+
+
 def _normalise_bool(value: Any) -> Optional[bool]:
     if isinstance(value, bool):
         return value
@@ -98,16 +135,127 @@ def _format_time_label(ts: pd.Timestamp, fmt: str = "%H:%M") -> str:
     return ts.strftime(fmt)
 
 
-def _load_metrics_dataframe() -> Optional[pd.DataFrame]:
-    if not METRICS_FILE.exists() or METRICS_FILE.stat().st_size == 0:
-        return None
-    try:
-        df = pd.read_json(METRICS_FILE, lines=True)
-    except ValueError:
+def _load_metrics_dataframe(query: DashboardQuery = ALL_HISTORY) -> Optional[pd.DataFrame]:
+    """
+    Dashboard view of metrics.jsonl, prepared once per file version (read-only),
+    limited to the rows inside ``query``'s window. Under the sqlite storage
+    backend the same rows come from the tables instead.
+    """
+    if sql_store.sqlite_enabled():
+        return _load_sql_metrics(query)
+    snapshot = get_metrics_snapshot(METRICS_FILE)
+    if snapshot is None or snapshot.frame.empty:
         return None
+    df = snapshot.derive("dashboard", _prepare_metrics_dataframe)
+    if df is None or not query.windowed:
+        return df
+    index = snapshot.derive("dashboard_index", lambda _: _timestamp_index(df))
+    return _window_rows(df, index, query)
+
+
+# Last prepared sqlite metrics frame and its index, keyed on the identity of the query result
+_SQL_METRICS: dict[str, Any] = {"source": None, "frame": None, "index": None}
+_SQL_METRICS_LOCK = threading.Lock()
+
+
+def _load_sql_metrics(query: DashboardQuery) -> Optional[pd.DataFrame]:
+    # All rows, prepared and then windowed as metrics.jsonl is: _prepare_metrics_dataframe's
+    # sort orders rows sharing a minute by the whole input, so preparing only a window's rows
+    # could order them differently from the JSONL backend
+    frame = sql_store.labelled_activity()
+    with _SQL_METRICS_LOCK:
+        cached = _SQL_METRICS["source"] is frame
+        df, index = _SQL_METRICS["frame"], _SQL_METRICS["index"]
+    if not cached:
+        df = None if frame.empty else _prepare_metrics_dataframe(frame)
+        index = None if df is None else _timestamp_index(df)
+        with _SQL_METRICS_LOCK:
+            _SQL_METRICS.update(source=frame, frame=df, index=index)
+    if df is None or not query.windowed:
+        return df
+    return _window_rows(df, index, query)
+
+
+def _window_rows(df: pd.DataFrame, index: np.ndarray, query: DashboardQuery) -> Optional[pd.DataFrame]:
+    """The prepared rows inside ``query``'s window, found in ``index`` (see _timestamp_index)."""
+    lo = 0 if query.start is None else int(np.searchsorted(index, _index_bound(df, query.start)))
+    hi = len(index) if query.stop is None else int(np.searchsorted(index, _index_bound(df, query.stop)))
+    window = df.iloc[lo:max(lo, hi)]
+    return None if window.empty else window
+
+
+def _timestamp_index(df: pd.DataFrame) -> np.ndarray:
+    """Sorted int64 nanoseconds of the prepared rows that have a timestamp (they come first)."""
+    timestamps = df["timestamp"]
+    return timestamps.array.asi8[: int(timestamps.notna().sum())]
+
+
+def _index_bound(df: pd.DataFrame, epoch: int) -> int:
+    """``epoch`` in the units of _timestamp_index: UTC, or local wall time when the column is naive."""
+    bound = pd.Timestamp(epoch, unit="s", tz="UTC")
+    if df["timestamp"].dt.tz is None:
+        bound = bound.tz_convert(timezone.get_current_timezone()).tz_localize(None)
+    return bound.value
+
+
+def _time_buckets(df: pd.DataFrame, granularity: str) -> pd.Series:
+    """Each row's local hour, day or (Monday) week start, for grouping."""
+    if granularity == "hour":
+        return df["timestamp_hour"]
+    local = df["timestamp"].dt.tz_localize(None) if df["timestamp"].dt.tz is not None else df["timestamp"]
+    days = local.dt.normalize()
+    if granularity == "week":
+        days = days - pd.to_timedelta(days.dt.weekday, unit="D")
+    return days
+
+
+def _productive_flags(values: Optional[pd.Series]) -> pd.Series:
+    """``values.apply(_normalise_bool)``, evaluated once per distinct value."""
+    if values is None:
+        return pd.Series(None, dtype=object)
+    if values.dtype != object:
+        # bool(nan) is True, so missing numbers count as productive, as before
+        return pd.Series((values.to_numpy(dtype=float) != 0).astype(object), index=values.index)
+    codes, uniques = pd.factorize(values)
+    lookup = np.array([_normalise_bool(value) for value in uniques] + [None], dtype=object)
+    flags = lookup[codes]
+    missing = np.flatnonzero(codes == -1)
+    if len(missing):
+        # A NaN (unlike None) is a float, which _normalise_bool reads as True
+        raw = values.to_numpy()
+        flags[missing] = [True if value is not None else None for value in raw[missing]]
+    return pd.Series(flags, index=values.index, dtype=object)
+
+
+_MINUTE_LABELS = [f"{hour:02d}:{minute:02d}" for hour in range(24) for minute in range(60)]
+
+
+def _minute_labels(timestamps: pd.Series) -> pd.Series:
+    """``"%H:%M"`` of each timestamp as a categorical, without formatting every row."""
+    codes = (timestamps.dt.hour * 60 + timestamps.dt.minute).fillna(-1).astype(np.int16)
+    labels = pd.Categorical.from_codes(codes.to_numpy(), categories=_MINUTE_LABELS)
+    return pd.Series(labels, index=timestamps.index).cat.remove_unused_categories()
+
+
+def _fill_category(values: Optional[pd.Series], fill: str) -> pd.Series | str:
+    """Categorical copy of ``values`` with nulls set to ``fill``, categories kept sorted."""
+    if values is None:
+        return fill
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.fillna(fill)
+        try:
+            return values.astype(pd.CategoricalDtype(sorted(values.unique())))
+        except TypeError:  # mixed value types; leave as objects
+            return values
+    if not values.isna().any():
+        return values
+    if fill not in values.cat.categories:
+        values = values.cat.set_categories(sorted([*values.cat.categories, fill]))
+    return values.fillna(fill)
 
-    if df.empty:
-        return None
+
+def _prepare_metrics_dataframe(frame: pd.DataFrame) -> Optional[pd.DataFrame]:
+    df = frame.copy()
 
     ts = pd.to_datetime(df.get("timestamp"), errors="coerce")
     ts = ts.dropna()
@@ -129,17 +277,17 @@ def _load_metrics_dataframe() -> Optional[pd.DataFrame]:
     df["idle_seconds"] = df["idle_seconds"].clip(lower=0, upper=3600)
 
     df["active_seconds"] = (60.0 - df["idle_seconds"].clip(upper=60.0)).clip(lower=0.0)
-    df["productive_bool"] = df.get("productive").apply(_normalise_bool)
+    df["productive_bool"] = _productive_flags(df.get("productive"))
 
     df["productivity_label"] = df["productive_bool"].map(
         {True: "productive", False: "unproductive"}
-    ).fillna("neutral")
+    ).fillna("neutral").astype("category")
 
     df["timestamp_hour"] = df["timestamp"].dt.floor("H")
-    df["hour_label"] = df["timestamp"].apply(_format_time_label)
+    df["hour_label"] = _minute_labels(df["timestamp"])
 
-    df["app_name"] = df.get("app_name", "unknown").fillna("unknown")
-    df["window_title"] = df.get("window_title", "unknown").fillna("unknown")
+    df["app_name"] = _fill_category(df.get("app_name"), "unknown")
+    df["window_title"] = _fill_category(df.get("window_title"), "unknown")
 
     df["productive_seconds"] = df["active_seconds"].where(df["productive_bool"] == True, 0.0)
     df["unproductive_seconds"] = df["active_seconds"].where(df["productive_bool"] == False, 0.0)
@@ -253,61 +401,59 @@ def build_overview_section(df: Optional[pd.DataFrame]) -> Optional[dict]:
     }
 
 
-def build_idle_section(df: Optional[pd.DataFrame]) -> Optional[dict]:
+def _long_breaks(df: pd.DataFrame, threshold_seconds: int) -> list[dict]:
+    """
+    Runs of consecutive rows idle for at least ``threshold_seconds``. A run spans
+    from its first row's timestamp minus that row's idle time to its last row's
+    timestamp, and is kept if it lasts at least the threshold; a run still open
+    at the end of the data is always kept.
+    """
+    idle = df["idle_seconds"].to_numpy(dtype=float)
+    mask = idle >= threshold_seconds
+    if not mask.any():
+        return []
+
+    # Run-length segmentation: rising and falling edges of the threshold mask
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0]))))
+    firsts, stops = edges[0::2], edges[1::2]
+
+    timestamps = df["timestamp"]
+    long_breaks = []
+    for first, stop in zip(firsts.tolist(), stops.tolist()):
+        start_time = timestamps.iat[first] - timedelta(seconds=float(idle[first]))
+        end_time = timestamps.iat[stop - 1]
+        duration = (end_time - start_time).total_seconds() / 60.0
+        if stop == len(idle) or duration >= threshold_seconds / 60:
+            long_breaks.append(
+                {
+                    "start": start_time.isoformat(),
+                    "end": end_time.isoformat(),
+                    "durationMin": int(round(duration)),
+                    "reason": "Extended idle",
+                }
+            )
+    return long_breaks
+
+
+def build_idle_section(df: Optional[pd.DataFrame], granularity: str = "hour") -> Optional[dict]:
     if df is None or df.empty:
         return None
 
-    idle_group = (
-        df.groupby("timestamp_hour")["idle_seconds"].sum().reset_index(name="idle_seconds")
-    )
+    idle_group = df.groupby(_time_buckets(df, granularity))["idle_seconds"].sum()
     idle_points = [
-        {
-            "name": _format_time_label(row["timestamp_hour"], "%H:%M"),
-            "idleMin": round(row["idle_seconds"] / 60.0, 2),
-        }
-        for _, row in idle_group.iterrows()
+        {"name": label, "idleMin": round(seconds / 60.0, 2)}
+        for label, seconds in zip(
+            idle_group.index.strftime(BUCKET_LABEL_FORMATS[granularity]),
+            idle_group.tolist(),
+        )
     ]
 
     idle_config = {
         "idleMin": {"label": "Idle Minutes", "color": COLORS["idle"]},
     }
 
-    long_breaks = []
-    current_break: Optional[dict] = None
     threshold_seconds = int(getattr(settings, "TRACKLET_LONG_BREAK_SECONDS", 600))
-
-    for _, row in df.iterrows():
-        idle_seconds = float(row["idle_seconds"])
-        ts: pd.Timestamp = row["timestamp"]
-        if idle_seconds >= threshold_seconds:
-            start_time = ts - timedelta(seconds=idle_seconds)
-            if current_break is None:
-                current_break = {"start": start_time, "end": ts}
-            else:
-                current_break["end"] = ts
-        elif current_break is not None:
-            duration = (current_break["end"] - current_break["start"]).total_seconds() / 60.0
-            if duration >= threshold_seconds / 60:
-                long_breaks.append(
-                    {
-                        "start": current_break["start"].isoformat(),
-                        "end": current_break["end"].isoformat(),
-                        "durationMin": int(round(duration)),
-                        "reason": "Extended idle",
-                    }
-                )
-            current_break = None
-
-    if current_break is not None:
-        duration = (current_break["end"] - current_break["start"]).total_seconds() / 60.0
-        long_breaks.append(
-            {
-                "start": current_break["start"].isoformat(),
-                "end": current_break["end"].isoformat(),
-                "durationMin": int(round(duration)),
-                "reason": "Extended idle",
-            }
-        )
+    long_breaks = _long_breaks(df, threshold_seconds)
 
     tracked_minutes = int(round(df["active_seconds"].sum() / 60.0))
 
@@ -322,7 +468,7 @@ def build_apps_section(df: Optional[pd.DataFrame]) -> Optional[dict]:
     if df is None or df.empty:
         return None
 
-    app_group = df.groupby("app_name").agg(
+    app_group = df.groupby("app_name", observed=True).agg(
         active_seconds=("active_seconds", "sum"),
         productive_seconds=("productive_seconds", "sum"),
         unproductive_seconds=("unproductive_seconds", "sum"),
@@ -416,28 +562,25 @@ def build_switches_section(df: Optional[pd.DataFrame]) -> Optional[dict]:
     }
 
     intensity_points = []
+    top_pairs = []
     if df is not None and not df.empty:
-        counts = df.groupby("timestamp_hour").apply(
-            lambda group: int((group["app_name"] != group["app_name"].shift()).sum())
-        )
-        for ts, value in counts.items():
-            intensity_points.append(
-                {"name": _format_time_label(ts, "%H:%M"), "count": int(value)}
-            )
+        app_codes, app_names = pd.factorize(df["app_name"])
+        hour_index, hours = pd.factorize(df["timestamp_hour"], sort=True)
+        segments = switch_analytics.hour_segments(app_codes, hour_index, len(hours))
+        intensity_points = [
+            {"name": name, "count": int(count)}
+            for name, count in zip(hours.strftime("%H:%M"), segments.tolist())
+        ]
+        top_pairs = [
+            {"from": app_names[from_code], "to": app_names[to_code], "count": count}
+            for from_code, to_code, count in switch_analytics.top_pairs(app_codes)
+            if from_code >= 0 and to_code >= 0
+        ]
 
     intensity_config = {
         "count": {"label": "Switches", "color": COLORS["unproductive"]},
     }
 
-    top_pairs = []
-    if df is not None and not df.empty:
-        shifted = df.shift(1)
-        mask = df["app_name"] != shifted["app_name"]
-        transitions = df[mask & shifted["app_name"].notna()]
-        pairs = Counter(zip(shifted.loc[transitions.index, "app_name"], transitions["app_name"]))
-        for (from_app, to_app), count in pairs.most_common(8):
-            top_pairs.append({"from": from_app, "to": to_app, "count": int(count)})
-
     return {
         "switchesOverTime": {"points": switches_points, "config": switches_config},
         "switchIntensity": {"points": intensity_points, "config": intensity_config},
@@ -449,41 +592,43 @@ def build_timeline_section(df: Optional[pd.DataFrame]) -> Optional[dict]:
     if df is None or df.empty:
         return None
 
-    app_totals = df.groupby("app_name")["active_seconds"].sum().sort_values(ascending=False)
+    app_totals = df.groupby("app_name", observed=True)["active_seconds"].sum().sort_values(ascending=False)
     top_apps = list(app_totals.head(5).index)
 
-    grouped = df.groupby(["timestamp_hour", "app_name"]) ["active_seconds"].sum().unstack(fill_value=0.0)
+    grouped = df.groupby(["timestamp_hour", "app_name"], observed=True)["active_seconds"].sum().unstack(fill_value=0.0)
+    minutes = (grouped / 60.0).round(2)
+    top_columns = [app for app in minutes.columns if app in top_apps]
+    other_columns = [app for app in minutes.columns if app not in top_apps]
+    # Running sum in column order, as the rounded minutes were added before
+    others = (
+        minutes[other_columns].cumsum(axis=1).iloc[:, -1].to_numpy()
+        if other_columns
+        else np.zeros(len(minutes))
+    )
+    names = minutes.index.strftime("%H:%M")
     timeline_points = []
-    for ts, row in grouped.iterrows():
-        point = {"name": ts.strftime("%H:%M")}
-        others = 0.0
-        for app in row.index:
-            minutes = round(row[app] / 60.0, 2)
-            if app in top_apps:
-                point[app] = minutes
-            else:
-                others += minutes
-        if others:
-            point["Other"] = round(others, 2)
+    for name, values, other in zip(names, minutes[top_columns].to_dict("records"), others.tolist()):
+        point = {"name": name, **values}
+        if other:
+            point["Other"] = round(other, 2)
         timeline_points.append(point)
 
     series_keys = sorted({key for point in timeline_points for key in point.keys() if key != "name"})
     colors_cycle = [COLORS["productive"], COLORS["unproductive"], COLORS["neutral"], COLORS["idle"], COLORS["other"]]
     timeline_config = _chart_config(series_keys, colors_cycle)
 
-    events = []
-    for _, row in df.tail(200).iterrows():
-        events.append(
-            {
-                "ts": row["timestamp"].isoformat(),
-                "app": row["app_name"],
-                "window": row["window_title"],
-                "domain": None,
-                "idleSec": float(row["idle_seconds"]),
-                "category": row["productivity_label"],
-                "productivity": row["productivity_label"],
-            }
-        )
+    tail = df.tail(200)
+    events = pd.DataFrame(
+        {
+            "ts": [ts.isoformat() for ts in tail["timestamp"]],
+            "app": tail["app_name"].to_numpy(),
+            "window": tail["window_title"].to_numpy(),
+            "domain": None,
+            "idleSec": tail["idle_seconds"].astype(float).to_numpy(),
+            "category": tail["productivity_label"].to_numpy(),
+            "productivity": tail["productivity_label"].to_numpy(),
+        }
+    ).to_dict("records")
 
     return {
         "dailyTimeline": {"points": timeline_points, "config": timeline_config},
@@ -491,7 +636,7 @@ def build_timeline_section(df: Optional[pd.DataFrame]) -> Optional[dict]:
     }
 
 
-def build_focus_section(df: Optional[pd.DataFrame]) -> Optional[dict]:
+def build_focus_section(df: Optional[pd.DataFrame], granularity: str = "hour") -> Optional[dict]:
     if df is None or df.empty:
         return None
 
@@ -502,27 +647,32 @@ def build_focus_section(df: Optional[pd.DataFrame]) -> Optional[dict]:
     focus_df["gap"] = focus_df["timestamp"] - focus_df["timestamp"].shift(1)
     focus_df["session_id"] = ((focus_df["app_name"] != focus_df["app_name"].shift(1)) | (focus_df["gap"] > pd.Timedelta(minutes=5))).cumsum()
 
-    sessions = []
-    for session_id, group in focus_df.groupby("session_id"):
-        start = group["timestamp"].iloc[0]
-        end = group["timestamp"].iloc[-1] + pd.Timedelta(minutes=1)
-        duration = group["active_seconds"].sum()
-        app = group["app_name"].iloc[-1]
-        window = group["window_title"].iloc[-1]
-        sessions.append(
-            {
-                "id": f"session-{int(session_id)}",
-                "start": start.isoformat(),
-                "end": end.isoformat(),
-                "durationSec": int(duration),
-                "app": app,
-                "window": window,
-                "productivity": "productive",
-            }
-        )
+    by_session = focus_df.groupby("session_id", sort=True)
+    durations = by_session["active_seconds"].sum()
+    # Sessions are contiguous runs, so first/last rows are the run boundaries
+    session_ids = focus_df["session_id"].to_numpy()
+    run_starts = np.flatnonzero(np.r_[True, session_ids[1:] != session_ids[:-1]])
+    run_ends = np.r_[run_starts[1:], len(session_ids)] - 1
+    timestamps = focus_df["timestamp"]
+
+    def session_at(pos: int) -> dict:
+        start = timestamps.iat[run_starts[pos]]
+        end = timestamps.iat[run_ends[pos]] + pd.Timedelta(minutes=1)
+        return {
+            "id": f"session-{int(session_ids[run_starts[pos]])}",
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "durationSec": int(durations.iat[pos]),
+            "app": focus_df["app_name"].iat[run_ends[pos]],
+            "window": focus_df["window_title"].iat[run_ends[pos]],
+            "productivity": "productive",
+        }
+
+    # Only the latest sessions are shown; the rest feed the distribution below
+    recent_sessions = [session_at(pos) for pos in range(max(0, len(run_starts) - 10), len(run_starts))]
 
     category_minutes = (
-        focus_df.groupby("app_name")["active_seconds"].sum().sort_values(ascending=False)
+        focus_df.groupby("app_name", observed=True)["active_seconds"].sum().sort_values(ascending=False)
     )
     category_points = [
         {"name": app, "minutes": round(seconds / 60.0, 2)}
@@ -532,37 +682,23 @@ def build_focus_section(df: Optional[pd.DataFrame]) -> Optional[dict]:
         "minutes": {"label": "Focus minutes", "color": COLORS["productive"]},
     }
 
-    session_distribution = []
-    buckets = [(0, 15), (15, 30), (30, 45), (45, 60), (60, 90), (90, None)]
-    counts = Counter()
-    for session in sessions:
-        minutes = session["durationSec"] / 60.0
-        for low, high in buckets:
-            upper = high if high is not None else float("inf")
-            if low <= minutes < upper:
-                label = f"{low}-{int(high)}m" if high is not None else f"{low}m+"
-                counts[label] += 1
-                break
-    for label in (
-        "0-15m",
-        "15-30m",
-        "30-45m",
-        "45-60m",
-        "60-90m",
-        "90m+",
-    ):
-        session_distribution.append({"name": label, "sessions": counts.get(label, 0)})
+    bucket_labels = ["0-15m", "15-30m", "30-45m", "45-60m", "60-90m", "90m+"]
+    session_minutes = durations.to_numpy(dtype=float).astype(np.int64) / 60.0
+    buckets = pd.cut(session_minutes, [0, 15, 30, 45, 60, 90, np.inf], right=False, labels=bucket_labels)
+    counts = pd.Series(buckets).value_counts()
+    session_distribution = [{"name": label, "sessions": int(counts.get(label, 0))} for label in bucket_labels]
 
     session_config = {
         "sessions": {"label": "Sessions", "color": COLORS["productive"]},
     }
 
-    trend_points = []
-    hourly_focus = focus_df.groupby("timestamp_hour")["productive_seconds"].sum()
-    for ts, value in hourly_focus.items():
-        trend_points.append(
-            {"name": ts.strftime("%H:%M"), "focus": round(value / 60.0 * 10, 2)}
-        )
+    hourly_focus = focus_df.groupby(_time_buckets(focus_df, granularity))["productive_seconds"].sum()
+    trend_points = pd.DataFrame(
+        {
+            "name": hourly_focus.index.strftime(BUCKET_LABEL_FORMATS[granularity]),
+            "focus": (hourly_focus / 60.0 * 10).round(2).to_numpy(),
+        }
+    ).to_dict("records")
     trend_config = {
         "focus": {"label": "Focus score", "color": COLORS["focus"]},
     }
@@ -570,7 +706,7 @@ def build_focus_section(df: Optional[pd.DataFrame]) -> Optional[dict]:
     goal_minutes = int(getattr(settings, "TRACKLET_DAILY_GOAL_MINUTES", 180))
 
     return {
-        "sessions": sessions[-10:],
+        "sessions": recent_sessions,
         "categoryMinutes": {"points": category_points, "config": category_config},
         "sessionDistribution": {"points": session_distribution, "config": session_config},
         "focusScoreTrend": {"points": trend_points, "config": trend_config},
@@ -586,7 +722,7 @@ def build_settings_section() -> dict:
             "idleSeconds": int(getattr(settings, "TRACKLET_IDLE_THRESHOLD", 300)),
             "breakMinutes": int(getattr(settings, "TRACKLET_BREAK_MINUTES", 15)),
         },
-        "rules": [],
+        "rules": get_ruleset().rules,
         "privacy": {
             "redactFilenames": bool(getattr(settings, "TRACKLET_REDACT_FILENAMES", False)),
             "hideScreenshots": False,
@@ -598,81 +734,159 @@ def build_settings_section() -> dict:
             "deleteLabel": "Delete history",
         },
         "monitorStatus": status,
+        "backgroundTasks": task_stats(),
     }
 
 
-def build_dashboard_payload() -> dict:
-    """
-    Build complete dashboard payload from activity.jsonl as source of truth.
-    Falls back to old metrics.jsonl for sections not yet migrated.
-    """
-    # Load activity data from activity.jsonl (source of truth)
-    activities = load_activity_data()
-    
-    # Also load old dataframe for sections not yet migrated
-    df = _load_metrics_dataframe()
+def _format_switch_hour(dt: datetime) -> str:
+    """Format datetime as "6a", "11a", "2p", "11p" """
+    h = dt.hour
+    if h == 0: return "12a"
+    elif h < 12: return f"{h}a"
+    elif h == 12: return "12p"
+    else: return f"{h - 12}p"
 
-    payload: dict[str, Any] = {}
 
-    # Use new activity processor for accurate timestamps
-    overview = build_overview_data(activities)
-    if overview:
-        payload["overview"] = overview
+def build_activity_switches_section(activities: ActivityAggregate) -> Optional[dict]:
+    context_switches = compute_context_switches(activities)
+    if not context_switches:
+        return None
 
-    # Use new activity processor for timeline
-    timeline = build_timeline_data(activities)
-    if timeline:
-        payload["timeline"] = timeline
+    def label(dt: datetime) -> str:
+        if activities.granularity == "hour":
+            return _format_switch_hour(dt)
+        return format_bucket_label(dt, activities.granularity)
 
-    # Build switches from activities
-    context_switches = compute_context_switches(activities)
-    if context_switches:
-        # Format for switches section
-        from datetime import datetime
-        
-        def format_hour(dt: datetime) -> str:
-            """Format datetime as "6a", "11a", "2p", "11p" """
-            h = dt.hour
-            if h == 0: return "12a"
-            elif h < 12: return f"{h}a"
-            elif h == 12: return "12p"
-            else: return f"{h - 12}p"
-        
-        switches_points = []
-        for item in context_switches:
-            dt = datetime.fromisoformat(item["hour"])
-            switches_points.append({
-                "name": format_hour(dt),
-                "switches": item["switches"],
-            })
-        
-        payload["switches"] = {
-            "switchesOverTime": {
-                "points": switches_points,
-                "config": {
-                    "switches": {"label": "Switches", "color": "hsl(var(--chart-1))"}
-                },
+    switches_points = []
+    for item in context_switches:
+        dt = datetime.fromisoformat(item["hour"])
+        switches_points.append({
+            "name": label(dt),
+            "switches": item["switches"],
+        })
+
+    return {
+        "switchesOverTime": {
+            "points": switches_points,
+            "config": {
+                "switches": {"label": "Switches", "color": "hsl(var(--chart-1))"}
             },
-            "switchIntensity": {
-                "points": [],  # Can add later if needed
-                "config": {},
+        },
+        "switchIntensity": {
+            "points": [
+                {"name": label(local_datetime(hour, offset)), "count": int(count)}
+                for hour, offset, count in zip(
+                    activities.hours.tolist(), activities.hour_offsets.tolist(), activities.hour_segments.tolist()
+                )
+            ],
+            "config": {
+                "count": {"label": "Switches", "color": COLORS["unproductive"]},
             },
-            "topPairs": [],  # Can compute from activities if needed
-        }
+        },
+        "topPairs": [
+            {"from": activities.app_names[from_id], "to": activities.app_names[to_id], "count": count}
+            for from_id, to_id, count in activities.top_pairs
+        ],
+    }
+
+
+def _activity_aggregate(query: DashboardQuery = ALL_HISTORY) -> ActivityAggregate:
+    # activity.jsonl is the source of truth, through its hourly rollup or the
+    # sqlite tables; the aggregate is memoised per window
+    if sql_store.sqlite_enabled():
+        return sql_store.activity_aggregate(query.start, query.stop, query.granularity)
+    return activity_aggregate(query.start, query.stop, query.granularity)
+
+
+@dataclass(frozen=True)
+class SectionSpec:
+    build: Callable[[DashboardQuery], Optional[dict]]
+    inputs: tuple[Path, ...]
+    # Version of in-process state the output also depends on
+    version: Optional[Callable[[], Hashable]] = None
+
+
+# Payload sections in response order, each with the files its output depends on.
+# Activity sections classify through the rules file; settings lists the rules
+# and the background task counters.
+SECTIONS: dict[str, SectionSpec] = {
+    "overview": SectionSpec(lambda q: build_overview_data(_activity_aggregate(q)), (ACTIVITY_FILE, RULES_FILE)),
+    "timeline": SectionSpec(lambda q: build_timeline_data(_activity_aggregate(q)), (ACTIVITY_FILE, RULES_FILE)),
+    "switches": SectionSpec(lambda q: build_activity_switches_section(_activity_aggregate(q)), (ACTIVITY_FILE,)),
+    # Not yet migrated off metrics.jsonl
+    "idle": SectionSpec(lambda q: build_idle_section(_load_metrics_dataframe(q), q.granularity), (METRICS_FILE,)),
+    "apps": SectionSpec(lambda q: build_apps_section(_load_metrics_dataframe(q)), (METRICS_FILE,)),
+    "focus": SectionSpec(lambda q: build_focus_section(_load_metrics_dataframe(q), q.granularity), (METRICS_FILE,)),
+    "settings": SectionSpec(lambda q: build_settings_section(), (MONITOR_FILE, RULES_FILE), task_stats_version),
+}
+
+_SECTION_LOCK = threading.Lock()
+_SECTION_CACHE: dict[str, tuple[tuple, Optional[dict]]] = {}
 
-    # Keep old sections for now (can migrate later)
-    idle = build_idle_section(df)
-    if idle:
-        payload["idle"] = idle
 
-    apps = build_apps_section(df)
-    if apps:
-        payload["apps"] = apps
+def _spec_inputs(spec: SectionSpec) -> tuple[Path, ...]:
+    """The files ``spec`` reads right now: RULES_FILE stands for the configured rules file."""
+    sqlite = sql_store.sqlite_enabled()
+    sources = []
+    for path in spec.inputs:
+        if path == RULES_FILE:
+            sources.append(rules_path())
+        elif path == METRICS_FILE and sqlite:
+            # The sqlite backend joins metrics rows from the two logs instead of reading metrics.jsonl
+            sources.extend((ACTIVITY_FILE, HISTORY_FILE))
+        else:
+            sources.append(path)
+    return tuple(dict.fromkeys(sources))
 
-    focus = build_focus_section(df)
-    if focus:
-        payload["focus"] = focus
 
-    payload["settings"] = build_settings_section()
+def section_inputs(sections: Iterable[str]) -> tuple[Path, ...]:
+    """Union of the input files of ``sections``, in a stable order."""
+    return tuple(dict.fromkeys(path for name in sections for path in _spec_inputs(SECTIONS[name])))
 
+
+def section_versions(sections: Iterable[str]) -> tuple:
+    """Current versions of the in-process state ``sections`` read besides their files."""
+    return tuple(SECTIONS[name].version() for name in sections if SECTIONS[name].version is not None)
+
+
+def build_section(name: str, query: DashboardQuery = ALL_HISTORY) -> Optional[dict]:
+    """
+    Build one payload section, reusing the last all-history result while the
+    section's own input files (and version, if it has one) are unchanged.
+    Raises KeyError for an unknown section.
+    """
+    spec = SECTIONS[name]
+    if query != ALL_HISTORY:
+        # Windowed payloads are cached whole by dashboard_cache
+        return spec.build(query)
+    current = (fingerprint(_spec_inputs(spec)), section_versions((name,)))
+    with _SECTION_LOCK:
+        cached = _SECTION_CACHE.get(name)
+        if cached is not None and cached[0] == current:
+            return cached[1]
+    value = spec.build(query)
+    with _SECTION_LOCK:
+        _SECTION_CACHE[name] = (current, value)
+    return value
+
+
+def build_dashboard_payload(sections: Optional[Iterable[str]] = None, query: DashboardQuery = ALL_HISTORY) -> dict:
+    """
+    Build the dashboard payload from activity.jsonl as source of truth, with
+    metrics.jsonl for sections not yet migrated. ``sections`` limits the
+    payload to those names (see SECTIONS); only their builders run. ``query``
+    limits every section to a time window and sets the chart bucket size.
+    """
+    wanted = set(SECTIONS if sections is None else sections)
+    unknown = wanted - SECTIONS.keys()
+    if unknown:
+        raise KeyError(f"Unknown dashboard section(s): {', '.join(sorted(unknown))}")
+
+    payload: dict[str, Any] = {}
+    for name in SECTIONS:
+        if name not in wanted:
+            continue
+        value = build_section(name, query)
+        if value or name == "settings":
+            payload[name] = value
     return payload
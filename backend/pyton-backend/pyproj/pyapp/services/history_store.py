@@ -1,8 +1,13 @@
 # pyapp/services/history_store.py
 import json
+from . import sql_store
+from .journal import JournalCommit, journal_writer
 from .paths import HISTORY_FILE
 
-def append_history(entry: dict) -> None:
-    """Append one JSON object per line to q_analysis.jsonl."""
-    with open(HISTORY_FILE, "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+def append_history(entry: dict) -> JournalCommit:
+    """Append one JSON object as a line of q_analysis.jsonl (and its table, under the sqlite backend)."""
+    # Batched with concurrent appends and fsynced; returns the line's seq and logical offset
+    commit = journal_writer(HISTORY_FILE).append(json.dumps(entry, ensure_ascii=False))
+    if sql_store.sqlite_enabled():
+        sql_store.record_label(entry, commit.offset)
+    return commit
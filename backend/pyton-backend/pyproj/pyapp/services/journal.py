@@ -0,0 +1,364 @@
+"""
+Group-commit append writer for q_analysis.jsonl.
+
+append() hands a line to the process's writer and blocks until it is on disk.
+One flusher thread per file waits FLUSH_INTERVAL_SECONDS for the threads
+appending to join a batch, then writes up to MAX_BATCH lines with one write()
+under an exclusive fcntl lock on the hot file, and one fsync after releasing it
+so other processes' batches can share the disk flush. Every process's writer
+and log rotation (log_partitions) take that lock, so lines from concurrent
+Django workers never interleave and never fall into a rotation's truncate
+window. The file handle stays open between batches.
+
+Each committed line gets a sequence number, its line number in the logical log
+(rotated partitions included), and its logical byte range. The writer
+remembers where its last batch left the log; when the hot file has only grown
+since, it counts just the lines other processes added, and only after a
+rotation does it ask the partitions. The position is also kept in a sidecar
+(q_analysis.jsonl.seq), rewritten at most every SIDECAR_INTERVAL_SECONDS and
+when the writer closes, so readers in any process can resume from it:
+everything before ``committed().end`` is whole lines, though the log may
+already run further. Lines that reached the file some other way are counted in
+before the next batch; if the sidecar is lost, counting restarts from the lines
+retention kept.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from .log_partitions import partitioned_log
+
+LOG = logging.getLogger(__name__)
+
+# How long a batch stays open for more lines; threads released by the previous
+# batch append again within it, so a busy writer batches them instead of one each
+FLUSH_INTERVAL_SECONDS = 0.002
+MAX_BATCH = 256
+# Longest the sidecar lags behind this process's commits
+SIDECAR_INTERVAL_SECONDS = 1.0
+SIDECAR_SUFFIX = ".seq"
+
+_OPEN_FLAGS = os.O_RDWR | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0)
+
+
+@dataclass(frozen=True)
+class JournalCommit:
+    seq: int  # line number in the logical log, from 1
+    offset: int  # logical offset of the line's first byte
+    end: int  # logical offset just past its newline
+
+
+@dataclass(frozen=True)
+class JournalPosition:
+    seq: int  # lines committed so far
+    end: int  # logical offset just past the last of them
+
+
+class _Pending:
+    __slots__ = ("data", "done", "commit", "error")
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.done = threading.Event()
+        self.commit: Optional[JournalCommit] = None
+        self.error: Optional[BaseException] = None
+
+
+def _read_sidecar(fd: int) -> Optional[JournalPosition]:
+    os.lseek(fd, 0, os.SEEK_SET)
+    try:
+        seq, end = os.read(fd, 64).split()
+        return JournalPosition(int(seq), int(end))
+    except ValueError:  # empty, or torn by a crash
+        return None
+
+
+def _write_sidecar(fd: int, position: JournalPosition) -> None:
+    # Fixed width, so rewriting in place never leaves a longer old record behind
+    os.lseek(fd, 0, os.SEEK_SET)
+    os.write(fd, f"{position.seq:>20} {position.end:>20}\n".encode("ascii"))
+
+
+class JournalWriter:
+    def __init__(
+        self,
+        path: str | Path,
+        flush_interval: float = FLUSH_INTERVAL_SECONDS,
+        max_batch: int = MAX_BATCH,
+        durable: bool = True,
+    ) -> None:
+        self.path = Path(path)
+        self.sidecar = self.path.with_name(self.path.name + SIDECAR_SUFFIX)
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.durable = durable
+        self.log = partitioned_log(self.path)
+        self.batches = 0
+        self.lines = 0
+        self._cond = threading.Condition()
+        self._pending: list[_Pending] = []
+        self._position: Optional[JournalPosition] = None
+        self._listeners: list[Callable[[JournalPosition], None]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._wanted = 1
+        self._fd: Optional[int] = None
+        self._sidecar_fd: Optional[int] = None
+        # After our last batch: the manifest's stat, the hot file's size and the log's position
+        self._seen: Optional[tuple[Optional[tuple], int, JournalPosition]] = None
+        self._sidecar_due = 0.0
+        self._sidecar_stale = False
+
+    # -- appending ----------------------------------------------------------
+
+    def append(self, line: str | bytes) -> JournalCommit:
+        """Write ``line`` (one line, newline optional) with the next batch; returns once it is on disk."""
+        data = line.encode("utf-8") if isinstance(line, str) else bytes(line)
+        if not data.endswith(b"\n"):
+            data += b"\n"
+        if b"\n" in data[:-1]:
+            raise ValueError("A journal entry must be a single line")
+        item = _Pending(data)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"Journal for {self.path} is closed")
+            self._pending.append(item)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"journal-{self.path.name}", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        return item.commit
+
+    def add_listener(self, callback: Callable[[JournalPosition], None]) -> None:
+        """Call ``callback(position)`` from the flusher thread after each batch this process commits."""
+        with self._cond:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def position(self) -> Optional[JournalPosition]:
+        """The last batch this process committed, or None before the first."""
+        with self._cond:
+            return self._position
+
+    def wait(self, seq: int, timeout: Optional[float] = None) -> bool:
+        """Block until this process has committed line ``seq``; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._position is not None and self._position.seq >= seq, timeout
+            )
+
+    def close(self) -> None:
+        """Commit what is pending, stop the flusher and close the files."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        with self.log.lock:
+            if self._sidecar_stale and self._fd is not None:
+                try:
+                    self._flush_sidecar()
+                except OSError as exc:
+                    LOG.warning("Could not update %s: %s", self.sidecar, exc)
+            for fd in (self._fd, self._sidecar_fd):
+                if fd is not None:
+                    os.close(fd)
+            self._fd = self._sidecar_fd = None
+
+    # -- flushing -----------------------------------------------------------
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Group commit: the threads the last batch released are likely to
+                # append again, so wait a moment for them and those queued behind it
+                wanted = min(self._wanted, self.max_batch)
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < wanted and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[: self.max_batch]
+                del self._pending[: self.max_batch]
+            try:
+                commits = self._write(batch)
+            except OSError as exc:
+                LOG.warning("Journal write to %s failed: %s", self.path, exc)
+                for item in batch:
+                    item.error = exc
+                    item.done.set()
+                continue
+            for item, commit in zip(batch, commits):
+                item.commit = commit
+                item.done.set()
+            position = JournalPosition(commits[-1].seq, commits[-1].end)
+            with self._cond:
+                self._position = position
+                self.batches += 1
+                self.lines += len(batch)
+                self._wanted = len(batch) + len(self._pending)
+                self._cond.notify_all()
+                listeners = list(self._listeners)
+            for callback in listeners:
+                try:
+                    callback(position)
+                except Exception:
+                    LOG.exception("Journal listener failed")
+
+    def _open(self) -> tuple[int, int]:
+        """The hot file and sidecar descriptors, reopened if the hot file was replaced."""
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if self._fd is not None and os.fstat(self._fd).st_ino != inode:
+            os.close(self._fd)
+            self._fd = None
+        if self._fd is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.path, _OPEN_FLAGS, 0o644)
+        if self._sidecar_fd is None:
+            self._sidecar_fd = os.open(self.sidecar, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        return self._fd, self._sidecar_fd
+
+    def _manifest_stat(self) -> Optional[tuple]:
+        try:
+            stat = self.log.manifest_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _locate(self, fd: int, sidecar_fd: int) -> tuple[JournalPosition, bool, Optional[tuple], int]:
+        """
+        The log's position, whether its last line is complete, the manifest's
+        stat and the hot file's size. Called under the exclusive lock.
+        """
+        size = os.fstat(fd).st_size
+        manifest = self._manifest_stat()
+        if self._seen is not None and self._seen[0] == manifest and self._seen[1] <= size:
+            # No rotation since our last batch, so the hot file was only appended to
+            _, seen_size, position = self._seen
+            if size == seen_size:
+                return position, True, manifest, size
+            added = os.pread(fd, size - seen_size, seen_size)
+            position = JournalPosition(position.seq + added.count(b"\n"), position.end + len(added))
+            return position, added.endswith(b"\n"), manifest, size
+        end = self.log.end()
+        # Start counting from the later of the sidecar and our own last batch
+        known = [
+            candidate
+            for candidate in (_read_sidecar(sidecar_fd), self._seen and self._seen[2])
+            if candidate and candidate.end <= end
+        ]
+        known = max(known, key=lambda candidate: candidate.end, default=JournalPosition(0, self.log.start()))
+        seq = known.seq
+        if known.end < end:
+            seq += self.log.read_from(known.end).data.count(b"\n")
+        complete = not size or os.pread(fd, 1, size - 1) == b"\n"
+        return JournalPosition(seq, end), complete, manifest, size
+
+    def _write(self, batch: list[_Pending]) -> list[JournalCommit]:
+        payload = b"".join(item.data for item in batch)
+        with self.log.lock:
+            fd, sidecar_fd = self._open()
+            with self.log.exclusive(fd):
+                position, complete, manifest, size = self._locate(fd, sidecar_fd)
+                seq, end = position.seq, position.end
+                if not complete:
+                    # A writer died mid-line; close that line so ours stays whole
+                    payload = b"\n" + payload
+                    seq += 1
+                    end += 1
+                view = memoryview(payload)
+                while view:
+                    view = view[os.write(fd, view):]
+                commits = []
+                offset = end
+                for item in batch:
+                    seq += 1
+                    commits.append(JournalCommit(seq, offset, offset + len(item.data)))
+                    offset += len(item.data)
+                position = JournalPosition(seq, offset)
+                self._seen = (manifest, size + len(payload), position)
+                # Written under the lock, so the sidecar never moves backwards
+                now = time.monotonic()
+                self._sidecar_stale = now < self._sidecar_due
+                if not self._sidecar_stale:
+                    _write_sidecar(sidecar_fd, position)
+                    self._sidecar_due = now + SIDECAR_INTERVAL_SECONDS
+        if self.durable:
+            # Outside the lock: fsyncs from other processes' batches overlap
+            (getattr(os, "fdatasync", None) or os.fsync)(fd)
+        return commits
+
+    def _flush_sidecar(self) -> None:
+        """Bring the sidecar up to the log's current end; the caller holds self.log.lock."""
+        fd, sidecar_fd = self._open()
+        with self.log.exclusive(fd):
+            position, complete, manifest, size = self._locate(fd, sidecar_fd)
+            if complete:
+                _write_sidecar(sidecar_fd, position)
+                self._seen = (manifest, size, position)
+        self._sidecar_stale = False
+
+
+_WRITERS: dict[Path, JournalWriter] = {}
+_WRITERS_LOCK = threading.Lock()
+
+
+def journal_writer(path: str | Path) -> JournalWriter:
+    """The process-wide JournalWriter for the hot file ``path``."""
+    key = Path(path).resolve()
+    with _WRITERS_LOCK:
+        if key not in _WRITERS:
+            _WRITERS[key] = JournalWriter(key)
+        return _WRITERS[key]
+
+
+def committed(path: str | Path) -> Optional[JournalPosition]:
+    """The last position any process committed to ``path``, from its sidecar."""
+    path = Path(path)
+    try:
+        fd = os.open(path.with_name(path.name + SIDECAR_SUFFIX), os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    except FileNotFoundError:
+        return None
+    try:
+        return _read_sidecar(fd)
+    finally:
+        os.close(fd)
+
+
+@atexit.register
+def _close_writers() -> None:
+    with _WRITERS_LOCK:
+        writers = list(_WRITERS.values())
+    for writer in writers:
+        writer.close()
+
+
+def _forget_writers() -> None:
+    global _WRITERS_LOCK
+    _WRITERS.clear()
+    _WRITERS_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    # A forked child shares the parent's open file description, and with it the
+    # fcntl lock; it gets writers of its own (the flusher threads did not survive)
+    os.register_at_fork(after_in_child=_forget_writers)
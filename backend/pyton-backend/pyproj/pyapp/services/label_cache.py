@@ -0,0 +1,171 @@
+"""
+Near-duplicate screenshot cache in front of the Gemini classifier.
+
+Consecutive captures are mostly the same editor or tab, so each label is
+cached under a perceptual fingerprint of its screenshot: a dHash (the image
+shrunk to 17x16 grayscale, one bit per pixel saying whether it is brighter
+than its left neighbour) plus the thumbnail's mean brightness. A capture asked
+with the same prompt whose hash is within MAX_DISTANCE bits (Hamming) and
+whose brightness is within MAX_BRIGHTNESS_DELTA of a cached one reuses that
+label instead of calling the model. The brightness check is there because a
+dHash only sees edges: a blank white page and a blank dark one hash alike.
+
+The hash cannot read text, so the window in focus, as the tracker last
+recorded it in activity.jsonl, is part of the key: a label is only reused
+for the same app and window title it was produced under, which keeps the
+app_name and window_title it carries current (the combiner matches labels to
+activity on both). With no recent tracker line the model is always asked.
+
+Entries expire TTL seconds after the model produced them, and past CAPACITY
+the least recently used go first. Labels the model could not produce
+(``productive`` missing) are not cached.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+from PIL import Image
+
+LOG = logging.getLogger(__name__)
+
+HASH_SIZE = 16
+DEFAULT_MAX_DISTANCE = 6  # of HASH_SIZE**2 bits
+MAX_BRIGHTNESS_DELTA = 8.0  # mean gray level, 0-255
+DEFAULT_TTL_SECONDS = 300.0
+DEFAULT_CAPACITY = 256
+
+# (app_name, window_title) in focus
+Window = tuple[str, str]
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    bits: int
+    brightness: float
+
+
+@dataclass
+class _Entry:
+    fingerprint: Fingerprint
+    label: dict
+    stored: float
+
+
+def fingerprint(path: str | Path) -> Fingerprint:
+    """dHash and mean brightness of the image at ``path``."""
+    with Image.open(path) as image:
+        small = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = np.packbits((pixels[:, 1:] > pixels[:, :-1]).ravel())
+    return Fingerprint(int.from_bytes(bits.tobytes(), "big"), float(pixels.mean()))
+
+
+class LabelCache:
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL_SECONDS,
+        max_distance: int = DEFAULT_MAX_DISTANCE,
+        capacity: int = DEFAULT_CAPACITY,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.capacity = capacity
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[int, str, Window], _Entry] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._unhashable = 0
+        self._untracked = 0
+        self._expired = 0
+        self._evicted = 0
+
+    def lookup(self, key: Fingerprint, prompt: str, window: Window) -> Optional[dict]:
+        """The label of the closest live entry for ``prompt`` and ``window`` within the thresholds."""
+        with self._lock:
+            now = self._clock()
+            best = None
+            best_distance = self.max_distance + 1
+            # A linear scan: CAPACITY entries cost microseconds next to a model call
+            for cache_key, entry in list(self._entries.items()):
+                if now - entry.stored > self.ttl:
+                    del self._entries[cache_key]
+                    self._expired += 1
+                    continue
+                if cache_key[1:] != (prompt, window) or abs(entry.fingerprint.brightness - key.brightness) > MAX_BRIGHTNESS_DELTA:
+                    continue
+                distance = (entry.fingerprint.bits ^ key.bits).bit_count()
+                if distance < best_distance:
+                    best, best_distance = cache_key, distance
+            if best is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self._hits += 1
+            return dict(self._entries[best].label)
+
+    def store(self, key: Fingerprint, prompt: str, window: Window, label: dict) -> None:
+        with self._lock:
+            self._entries[(key.bits, prompt, window)] = _Entry(key, dict(label), self._clock())
+            self._entries.move_to_end((key.bits, prompt, window))
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self._evicted += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hitRate": round(self._hits / lookups, 4) if lookups else None,
+                "unhashable": self._unhashable,
+                "untracked": self._untracked,
+                "entries": len(self._entries),
+                "expired": self._expired,
+                "evicted": self._evicted,
+                "capacity": self.capacity,
+                "ttlSeconds": self.ttl,
+                "maxDistance": self.max_distance,
+            }
+
+    def wrap(
+        self,
+        analyze: Callable[[str, str], dict],
+        window: Callable[[], Optional[Window]],
+    ) -> Callable[[str, str], dict]:
+        """
+        ``analyze(image_path, prompt)`` that answers near-duplicates from the
+        cache; ``window()`` is the window in focus now, or None if unknown.
+        """
+
+        def classify(image_path: str, prompt: str) -> dict:
+            focus = window()
+            if focus is None:
+                with self._lock:
+                    self._untracked += 1
+                return analyze(image_path, prompt)
+            try:
+                key = fingerprint(image_path)
+            except (OSError, ValueError) as exc:
+                LOG.warning("Could not fingerprint %s; classifying without the cache: %s", image_path, exc)
+                with self._lock:
+                    self._unhashable += 1
+                return analyze(image_path, prompt)
+            label = self.lookup(key, prompt, focus)
+            if label is not None:
+                return label
+            label = analyze(image_path, prompt)
+            if label.get("productive") is not None:
+                self.store(key, prompt, focus, label)
+            return label
+
+        return classify
@@ -0,0 +1,227 @@
+"""
+Live dashboard deltas for the /api/dashboard/stream/ server-sent events feed.
+
+One watcher thread polls the input files and fans each change out to every
+connected client as a small message, instead of each client re-fetching the
+whole payload:
+
+* ``activity``: feed rows appended to activity.jsonl plus the current-hour
+  points of the overview and timeline charts
+* ``metrics``: the combiner rewrote metrics.jsonl; lists the sections to refetch
+* ``monitor``: the unproductive-streak flag flipped
+* ``reset``: activity.jsonl was rotated or truncated; refetch everything
+
+The watcher starts with the first subscriber and exits after the last leaves.
+A subscriber created with an event loop (the ASGI stream) gets an
+asyncio.Queue that the watcher feeds through call_soon_threadsafe(), so an
+idle connection waits on the loop without holding a thread.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from .activity_processor import EVENT_FEED_LIMIT, activity_events_between, load_activity_frame
+from .dashboard_cache import fingerprint
+from .dashboard_data import build_section
+from .paths import ACTIVITY_FILE, METRICS_FILE, MONITOR_FILE
+
+LOG = logging.getLogger(__name__)
+
+POLL_INTERVAL_SECONDS = 1.0
+HEARTBEAT_SECONDS = 15.0
+# A client this far behind is dropped; it reconnects and refetches
+SUBSCRIBER_QUEUE_SIZE = 256
+
+METRICS_SECTIONS = ("idle", "apps", "focus")
+
+
+@dataclass(frozen=True)
+class LiveMessage:
+    id: int
+    event: str
+    data: dict
+
+    def encode(self) -> bytes:
+        text = json.dumps(self.data, ensure_ascii=False, separators=(",", ":"))
+        return f"id: {self.id}\nevent: {self.event}\ndata: {text}\n\n".encode("utf-8")
+
+
+class Subscription:
+    def __init__(self, hub: "LiveHub", loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        self._hub = hub
+        self._loop = loop
+        self.queue: queue.Queue[LiveMessage] | asyncio.Queue[LiveMessage] = (
+            queue.Queue(SUBSCRIBER_QUEUE_SIZE) if loop is None else asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        )
+
+    def get(self, timeout: float) -> Optional[LiveMessage]:
+        """Next message, or None on timeout. For subscribers without a loop."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def get_async(self, timeout: float) -> Optional[LiveMessage]:
+        """Next message, or None on timeout. For subscribers created with a loop."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def put(self, message: LiveMessage) -> bool:
+        """Queue ``message`` from the watcher thread; False if the subscriber is gone or too far behind."""
+        if self._loop is None:
+            try:
+                self.queue.put_nowait(message)
+            except queue.Full:
+                return False
+            return True
+        try:
+            self._loop.call_soon_threadsafe(self._put_on_loop, message)
+        except RuntimeError:  # the loop was closed
+            return False
+        return True
+
+    def _put_on_loop(self, message: LiveMessage) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            LOG.info("Dropping live subscriber that fell %s messages behind", SUBSCRIBER_QUEUE_SIZE)
+            self.close()
+
+    @property
+    def closed(self) -> bool:
+        return self not in self._hub._subscribers
+
+    def close(self) -> None:
+        self._hub.unsubscribe(self)
+
+
+def _last_point(section: Optional[dict], *path: str) -> Optional[dict]:
+    node = section or {}
+    for key in path:
+        node = node.get(key) or {}
+    points = node.get("points") if isinstance(node, dict) else None
+    return points[-1] if points else None
+
+
+def _read_monitor() -> dict:
+    try:
+        return json.loads(MONITOR_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+class LiveHub:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscribers: set[Subscription] = set()
+        self._thread: Optional[threading.Thread] = None
+        self._next_id = 1
+        self._fingerprints: dict[str, tuple] = {}
+        self._activity_len = 0
+        self._activity_strings = None
+        self._streak: Optional[bool] = None
+
+    def subscribe(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> Subscription:
+        """
+        Register a client. With ``loop``, its messages go to an asyncio.Queue
+        read with get_async() on that loop; otherwise use get().
+        """
+        subscription = Subscription(self, loop)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if self._thread is None or not self._thread.is_alive():
+                self._prime()
+                self._thread = threading.Thread(target=self._watch, name="pyapp-live-watcher", daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _publish(self, event: str, data: dict) -> None:
+        with self._lock:
+            message = LiveMessage(self._next_id, event, data)
+            self._next_id += 1
+            for subscription in list(self._subscribers):
+                if not subscription.put(message):
+                    LOG.info(
+                        "Dropping live subscriber that fell %s messages behind or went away", SUBSCRIBER_QUEUE_SIZE
+                    )
+                    self._subscribers.discard(subscription)
+
+    def _prime(self) -> None:
+        """Baseline the watched state so only changes after subscribing are sent."""
+        frame = load_activity_frame()
+        self._activity_len = len(frame)
+        self._activity_strings = frame.apps
+        self._streak = bool(_read_monitor().get("unproductive_streak"))
+        for name, path in (("activity", ACTIVITY_FILE), ("metrics", METRICS_FILE), ("monitor", MONITOR_FILE)):
+            self._fingerprints[name] = fingerprint((path,))
+
+    def _changed(self, name, path) -> bool:
+        current = fingerprint((path,))
+        if current == self._fingerprints.get(name):
+            return False
+        self._fingerprints[name] = current
+        return True
+
+    def _check_activity(self) -> None:
+        frame = load_activity_frame()
+        if frame.apps is not self._activity_strings or len(frame) < self._activity_len:
+            self._activity_len = len(frame)
+            self._activity_strings = frame.apps
+            self._publish("reset", {"reason": "activity log rotated"})
+            return
+        if len(frame) == self._activity_len:
+            return
+        start = max(self._activity_len, len(frame) - EVENT_FEED_LIMIT)
+        events = activity_events_between(frame, start, len(frame))
+        self._activity_len = len(frame)
+
+        overview = build_section("overview")
+        timeline = build_section("timeline")
+        self._publish("activity", {
+            "activityEvents": events,
+            "hourlyProductivity": _last_point(overview, "hourlyProductivity"),
+            "contextSwitchTrend": _last_point(overview, "contextSwitchTrend"),
+            "dailyTimeline": _last_point(timeline, "dailyTimeline"),
+        })
+
+    def _check_monitor(self) -> None:
+        status = _read_monitor()
+        streak = bool(status.get("unproductive_streak"))
+        if streak != self._streak:
+            self._streak = streak
+            self._publish("monitor", status)
+
+    def _watch(self) -> None:
+        LOG.info("Live update watcher started")
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    break
+            try:
+                if self._changed("activity", ACTIVITY_FILE):
+                    self._check_activity()
+                if self._changed("metrics", METRICS_FILE):
+                    self._publish("metrics", {"sections": list(METRICS_SECTIONS)})
+                if self._changed("monitor", MONITOR_FILE):
+                    self._check_monitor()
+            except Exception:
+                LOG.exception("Live update watcher pass failed")
+            time.sleep(POLL_INTERVAL_SECONDS)
+        LOG.info("Live update watcher stopped")
+
+
+HUB = LiveHub()
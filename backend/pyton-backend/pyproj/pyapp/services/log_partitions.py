@@ -0,0 +1,434 @@
+"""
+Daily partitions behind the append-only JSONL logs (activity.jsonl, q_analysis.jsonl).
+
+Writers keep appending to the hot file. Rotation moves what has accumulated
+there into one file per day in a sibling directory (activity/2025-10-05.jsonl)
+and then truncates the hot file in place, copytruncate-style, because the C++
+tracker keeps activity.jsonl open in append mode. Closed days are gzipped and
+days older than TRACKLET_RETENTION_DAYS are deleted.
+
+``manifest.json`` in that directory lists the partitions and records each
+rotated block as a segment: its range in the *logical* log (every byte ever
+appended to the hot file) and the partition pieces that now hold it. Readers
+that keep byte offsets (the activity ingest cursor, the combiner state) use
+logical offsets, and read_from() stitches partitions and the hot file back
+together, so a rotation is invisible to them. ``hot_skip`` is the prefix of
+the hot file that is already in partitions but not yet truncated away.
+
+Rotation, compaction and reads in this process share a lock. Across
+processes they use an fcntl lock on the hot file: rotation and compaction hold
+it exclusively, as the q_analysis.jsonl journal writer does for each batch
+(see journal.py), and reads hold it shared while they take the manifest and
+read the hot file, so a read never pairs one manifest with a hot file another
+process has since truncated.
+
+Every writer of a hot file must hold that exclusive lock around each append
+(exclusive_lock() here, flock(LOCK_EX) elsewhere). The truncate is only safe
+against writers that do: a line appended without the lock between rotation's
+final read and the truncate is lost, as with logrotate's copytruncate. The
+C++ tracker does not take it yet (docs/RUNBOOK.md, section 5). For such a
+writer the hot file is only truncated when a re-read finds nothing new, which
+keeps the window to a single system call. Without fcntl (Windows) nothing
+is locked across processes.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.utils import timezone as dj_timezone
+
+try:  # Optional: advisory locks between processes; Windows has no fcntl
+    import fcntl
+except ImportError:  # pragma: no cover - in-process locking only
+    fcntl = None
+
+LOG = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+# Rotate before the day is over once the hot file reaches this size
+ROTATE_BYTES = 8 * 1024 * 1024
+DEFAULT_RETENTION_DAYS = 30
+
+_DAY = re.compile(rb'"timestamp"\s*:\s*"(\d{4}-\d{2}-\d{2})')
+
+
+@dataclass(frozen=True)
+class LogRead:
+    data: bytes
+    start: int  # logical offset of data[0]; later than asked when older data expired
+    end: int
+
+
+def _empty_manifest() -> dict:
+    return {
+        "version": MANIFEST_VERSION,
+        "rotated_bytes": 0,
+        "hot_skip": 0,
+        "partitions": {},
+        "segments": [],
+    }
+
+
+@contextmanager
+def exclusive_lock(fd: int):
+    """Hold an exclusive fcntl lock on the open file ``fd`` (a no-op without fcntl)."""
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def _line_day(line: bytes) -> Optional[str]:
+    match = _DAY.search(line, 0, 200)
+    return match.group(1).decode("ascii") if match else None
+
+
+class PartitionedLog:
+    def __init__(self, hot: Path) -> None:
+        self.hot = hot
+        self.directory = hot.with_suffix("")
+        self.manifest_path = self.directory / MANIFEST_NAME
+        self.lock = threading.RLock()
+        # Depth of exclusive() in the thread holding self.lock
+        self._exclusive = 0
+        self._cached: tuple[Optional[tuple], dict] = (None, _empty_manifest())
+
+    # -- locking ------------------------------------------------------------
+
+    @contextmanager
+    def exclusive(self, fd: int):
+        """
+        Hold this process's lock and an exclusive fcntl lock on ``fd``, an open
+        descriptor of the hot file. Reads made inside it need no lock of their own.
+        """
+        with self.lock, exclusive_lock(fd):
+            self._exclusive += 1
+            try:
+                yield
+            finally:
+                self._exclusive -= 1
+
+    @contextmanager
+    def _locked(self, shared: bool = True):
+        """This process's lock plus an fcntl lock on the hot file, if it exists."""
+        with self.lock:
+            if self._exclusive or fcntl is None:
+                yield
+                return
+            try:
+                fd = os.open(self.hot, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+            except FileNotFoundError:
+                yield
+                return
+            try:
+                if shared:
+                    fcntl.flock(fd, fcntl.LOCK_SH)
+                    yield
+                else:
+                    with self.exclusive(fd):
+                        yield
+            finally:
+                os.close(fd)  # releases the lock
+
+    # -- manifest -----------------------------------------------------------
+
+    def _manifest(self) -> dict:
+        """The current manifest, shared and cached on its stat; see _editable() to change it."""
+        try:
+            stat = self.manifest_path.stat()
+        except OSError:
+            return _empty_manifest()
+        key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if self._cached[0] != key:
+            try:
+                manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                LOG.warning("Unreadable %s; treating %s as unrotated", self.manifest_path, self.hot)
+                manifest = None
+            if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+                manifest = _empty_manifest()
+            self._cached = (key, manifest)
+        return self._cached[1]
+
+    def _editable(self) -> dict:
+        """A private copy of the manifest; a JSON round trip is much cheaper than deepcopy here."""
+        return json.loads(json.dumps(self._manifest()))
+
+    def _save(self, manifest: dict) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self.manifest_path.with_suffix(".json.tmp")
+        # Compact, so json uses its C encoder; rotation saves this under the writers' lock
+        tmp.write_text(json.dumps(manifest, separators=(",", ":")), encoding="utf-8")
+        tmp.replace(self.manifest_path)
+
+    def _hot_size(self) -> int:
+        try:
+            return self.hot.stat().st_size
+        except OSError:
+            return 0
+
+    def _hot_skip(self, manifest: dict, hot_size: int) -> int:
+        skip = manifest["hot_skip"]
+        # Smaller than the skip: the truncate happened but the manifest update after it did not
+        return skip if hot_size >= skip else 0
+
+    # -- reading ------------------------------------------------------------
+
+    def end(self) -> int:
+        """Logical offset just past the last byte in the hot file."""
+        with self._locked():
+            manifest = self._manifest()
+            size = self._hot_size()
+            return manifest["rotated_bytes"] + size - self._hot_skip(manifest, size)
+
+    def start(self) -> int:
+        """Logical offset of the oldest byte retention has kept."""
+        with self.lock:
+            manifest = self._manifest()
+            segments = manifest["segments"]
+            return segments[0]["start"] if segments else manifest["rotated_bytes"]
+
+    def _read_piece(self, manifest: dict, day: str, offset: int, length: int) -> bytes:
+        partition = manifest["partitions"][day]
+        path = self.directory / partition["file"]
+        opener = gzip.open if partition["compressed"] else open
+        with opener(path, "rb") as fh:
+            fh.seek(offset)
+            return fh.read(length)
+
+    def read_from(self, offset: int) -> LogRead:
+        """
+        The logical log from ``offset`` to the current end of the hot file.
+        Starts later than ``offset`` when those bytes were already deleted by retention.
+        """
+        with self._locked():
+            manifest = self._manifest()
+            hot_start = manifest["rotated_bytes"]
+            start = offset
+            chunks = []
+            if offset < hot_start:
+                segments = [segment for segment in manifest["segments"] if segment["stop"] > offset]
+                start = max(offset, segments[0]["start"]) if segments else hot_start
+                for segment in segments:
+                    position = segment["start"]
+                    for day, piece_offset, length in segment["pieces"]:
+                        skip = max(0, start - position)
+                        if skip < length:
+                            chunks.append(self._read_piece(manifest, day, piece_offset + skip, length - skip))
+                        position += length
+            size = self._hot_size()
+            if size:
+                with self.hot.open("rb") as fh:
+                    fh.seek(self._hot_skip(manifest, size) + max(0, start - hot_start))
+                    chunks.append(fh.read())
+            data = b"".join(chunks)
+            return LogRead(data, start, start + len(data))
+
+    def read_range(self, first: Optional[date] = None, last: Optional[date] = None) -> bytes:
+        """
+        Lines of the partitions for days in [first, last] followed by the hot
+        file; other partitions are never opened. Callers still filter rows by
+        timestamp, since the hot file can hold any day.
+        """
+        with self._locked():
+            manifest = self._manifest()
+            chunks = []
+            for day in sorted(manifest["partitions"]):
+                if (first and day < first.isoformat()) or (last and day > last.isoformat()):
+                    continue
+                partition = manifest["partitions"][day]
+                chunks.append(self._read_piece(manifest, day, 0, partition["bytes"]))
+            size = self._hot_size()
+            if size:
+                with self.hot.open("rb") as fh:
+                    fh.seek(self._hot_skip(manifest, size))
+                    chunks.append(fh.read())
+            return b"".join(chunks)
+
+    # -- rotation and compaction --------------------------------------------
+
+    def _append(self, manifest: dict, data: bytes, fallback_day: str) -> None:
+        """File complete lines ``data`` into day partitions and record the segment."""
+        runs: list[tuple[str, list[bytes]]] = []
+        day = fallback_day
+        for line in data.splitlines(keepends=True):
+            day = _line_day(line) or day
+            if runs and runs[-1][0] == day:
+                runs[-1][1].append(line)
+            else:
+                runs.append((day, [line]))
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        pieces = []
+        for day, lines in runs:
+            block = b"".join(lines)
+            partition = manifest["partitions"].setdefault(
+                day, {"file": f"{day}.jsonl", "compressed": False, "bytes": 0, "stored_bytes": 0, "rows": 0}
+            )
+            path = self.directory / partition["file"]
+            with path.open("r+b" if path.exists() else "wb") as fh:
+                # Anything past stored_bytes is left over from an interrupted rotation
+                fh.seek(partition["stored_bytes"])
+                fh.truncate()
+                # A late line for a gzipped day goes in as one more gzip member
+                fh.write(gzip.compress(block) if partition["compressed"] else block)
+                partition["stored_bytes"] = fh.tell()
+            pieces.append([day, partition["bytes"], len(block)])
+            partition["bytes"] += len(block)
+            partition["rows"] += len(lines)
+
+        start = manifest["rotated_bytes"]
+        segments = manifest["segments"]
+        last = segments[-1] if segments else None
+        if (
+            last is not None
+            and len(pieces) == 1
+            and last["stop"] == start
+            and last["pieces"][-1][0] == pieces[0][0]
+            and sum(last["pieces"][-1][1:]) == pieces[0][1]
+        ):
+            # More of the same day's run: extend it, so the manifest grows by days, not rotations
+            last["pieces"][-1][2] += pieces[0][2]
+            last["stop"] = start + len(data)
+        else:
+            segments.append({"start": start, "stop": start + len(data), "pieces": pieces})
+        manifest["rotated_bytes"] = start + len(data)
+
+    def rotate(self, today: Optional[date] = None) -> int:
+        """Move the hot file's complete lines into partitions; returns the bytes moved."""
+        fallback_day = (today or dj_timezone.localdate()).isoformat()
+        moved = 0
+        with self.lock:
+            if not self.hot.exists():
+                return 0
+            with self.hot.open("r+b") as fh, self.exclusive(fh.fileno()):
+                manifest = self._editable()
+                position = self._hot_skip(manifest, fh.seek(0, 2))
+                partial = False
+                while not partial:
+                    fh.seek(position)
+                    chunk = fh.read()
+                    complete = chunk.rfind(b"\n") + 1
+                    if not complete:
+                        partial = bool(chunk)
+                        break
+                    self._append(manifest, chunk[:complete], fallback_day)
+                    position += complete
+                    moved += complete
+                    manifest["hot_skip"] = position
+                    self._save(manifest)
+                    # The writer is mid-line; truncating now would cut that line
+                    partial = complete < len(chunk)
+                if not partial and position and fh.seek(0, 2) == position:
+                    fh.truncate(0)
+                    manifest["hot_skip"] = 0
+                    self._save(manifest)
+        if moved:
+            LOG.info("Rotated %s bytes of %s into %s", moved, self.hot.name, self.directory)
+        return moved
+
+    def due(self, today: Optional[date] = None) -> bool:
+        """Whether the hot file holds a closed day or has grown past ROTATE_BYTES."""
+        today = today or dj_timezone.localdate()
+        with self.lock:
+            size = self._hot_size()
+            skip = self._hot_skip(self._manifest(), size)
+            if size - skip >= ROTATE_BYTES:
+                return True
+            if size <= skip:
+                return False
+            with self.hot.open("rb") as fh:
+                fh.seek(skip)
+                day = _line_day(fh.readline())
+            return day is not None and day < today.isoformat()
+
+    def compact(self, today: Optional[date] = None, retention_days: Optional[int] = None) -> None:
+        """
+        Gzip closed days and delete days past retention. Retention counts back
+        from the newest day in the log rather than from today, so a machine the
+        tracker has not run on for a while keeps its last stretch of history.
+        """
+        today = today or dj_timezone.localdate()
+        if retention_days is None:
+            retention_days = int(getattr(settings, "TRACKLET_RETENTION_DAYS", DEFAULT_RETENTION_DAYS))
+        with self._locked(shared=False):
+            manifest = self._editable()
+            if not manifest["partitions"]:
+                return
+            try:
+                newest = date.fromisoformat(max(manifest["partitions"]))
+            except ValueError:
+                newest = today
+            oldest = (min(newest, today) - timedelta(days=retention_days)).isoformat()
+            changed = False
+            for day, partition in sorted(manifest["partitions"].items()):
+                path = self.directory / partition["file"]
+                if day < oldest:
+                    path.unlink(missing_ok=True)
+                    del manifest["partitions"][day]
+                    changed = True
+                elif day < today.isoformat() and not partition["compressed"]:
+                    with path.open("rb") as fh:
+                        block = fh.read(partition["stored_bytes"])
+                    packed = path.with_name(path.name + ".gz")
+                    tmp = packed.with_name(packed.name + ".tmp")
+                    tmp.write_bytes(gzip.compress(block))
+                    tmp.replace(packed)
+                    partition.update(file=packed.name, compressed=True, stored_bytes=packed.stat().st_size)
+                    changed = True
+            if not changed:
+                return
+            # Trim deleted days off the front of the logical log
+            segments = manifest["segments"]
+            while segments:
+                pieces = segments[0]["pieces"]
+                missing = [pos for pos, (day, _, _) in enumerate(pieces) if day not in manifest["partitions"]]
+                if not missing:
+                    break
+                cut = missing[-1] + 1
+                segments[0]["start"] += sum(length for _, _, length in pieces[:cut])
+                del pieces[:cut]
+                if not pieces:
+                    segments.pop(0)
+            self._save(manifest)
+            for partition in manifest["partitions"].values():
+                if partition["compressed"]:
+                    (self.directory / partition["file"]).with_suffix("").unlink(missing_ok=True)
+
+
+_LOGS: dict[Path, PartitionedLog] = {}
+_LOGS_LOCK = threading.Lock()
+
+
+def partitioned_log(path: str | Path) -> PartitionedLog:
+    """The process-wide PartitionedLog for the hot file ``path``."""
+    key = Path(path).resolve()
+    with _LOGS_LOCK:
+        if key not in _LOGS:
+            _LOGS[key] = PartitionedLog(key)
+        return _LOGS[key]
+
+
+def maintain(path: str | Path, today: Optional[date] = None) -> int:
+    """Rotate ``path`` if due, then compact and enforce retention. Returns bytes rotated."""
+    log = partitioned_log(path)
+    today = today or dj_timezone.localdate()
+    moved = log.rotate(today) if log.due(today) else 0
+    log.compact(today)
+    return moved
@@ -0,0 +1,290 @@
+"""
+Memory-mappable columnar sidecar for metrics.jsonl.
+
+The combiner keeps ``metrics.jsonl.columns/`` next to the JSONL so readers can
+map already-parsed columns instead of re-parsing JSON text:
+
+* ``meta.json``: the JSONL (inode, size, mtime_ns) the columns describe, the
+  byte offset and row count of the committed rows, and each column's kind,
+  dtype, file and (for coded columns) value dictionary
+* ``<column>.<generation>.bin``: the committed rows as a raw array. It is only
+  ever extended, so a reader mapping a shorter prefix is never disturbed;
+  anything that would change existing rows writes a new generation instead
+* ``tail.<n>.npz``: the uncommitted rows, rewritten on every run
+
+Datetimes are stored as int64 nanoseconds, numbers as they are, and bools,
+strings and mixed values as int32 codes into an append-only dictionary (-1 is
+null). Readers use the sidecar only while its recorded source matches the JSONL
+on disk, and fall back to parsing the JSONL otherwise.
+"""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+META_NAME = "meta.json"
+
+KIND_DATETIME = "datetime"
+KIND_NUMBER = "number"
+KIND_CODES = "codes"
+
+
+def sidecar_dir(path: Path) -> Path:
+    return path.with_name(path.name + ".columns")
+
+
+def _version(path: Path) -> Optional[tuple]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def _read_meta(directory: Path) -> Optional[dict]:
+    try:
+        meta = json.loads((directory / META_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return meta if isinstance(meta, dict) and meta.get("version") == FORMAT_VERSION else None
+
+
+def _write_meta(directory: Path, meta: dict) -> None:
+    tmp = directory / (META_NAME + ".tmp")
+    tmp.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(directory / META_NAME)
+
+
+def _kind(series: pd.Series) -> str:
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype) or dtype == object or pd.api.types.is_bool_dtype(dtype):
+        return KIND_CODES
+    if isinstance(dtype, np.dtype) and dtype.kind == "M":
+        return KIND_DATETIME
+    if pd.api.types.is_numeric_dtype(dtype):
+        return KIND_NUMBER
+    raise ValueError(f"Unsupported metrics column dtype {dtype} for {series.name!r}")
+
+
+def _dictionary_key(value) -> tuple:
+    # True == 1 and hash alike, so key on the type as well as the value
+    return (type(value).__name__, value)
+
+
+def _encode(series: pd.Series, spec: dict) -> np.ndarray:
+    """Encode one column of a parsed part, extending ``spec["dictionary"]`` as needed."""
+    kind = spec["kind"]
+    if _kind(series) != kind:
+        raise ValueError(f"Column {series.name!r} changed kind from {kind}")
+    if kind == KIND_DATETIME:
+        return series.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    if kind == KIND_NUMBER:
+        return series.to_numpy()
+
+    codes, uniques = pd.factorize(series.to_numpy(dtype=object))
+    dictionary = spec["dictionary"]
+    index = {_dictionary_key(value): pos for pos, value in enumerate(dictionary)}
+    mapping = np.empty(len(uniques) + 1, dtype=np.int32)
+    mapping[-1] = -1
+    for pos, value in enumerate(uniques):
+        value = value.item() if isinstance(value, np.generic) else value
+        key = _dictionary_key(value)
+        if key not in index:
+            index[key] = len(dictionary)
+            dictionary.append(value)
+        mapping[pos] = index[key]
+    return mapping[codes]
+
+
+def _new_spec(series: pd.Series) -> dict:
+    kind = _kind(series)
+    if kind == KIND_DATETIME:
+        return {"kind": kind, "dtype": "int64"}
+    if kind == KIND_NUMBER:
+        return {"kind": kind, "dtype": series.dtype.str}
+    return {"kind": kind, "dtype": "int32", "dictionary": []}
+
+
+def _decode(spec: dict, values: np.ndarray, categorical: bool):
+    kind = spec["kind"]
+    if kind == KIND_DATETIME:
+        return values.view("datetime64[ns]")
+    if kind == KIND_NUMBER:
+        return values
+
+    dictionary = spec["dictionary"]
+    missing = bool((values < 0).any()) if len(values) else False
+    if categorical:
+        # Same shape metrics_snapshot gives parsed names: sorted categories
+        try:
+            order = sorted(range(len(dictionary)), key=dictionary.__getitem__)
+        except TypeError:
+            order = None
+        if order is not None:
+            rank = np.empty(len(dictionary) + 1, dtype=np.int32)
+            rank[order] = np.arange(len(dictionary), dtype=np.int32)
+            rank[-1] = -1
+            labels = pd.Categorical.from_codes(rank[values], categories=[dictionary[pos] for pos in order])
+            return labels.remove_unused_categories()
+    if not missing and all(isinstance(value, bool) for value in dictionary):
+        return np.array(dictionary, dtype=bool)[values]
+    lookup = np.empty(len(dictionary) + 1, dtype=object)
+    lookup[:-1] = dictionary
+    lookup[-1] = None
+    return lookup[values]
+
+
+def read_columns(path: Path, version: tuple, categorical: Iterable[str] = ()) -> Optional[pd.DataFrame]:
+    """
+    The parsed metrics frame from the sidecar, or None when there is no sidecar
+    for this exact ``version`` of ``path``. Committed rows are memory-mapped.
+    """
+    directory = sidecar_dir(path)
+    meta = _read_meta(directory)
+    if meta is None or tuple(meta.get("source") or ()) != tuple(version):
+        return None
+    categorical = set(categorical)
+    rows = meta["rows"]
+    try:
+        tail = None
+        if meta["tail_rows"]:
+            with np.load(directory / meta["tail"]) as archive:
+                tail = {name: archive[name] for name in archive.files}
+        columns = {}
+        for name, spec in meta["columns"].items():
+            dtype = np.dtype(spec["dtype"])
+            if rows:
+                # A plain ndarray view of the mapping, so pandas doesn't carry the memmap subclass
+                values = np.asarray(np.memmap(directory / spec["file"], dtype=dtype, mode="r", shape=(rows,)))
+            else:
+                values = np.empty(0, dtype=dtype)
+            if tail is not None:
+                values = np.concatenate([values, tail[name]])
+            columns[name] = _decode(spec, values, name in categorical)
+    except (OSError, ValueError, KeyError):
+        return None
+    return pd.DataFrame(columns, copy=False)
+
+
+def can_extend(path: Path, previous: Optional[tuple], start: int) -> bool:
+    """Whether the sidecar described ``path`` as of ``previous`` and committed exactly ``start`` bytes."""
+    meta = _read_meta(sidecar_dir(path))
+    return (
+        meta is not None
+        and previous is not None
+        and tuple(meta.get("source") or ()) == tuple(previous)
+        and meta.get("committed_offset") == start
+    )
+
+
+def _check_columns(parts: Iterable[pd.DataFrame], names: Iterable[str]) -> None:
+    expected = set(names)
+    for part in parts:
+        if len(part) and set(part.columns) != expected:
+            raise ValueError(f"Metrics columns changed: {sorted(part.columns)} vs {sorted(expected)}")
+
+
+def _write_array(file: Path, values: np.ndarray, offset_rows: int = 0) -> None:
+    """Write ``values`` at row ``offset_rows``; rows before it are left untouched."""
+    with file.open("r+b" if file.exists() else "wb") as fh:
+        fh.seek(offset_rows * values.dtype.itemsize)
+        fh.write(np.ascontiguousarray(values).tobytes())
+        fh.truncate()
+
+
+def write_columns(
+    path: Path,
+    committed: pd.DataFrame,
+    tail: pd.DataFrame,
+    committed_end: int,
+    append: bool,
+) -> None:
+    """
+    Record the current ``path``: ``committed`` holds rows that will not change
+    again, ending at byte ``committed_end``, and ``tail`` the rows after them.
+    With ``append`` the committed rows extend the existing sidecar (see
+    ``can_extend``); otherwise the sidecar is rebuilt from these two parts.
+    """
+    directory = sidecar_dir(path)
+    directory.mkdir(parents=True, exist_ok=True)
+    previous = _read_meta(directory) or {}
+
+    if append:
+        meta = json.loads(json.dumps(previous))
+    else:
+        meta = {
+            "version": FORMAT_VERSION,
+            "generation": previous.get("generation", 0) + 1,
+            "tail_generation": previous.get("tail_generation", 0),
+            "rows": 0,
+            "columns": {},
+        }
+        template = committed if len(committed) else tail
+        for name in template.columns:
+            meta["columns"][name] = _new_spec(template[name])
+            meta["columns"][name]["file"] = f"{name}.{meta['generation']}.bin"
+    _check_columns((committed, tail), meta["columns"])
+
+    rows = meta["rows"]
+    for name, spec in meta["columns"].items():
+        file = directory / spec["file"]
+        if append and rows and not file.exists():
+            raise ValueError(f"Missing column file {file}")
+        if not len(committed):
+            if not append:
+                _write_array(file, np.empty(0, dtype=spec["dtype"]))
+            continue
+        values = _encode(committed[name], spec)
+        dtype = np.result_type(np.dtype(spec["dtype"]), values.dtype)
+        if dtype != np.dtype(spec["dtype"]) and rows:
+            # e.g. integer idle seconds followed by a fractional one: widen into a new file
+            existing = np.memmap(file, dtype=np.dtype(spec["dtype"]), mode="r", shape=(rows,))
+            meta["generation"] += 1
+            spec["file"] = f"{name}.{meta['generation']}.bin"
+            file = directory / spec["file"]
+            _write_array(file, existing.astype(dtype))
+        spec["dtype"] = dtype.str
+        _write_array(file, values.astype(dtype, copy=False), rows)
+    meta["rows"] = rows + len(committed)
+
+    meta["tail_generation"] += 1
+    meta["tail_rows"] = len(tail)
+    meta["tail"] = None
+    if len(tail):
+        meta["tail"] = f"tail.{meta['tail_generation']}.npz"
+        arrays = {name: _encode(tail[name], spec) for name, spec in meta["columns"].items()}
+        with (directory / meta["tail"]).open("wb") as fh:
+            np.savez(fh, **arrays)
+
+    meta["committed_offset"] = committed_end
+    meta["source"] = list(_version(path) or ())
+    _write_meta(directory, meta)
+    _remove_unreferenced(directory, meta, previous)
+
+
+def _remove_unreferenced(directory: Path, meta: dict, previous: dict) -> None:
+    # Files the previous meta pointed at stay one more round for readers mid-load
+    keep = {META_NAME}
+    for current in (meta, previous):
+        keep.update(spec.get("file") for spec in (current.get("columns") or {}).values())
+        keep.add(current.get("tail"))
+    for entry in directory.iterdir():
+        if entry.name not in keep and not entry.name.endswith(".tmp"):
+            try:
+                entry.unlink()
+            except OSError:  # still mapped on platforms that forbid unlinking it
+                pass
+
+
+def discard_columns(path: Path) -> None:
+    """Stop readers using the sidecar; they fall back to the JSONL."""
+    try:
+        os.remove(sidecar_dir(path) / META_NAME)
+    except OSError:
+        pass
@@ -0,0 +1,188 @@
+"""
+Process-wide parsed snapshot of metrics.jsonl.
+
+The combiner, the derived-analytics tasks and the dashboard all need the same
+parsed file. A snapshot is built once per file version, keyed on
+(inode, size, mtime_ns), and shared by every consumer in the process. Treat
+``frame`` and anything returned by ``derive`` as read-only: copy before
+mutating. Only the columns consumers use are kept, and app and window names
+are categoricals.
+
+When the combiner's columnar sidecar (see metrics_columns) matches the file,
+the snapshot maps it instead of parsing the JSON.
+"""
+from __future__ import annotations
+
+import io
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import pandas as pd
+
+from . import metrics_columns
+
+LOG = logging.getLogger(__name__)
+
+# metrics.jsonl is rewritten in place from its committed offset, so a read can
+# race a write; re-read until the file is stable across the read.
+_READ_ATTEMPTS = 3
+
+# Columns any consumer reads; the combiner's source_* copies are dropped on parse
+METRICS_COLUMNS = ("timestamp", "app_name", "window_title", "idle_seconds", "productive")
+CATEGORY_COLUMNS = ("app_name", "window_title")
+PARSE_CHUNK_ROWS = 100_000
+
+
+@dataclass(frozen=True)
+class MetricsSnapshot:
+    path: Path
+    version: tuple  # (inode, size, mtime_ns)
+    frame: pd.DataFrame
+    _derived: dict = field(default_factory=dict, repr=False, compare=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def derive(self, name: str, builder: Callable[[pd.DataFrame], Any]) -> Any:
+        """Compute ``builder(frame)`` once for this version and memoise it under ``name``."""
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = builder(self.frame)
+            return self._derived[name]
+
+
+def _version(path: Path) -> Optional[tuple]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def _lean(frame: pd.DataFrame) -> pd.DataFrame:
+    return frame.drop(columns=[column for column in frame.columns if column not in METRICS_COLUMNS])
+
+
+def _categorise(frame: pd.DataFrame) -> pd.DataFrame:
+    """Store repeated names as categoricals, with categories in sorted order."""
+    for column in CATEGORY_COLUMNS:
+        if column in frame.columns and frame[column].dtype == object:
+            try:
+                categories = sorted(frame[column].dropna().unique())
+            except TypeError:  # mixed value types; leave as objects
+                continue
+            frame[column] = pd.Categorical(frame[column], categories=categories)
+    return frame
+
+
+def _parse(data: bytes) -> pd.DataFrame:
+    try:
+        # Chunked, so only the kept columns of the whole file are ever resident
+        reader = pd.read_json(io.BytesIO(data), lines=True, chunksize=PARSE_CHUNK_ROWS)
+        chunks = [_lean(chunk) for chunk in reader]
+        frame = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+    except ValueError:
+        # Blank or torn lines: keep only the ones that parse on their own
+        lines = [line for line in data.decode("utf-8", errors="replace").splitlines() if line.strip()]
+        good = []
+        for line in lines:
+            try:
+                json.loads(line)
+            except ValueError:
+                continue
+            good.append(line)
+        if not good:
+            return pd.DataFrame()
+        frame = _lean(pd.read_json(io.StringIO("\n".join(good)), lines=True))
+    return _categorise(frame)
+
+
+def _read_stable(path: Path) -> tuple[Optional[tuple], bytes]:
+    version = _version(path)
+    data = b""
+    for _ in range(_READ_ATTEMPTS):
+        if version is None:
+            return None, b""
+        data = path.read_bytes()
+        after = _version(path)
+        if after == version:
+            break
+        version = after
+    return version, data
+
+
+_LOCK = threading.Lock()
+_SNAPSHOTS: dict[Path, MetricsSnapshot] = {}
+
+
+def get_metrics_snapshot(path: str | Path) -> Optional[MetricsSnapshot]:
+    """
+    Return the snapshot for the current version of ``path``, parsing the file
+    only if it changed since the last call. None when the file is missing.
+    """
+    file_path = Path(path)
+    version = _version(file_path)
+    if version is None:
+        return None
+    with _LOCK:
+        current = _SNAPSHOTS.get(file_path)
+        if current is not None and current.version == version:
+            return current
+
+        frame = metrics_columns.read_columns(file_path, version, CATEGORY_COLUMNS)
+        if frame is not None:
+            snapshot = MetricsSnapshot(file_path, version, frame)
+            _SNAPSHOTS[file_path] = snapshot
+            LOG.debug("Mapped %s rows of %s from its sidecar", len(frame), file_path)
+            return snapshot
+
+        version, data = _read_stable(file_path)
+        if version is None:
+            return None
+        snapshot = MetricsSnapshot(file_path, version, _parse(data))
+        _SNAPSHOTS[file_path] = snapshot
+        LOG.debug("Parsed %s rows from %s (version %s)", len(snapshot.frame), file_path, version)
+        return snapshot
+
+
+def update_columns(path: str | Path, previous: Optional[tuple], start: int, committed: bytes, tail: bytes) -> None:
+    """
+    Bring the columnar sidecar of ``path`` up to date after the combiner
+    rewrote it from byte ``start``: ``committed`` is the final text written
+    there and ``tail`` the provisional text after it. ``previous`` is the
+    file's (inode, size, mtime_ns) before the rewrite. Never raises; on failure
+    the sidecar is dropped and readers parse the JSONL.
+    """
+    file_path = Path(path)
+    committed_end = start + len(committed)
+    try:
+        if metrics_columns.can_extend(file_path, previous, start):
+            try:
+                metrics_columns.write_columns(file_path, _parse(committed), _parse(tail), committed_end, append=True)
+                return
+            except ValueError as exc:
+                LOG.info("Rebuilding metrics sidecar: %s", exc)
+        if start:
+            data = file_path.read_bytes()
+            committed, tail = data[:committed_end], data[committed_end:]
+        metrics_columns.write_columns(file_path, _parse(committed), _parse(tail), committed_end, append=False)
+    except (OSError, ValueError) as exc:
+        LOG.warning("Could not write the metrics sidecar for %s: %s", file_path, exc)
+        metrics_columns.discard_columns(file_path)
+
+
+def metrics_frame(source: str | Path | pd.DataFrame) -> pd.DataFrame:
+    """
+    Resolve a path-or-DataFrame argument to a parsed metrics frame.
+    Raises FileNotFoundError for a missing file and ValueError for one with no rows.
+    """
+    if isinstance(source, pd.DataFrame):
+        return source
+    snapshot = get_metrics_snapshot(source)
+    if snapshot is None:
+        raise FileNotFoundError(f"File not found: {source}")
+    if snapshot.frame.empty:
+        raise ValueError(f"No valid JSON lines found in {source}")
+    return snapshot.frame
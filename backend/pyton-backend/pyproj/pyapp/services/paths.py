@@ -30,6 +30,8 @@ CONTEXT_SWITCHES_FILE: Path = DATA_DIR / "context_switches.json"
 HOURLY_FILE: Path = DATA_DIR / "hourly_productivity.json"
 SUMMARY_FILE: Path = DATA_DIR / "productivity_summary.json"
 MONITOR_FILE: Path = DATA_DIR / "monitor_status.json"
+RULES_FILE: Path = DATA_DIR / "productivity_rules.json"
+ROLLUP_FILE: Path = DATA_DIR / "activity.rollup.npz"
 
 
 # Ensure folders exist
@@ -0,0 +1,180 @@
+"""
+Productivity rules engine for activity.jsonl records.
+
+Rules are compiled once into one alternation regex per run of rules that share
+a target field and category, evaluated in order (first match wins). Verdicts
+are memoised per (app_name, window_title) in a bounded LRU since titles repeat
+heavily. Rules load from a JSON file and are reloaded when its mtime changes;
+classify_productivity() checks the file at most once per RULES_RECHECK_SECONDS.
+
+Rule file format (same shape as the frontend's LabelRule)::
+
+    {"rules": [
+        {"id": "rule-spotify", "label": "Spotify", "resource": "spotify",
+         "resourceType": "application", "productivity": "unproductive"}
+    ]}
+
+``resourceType`` "application" matches the app name; "domain" (or "window")
+matches the window title, which is where browsers show the site.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+
+from .paths import RULES_FILE
+
+LOG = logging.getLogger(__name__)
+
+CATEGORIES = ("productive", "unproductive", "neutral")
+DEFAULT_CATEGORY = "neutral"
+CACHE_SIZE = 4096
+# How stale classify_productivity() may let the rules get between stat() calls
+RULES_RECHECK_SECONDS = 1.0
+
+
+def _rule(label: str, resource_type: str, productivity: str) -> dict:
+    resource = label.lower()
+    prefix = "rule" if resource_type == "application" else "rule-title"
+    return {
+        "id": f"{prefix}-{resource.replace(' ', '-')}",
+        "label": label,
+        "resource": resource,
+        "resourceType": resource_type,
+        "productivity": productivity,
+    }
+
+
+# Built-in heuristic, in priority order; used when no rules file exists.
+DEFAULT_RULES: tuple[dict, ...] = (
+    *(_rule(app, "application", "productive") for app in ("Cursor", "VS Code", "Terminal", "Figma", "GitHub")),
+    *(_rule(word, "domain", "productive") for word in ("stormhacks", "code", "development", "programming")),
+    *(_rule(app, "application", "unproductive") for app in ("Spotify",)),
+    *(
+        _rule(word, "domain", "unproductive")
+        for word in ("youtube", "twitter", "facebook", "reddit", "qualifying highlights")
+    ),
+)
+
+
+@dataclass(frozen=True)
+class _CompiledGroup:
+    field: str  # "app" or "window"
+    category: str
+    pattern: re.Pattern
+
+
+class RuleSet:
+    """An immutable, compiled list of rules with a memoised classifier."""
+
+    def __init__(self, rules: list[dict], version: tuple = ()) -> None:
+        self.rules = [dict(rule) for rule in rules]
+        self.version = version
+        self._groups = self._compile(self.rules)
+        self.classify = lru_cache(maxsize=CACHE_SIZE)(self._classify)
+
+    @staticmethod
+    def _compile(rules: list[dict]) -> list[_CompiledGroup]:
+        groups: list[_CompiledGroup] = []
+        run: list[str] = []
+        run_key: Optional[tuple[str, str]] = None
+
+        def flush() -> None:
+            if run and run_key:
+                alternation = "|".join(re.escape(resource) for resource in run)
+                groups.append(_CompiledGroup(run_key[0], run_key[1], re.compile(alternation)))
+
+        # Adjacent rules with the same field and category share one regex, which
+        # keeps first-match priority identical to evaluating them one by one.
+        for rule in rules:
+            field = "app" if rule.get("resourceType") == "application" else "window"
+            key = (field, rule["productivity"])
+            if key != run_key:
+                flush()
+                run, run_key = [], key
+            run.append(str(rule["resource"]).lower())
+        flush()
+        return groups
+
+    def _classify(self, app_name: str, window_title: str) -> str:
+        app_lower = app_name.lower()
+        window_lower = window_title.lower()
+        for group in self._groups:
+            target = app_lower if group.field == "app" else window_lower
+            if group.pattern.search(target):
+                return group.category
+        return DEFAULT_CATEGORY
+
+
+def _validate(rules: list) -> list[dict]:
+    valid = []
+    for rule in rules:
+        if not isinstance(rule, dict) or not str(rule.get("resource", "")).strip():
+            continue
+        if rule.get("productivity") not in CATEGORIES:
+            continue
+        valid.append(rule)
+    return valid
+
+
+def rules_path() -> Path:
+    """The rules file in effect: settings.TRACKLET_RULES_FILE, else RULES_FILE."""
+    return Path(getattr(settings, "TRACKLET_RULES_FILE", RULES_FILE))
+
+
+_LOCK = threading.Lock()
+_CURRENT: Optional[RuleSet] = None
+_CHECKED_AT = float("-inf")
+
+
+def get_ruleset(max_age: float = 0.0) -> RuleSet:
+    """
+    Return the active rule set, reloading it if the rules file changed.
+    A missing or unreadable file falls back to DEFAULT_RULES. Each call
+    stat()s the file unless it was checked less than ``max_age`` seconds ago.
+    """
+    global _CURRENT, _CHECKED_AT
+    now = time.monotonic()
+    current = _CURRENT
+    if current is not None and now - _CHECKED_AT < max_age:
+        return current
+    path = rules_path()
+    try:
+        stat = path.stat()
+        version = (str(path), stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        version = ("default",)
+
+    with _LOCK:
+        _CHECKED_AT = now
+        if _CURRENT is not None and _CURRENT.version == version:
+            return _CURRENT
+
+        rules = list(DEFAULT_RULES)
+        if version != ("default",):
+            try:
+                payload = json.loads(path.read_text(encoding="utf-8"))
+                loaded = payload.get("rules") if isinstance(payload, dict) else payload
+                rules = _validate(loaded if isinstance(loaded, list) else [])
+            except (OSError, ValueError, TypeError):
+                LOG.warning("Could not read productivity rules from %s; using defaults", path)
+        _CURRENT = RuleSet(rules, version)
+        LOG.info("Loaded %s productivity rule(s) (%s)", len(rules), version[0])
+        return _CURRENT
+
+
+def classify_productivity(app_name: str, window_title: str) -> str:
+    """
+    Classify one activity as productive/unproductive/neutral. Meant for one-off
+    calls; batch callers should hold get_ruleset() and use its classify().
+    """
+    return get_ruleset(RULES_RECHECK_SECONDS).classify(app_name, window_title)
@@ -0,0 +1,457 @@
+"""
+Optional SQLite storage of activity rows and screenshot labels.
+
+With TRACKLET_STORAGE_BACKEND = "sqlite" the dashboard reads the
+ActivityRecord and ScreenshotLabel tables (pyapp/models.py) in the default
+database instead of parsing the JSONL files:
+
+* activity sections are summed by a GROUP BY over the epoch index into the
+  shape of the hourly rollup (see activity_rollup); the event feed and top
+  switch pairs are two more indexed queries over the same window
+* metrics sections read the combiner's join done in SQL: each activity row
+  takes the last label at most LABEL_TOLERANCE before it (minute index) and,
+  failing that, the next label with the same app and window (app/window index)
+
+The JSONL files stay the source of truth. append_history inserts each label
+as it writes it; activity lines, which the tracker writes, are imported from
+a per-log cursor (ImportCursor) before every read and by the sql_import
+background task. Rows are keyed on their logical offset in the partitioned
+log (see log_partitions), so importing a line twice, from any process, stores
+it once, and rows retention deleted from the log are deleted here too.
+``manage.py import_jsonl`` imports existing files in one go.
+"""
+from __future__ import annotations
+
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.utils import timezone as dj_timezone
+
+from ..models import ActivityRecord, ImportCursor, ScreenshotLabel
+from ..utils.script_combiner import LABEL_TOLERANCE, _coerce_productive
+from .activity_frame import PRODUCTIVITY_CODES, StringTable
+from .activity_processor import (
+    EVENT_FEED_LIMIT,
+    POLL_INTERVAL_SECONDS,
+    ActivityAggregate,
+    _parse_activity_line,
+    _rollup_aggregate,
+)
+from .activity_rollup import KEY_COLUMNS, RollupTable
+from .log_partitions import LogRead, partitioned_log
+from .metrics_snapshot import _categorise
+from .paths import ACTIVITY_FILE, HISTORY_FILE
+from .productivity_rules import get_ruleset
+from .switch_analytics import TOP_PAIRS_LIMIT
+from .timestamp_decoder import TimestampDecoder
+
+BACKEND_JSONL = "jsonl"
+BACKEND_SQLITE = "sqlite"
+
+SOURCE_ACTIVITY = "activity"
+SOURCE_LABELS = "labels"
+MODELS = {SOURCE_ACTIVITY: ActivityRecord, SOURCE_LABELS: ScreenshotLabel}
+FILES = {SOURCE_ACTIVITY: ACTIVITY_FILE, SOURCE_LABELS: HISTORY_FILE}
+
+# Lines parsed and inserted per transaction while importing
+IMPORT_BATCH_LINES = 50_000
+
+_IMPORT_LOCK = threading.Lock()
+_CACHE_LOCK = threading.Lock()
+_CACHE: dict[str, tuple[Any, Any]] = {}  # name -> (key, value) of the last read
+
+
+def storage_backend() -> str:
+    backend = getattr(settings, "TRACKLET_STORAGE_BACKEND", BACKEND_JSONL)
+    if backend not in (BACKEND_JSONL, BACKEND_SQLITE):
+        raise ImproperlyConfigured(
+            f"TRACKLET_STORAGE_BACKEND must be {BACKEND_JSONL!r} or {BACKEND_SQLITE!r}, not {backend!r}"
+        )
+    return backend
+
+
+def sqlite_enabled() -> bool:
+    return storage_backend() == BACKEND_SQLITE
+
+
+# -- importing ---------------------------------------------------------------
+
+
+def _complete_lines(read: LogRead) -> tuple[list[tuple[int, bytes]], int]:
+    """
+    The complete lines of ``read`` with their logical offsets, and the offset
+    just past them. A final line without a newline counts only once it parses.
+    """
+    data = read.data
+    end = data.rfind(b"\n") + 1
+    tail = data[end:]
+    if tail.strip() and _parse_activity_line(tail.decode("utf-8", errors="replace")):
+        end = len(data)
+    lines = []
+    position = read.start
+    for line in data[:end].split(b"\n"):
+        if line.strip():
+            lines.append((position, line))
+        position += len(line) + 1
+    return lines, read.start + end
+
+
+def _local_minute(epoch: int, utc_offset: int) -> int:
+    local = epoch + utc_offset
+    return local - local % 60
+
+
+# Columns written per source, after the shared (log_offset, epoch, utc_offset, minute, timestamp)
+_COMMON_COLUMNS = ("log_offset", "epoch", "utc_offset", "minute", "timestamp")
+_COLUMNS = {
+    SOURCE_ACTIVITY: _COMMON_COLUMNS + ("app_name", "window_title", "idle_seconds"),
+    SOURCE_LABELS: _COMMON_COLUMNS + ("app_name", "window_title", "productive"),
+}
+
+
+def _build_rows(source: str, lines: list[tuple[int, bytes]], decoder: TimestampDecoder) -> list[tuple]:
+    """Parse ``lines`` into row tuples in _COLUMNS[source] order, skipping lines the ingest would skip."""
+    records = []
+    for position, line in lines:
+        try:
+            data = json.loads(line.decode("utf-8", errors="replace"))
+        except ValueError:
+            continue
+        if isinstance(data, dict) and "timestamp" in data and (source != SOURCE_ACTIVITY or "app_name" in data):
+            records.append((position, data))
+    epoch, offsets, _, ok = decoder.decode_many([data["timestamp"] for _, data in records])
+
+    rows = []
+    for (position, data), ts, utc_offset, valid in zip(records, epoch.tolist(), offsets.tolist(), ok.tolist()):
+        if not valid:
+            continue
+        common = (position, ts, utc_offset, _local_minute(ts, utc_offset), data["timestamp"])
+        if source == SOURCE_ACTIVITY:
+            rows.append(common + (
+                data.get("app_name", "Unknown"),
+                data.get("window_title", ""),
+                float(data.get("idle_seconds", 0)),
+            ))
+        else:
+            # The combiner's coercion, so both backends label rows alike
+            rows.append(common + (
+                data.get("app_name"),
+                data.get("window_title"),
+                _coerce_productive(data.get("productive")),
+            ))
+    return rows
+
+
+def _insert(source: str, rows: list[tuple]) -> None:
+    """INSERT OR IGNORE: a line another process (or append_history) already stored keeps its row."""
+    if not rows:
+        return
+    columns = _COLUMNS[source]
+    sql = (
+        f"INSERT OR IGNORE INTO {MODELS[source]._meta.db_table} ({', '.join(columns)})"
+        f" VALUES ({', '.join(['%s'] * len(columns))})"
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def import_log(source: str, path: Optional[Path] = None) -> int:
+    """
+    Import the lines of ``source``'s log (``path`` overrides its usual file)
+    appended since its cursor, and delete rows retention has removed from the
+    log. Returns the number of lines read.
+    """
+    model = MODELS[source]
+    log = partitioned_log(path or FILES[source])
+    decoder = TimestampDecoder(dj_timezone.get_current_timezone())
+    imported = 0
+    with _IMPORT_LOCK:
+        cursor, _ = ImportCursor.objects.get_or_create(source=source)
+        end = log.end()
+        if end < cursor.log_offset:
+            # The log was replaced; start over
+            model.objects.all().delete()
+            ImportCursor.objects.filter(source=source).update(log_offset=0)
+            cursor.log_offset = 0
+        model.objects.filter(log_offset__lt=log.start()).delete()
+
+        if end == cursor.log_offset:
+            return 0
+        lines, stop = _complete_lines(log.read_from(cursor.log_offset))
+        for first in range(0, max(len(lines), 1), IMPORT_BATCH_LINES):
+            batch = lines[first:first + IMPORT_BATCH_LINES]
+            # Each batch commits with the cursor moved to the line after it
+            after = lines[first + len(batch)][0] if first + len(batch) < len(lines) else stop
+            if after <= cursor.log_offset:
+                break
+            with transaction.atomic():
+                _insert(source, _build_rows(source, batch, decoder))
+                ImportCursor.objects.filter(source=source, log_offset__lt=after).update(log_offset=after)
+            cursor.log_offset = after
+            imported += len(batch)
+    return imported
+
+
+def reset() -> None:
+    """Empty the tables and cursors; the next import reads every retained line."""
+    with _IMPORT_LOCK, transaction.atomic():
+        for model in MODELS.values():
+            model.objects.all().delete()
+        ImportCursor.objects.all().delete()
+
+
+def sync() -> tuple:
+    """Bring both tables up to their logs; returns a token that changes whenever their contents may have."""
+    for source in MODELS:
+        if FILES[source].exists():
+            import_log(source)
+    cursors = dict(ImportCursor.objects.values_list("source", "log_offset"))
+    return tuple((source, cursors.get(source), partitioned_log(FILES[source]).start()) for source in MODELS)
+
+
+def record_label(entry: dict, log_offset: int) -> None:
+    """Insert a label append_history just wrote at ``log_offset`` of q_analysis.jsonl."""
+    line = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+    decoder = TimestampDecoder(dj_timezone.get_current_timezone())
+    _insert(SOURCE_LABELS, _build_rows(SOURCE_LABELS, [(log_offset, line)], decoder))
+
+
+def _memoised(name: str, key: tuple, build: Callable[[], Any]) -> Any:
+    with _CACHE_LOCK:
+        cached = _CACHE.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+    value = build()
+    with _CACHE_LOCK:
+        _CACHE[name] = (key, value)
+    return value
+
+
+# -- queries -----------------------------------------------------------------
+
+
+def _window(column: str, start: Optional[int], stop: Optional[int]) -> tuple[str, list]:
+    clauses, params = [], []
+    if start is not None:
+        clauses.append(f"{column} >= %s")
+        params.append(start)
+    if stop is not None:
+        clauses.append(f"{column} < %s")
+        params.append(stop)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def _fetch(sql: str, params: list) -> list[tuple]:
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _hourly_rows(start: Optional[int], stop: Optional[int]) -> list[tuple]:
+    """
+    (hour, app, window, active, idle, samples, switches, first row, its UTC
+    offset, whether it was a switch) per local hour, app and window title, in
+    order of each group's first row.
+    """
+    where, params = _window("epoch", start, stop)
+    table = ActivityRecord._meta.db_table
+    # SQLite takes bare columns (utc_offset, switched) from the row holding MIN(seq)
+    sql = f"""
+        WITH rows AS (
+            SELECT epoch, utc_offset, app_name, window_title, idle_seconds,
+                   ROW_NUMBER() OVER w AS seq,
+                   COALESCE(app_name != LAG(app_name) OVER w, 0) AS switched
+            FROM {table}{where}
+            WINDOW w AS (ORDER BY epoch, log_offset)
+        )
+        SELECT (epoch + utc_offset) / 3600 * 3600 AS hour, app_name, window_title,
+               SUM(MAX(0.0, %s - MIN(idle_seconds, %s))), SUM(idle_seconds), COUNT(*), SUM(switched),
+               MIN(seq) AS first, utc_offset, switched
+        FROM rows
+        GROUP BY hour, app_name, window_title
+        ORDER BY hour, first
+    """
+    return _fetch(sql, params + [POLL_INTERVAL_SECONDS, POLL_INTERVAL_SECONDS])
+
+
+def _rollup_table(rows: list[tuple], apps: StringTable) -> RollupTable:
+    """Fold the per-window groups into rollup keys (hour, app, productivity), classifying each pair once."""
+    classify = get_ruleset().classify
+    codes: dict[tuple[str, str], int] = {}
+    keys: dict[tuple[int, int, int], list] = {}
+    hours: dict[int, tuple[int, bool]] = {}
+    for hour, app, window, active, idle, samples, switches, _, utc_offset, switched in rows:
+        code = codes.get((app, window))
+        if code is None:
+            code = codes[(app, window)] = PRODUCTIVITY_CODES[classify(app, window)]
+        key = (hour, apps.intern(app), code)
+        sums = keys.get(key)
+        if sums is None:
+            keys[key] = [active, idle, samples, switches]
+        else:
+            for pos, value in enumerate((active, idle, samples, switches)):
+                sums[pos] += value
+        if hour not in hours:
+            # Groups come in first-row order, so the hour's first group holds its first row
+            hours[hour] = (utc_offset, bool(switched))
+
+    columns = list(zip(*((*key, *sums) for key, sums in keys.items()))) or [()] * len(KEY_COLUMNS)
+    hour_list = sorted(hours)
+    return RollupTable(
+        keys={name: np.asarray(values, dtype=dtype) for (name, dtype), values in zip(KEY_COLUMNS.items(), columns)},
+        hours=np.asarray(hour_list, dtype=np.int64),
+        hour_offsets=np.asarray([hours[hour][0] for hour in hour_list], dtype=np.int32),
+        first_switch=np.asarray([hours[hour][1] for hour in hour_list], dtype=bool),
+    )
+
+
+def _recent_events(start: Optional[int], stop: Optional[int], limit: int = EVENT_FEED_LIMIT) -> list[dict]:
+    """The last ``limit`` rows of the window in the activity feed shape (see activity_events_between)."""
+    where, params = _window("epoch", start, stop)
+    rows = _fetch(
+        f"SELECT timestamp, app_name, window_title, idle_seconds FROM {ActivityRecord._meta.db_table}{where}"
+        " ORDER BY epoch DESC, log_offset DESC LIMIT %s",
+        params + [limit],
+    )
+    classify = get_ruleset().classify
+    events = []
+    for ts, app, window, idle in reversed(rows):
+        productivity = classify(app, window)
+        events.append({
+            "ts": ts,
+            "app": app,
+            "window": window,
+            "domain": None,
+            "idleSec": int(idle),
+            "category": productivity,
+            "productivity": productivity,
+        })
+    return events
+
+
+def _top_pairs(
+    start: Optional[int], stop: Optional[int], apps: StringTable, limit: int = TOP_PAIRS_LIMIT
+) -> list[tuple[int, int, int]]:
+    """switch_analytics.top_pairs of the window: most frequent switches, ties in order of first occurrence."""
+    where, params = _window("epoch", start, stop)
+    sql = f"""
+        WITH rows AS (
+            SELECT app_name, LAG(app_name) OVER w AS previous, ROW_NUMBER() OVER w AS seq
+            FROM {ActivityRecord._meta.db_table}{where}
+            WINDOW w AS (ORDER BY epoch, log_offset)
+        )
+        SELECT previous, app_name, COUNT(*) AS switches, MIN(seq) AS first
+        FROM rows
+        WHERE previous != app_name
+        GROUP BY previous, app_name
+        ORDER BY switches DESC, first
+        LIMIT %s
+    """
+    return [(apps.intern(source), apps.intern(target), count) for source, target, count, _ in _fetch(sql, params + [limit])]
+
+
+def _query_aggregate(start: Optional[int], stop: Optional[int], granularity: str = "hour") -> ActivityAggregate:
+    apps = StringTable()
+    table = _rollup_table(_hourly_rows(start, stop), apps)
+    events = _recent_events(start, stop)
+    pairs = _top_pairs(start, stop, apps)
+    # The table holds exactly the window's rows, so no hours are cut at its edges
+    return _rollup_aggregate(table, apps.values, events, pairs, None, None, granularity)
+
+
+def activity_aggregate(
+    start: Optional[int] = None,
+    stop: Optional[int] = None,
+    granularity: str = "hour",
+) -> ActivityAggregate:
+    """activity_processor.activity_aggregate, from the tables; any window is exact, not only whole hours."""
+    version = sync()
+    ruleset = get_ruleset()
+    return _memoised(
+        "aggregate",
+        (version, ruleset.version, str(dj_timezone.get_current_timezone()), start, stop, granularity),
+        lambda: _query_aggregate(start, stop, granularity),
+    )
+
+
+def _local_bound(epoch: Optional[int]) -> Optional[int]:
+    """``epoch`` as local wall-clock seconds, the units of the minute columns."""
+    if epoch is None:
+        return None
+    local = datetime.fromtimestamp(epoch, dj_timezone.get_current_timezone())
+    return epoch + int(local.utcoffset().total_seconds())
+
+
+def _query_labelled(start: Optional[int], stop: Optional[int]) -> pd.DataFrame:
+    """
+    The combiner's labelled rows (script_combiner._label_frames) in the shape
+    metrics_snapshot gives metrics.jsonl, for activity in the local-minute window.
+    Rows come by minute and then log offset, the order the combiner writes
+    metrics.jsonl in, so preparing them matches preparing that file. Timestamps are the same local minutes, but as UTC instants, which spares
+    _prepare_metrics_dataframe a DST-aware tz_localize. Like the combiner, a
+    null verdict reached through the forward match counts as productive (it
+    coerces bool(nan)).
+    """
+    where, params = _window("a.minute", _local_bound(start), _local_bound(stop))
+    activity = ActivityRecord._meta.db_table
+    labels = ScreenshotLabel._meta.db_table
+    tolerance = int(LABEL_TOLERANCE.total_seconds())
+    sql = f"""
+        SELECT a.minute - a.utc_offset, a.app_name, a.window_title, a.idle_seconds, b.productive,
+               CASE WHEN b.productive IS NULL THEN (
+                   SELECT COALESCE(f.productive, 1) FROM {labels} f
+                   WHERE f.app_name = a.app_name AND f.window_title = a.window_title AND f.minute > a.minute
+                   ORDER BY f.minute, f.log_offset
+                   LIMIT 1
+               ) END
+        FROM {activity} a
+        LEFT JOIN {labels} b ON b.id = (
+            SELECT l.id FROM {labels} l
+            WHERE l.minute <= a.minute AND l.minute >= a.minute - %s
+            ORDER BY l.minute DESC, l.log_offset DESC
+            LIMIT 1
+        ){where}
+        ORDER BY a.minute, a.log_offset
+    """
+    rows = _fetch(sql, [tolerance] + params)
+    minute, app_name, window_title, idle_seconds, matched, future = (
+        list(column) for column in (zip(*rows) if rows else [()] * 6)
+    )
+    productive = [
+        bool(value) if value is not None else ("unknown" if later is None else bool(later))
+        for value, later in zip(matched, future)
+    ]
+    frame = pd.DataFrame({
+        "timestamp": pd.to_datetime(np.asarray(minute, dtype=np.int64), unit="s", utc=True),
+        "app_name": pd.Series(app_name, dtype=object),
+        "window_title": pd.Series(window_title, dtype=object),
+        "idle_seconds": np.asarray(idle_seconds, dtype=np.float64),
+        "productive": pd.Series(productive, dtype=object),
+    })
+    return _categorise(frame)
+
+
+def labelled_activity(start: Optional[int] = None, stop: Optional[int] = None) -> pd.DataFrame:
+    """
+    Metrics rows (timestamp, app_name, window_title, idle_seconds, productive)
+    for activity with ``start <= epoch < stop``, as the combiner would write
+    them to metrics.jsonl and in its order. The dashboard reads all rows and
+    windows them once prepared (see dashboard_data._load_sql_metrics). The
+    same frame object is returned until the tables change, so callers may
+    memoise on it; treat it as read-only.
+    """
+    version = sync()
+    return _memoised(
+        "labelled",
+        (version, str(dj_timezone.get_current_timezone()), start, stop),
+        lambda: _query_labelled(start, stop),
+    )
+
@@ -0,0 +1,59 @@
+"""
+App-switch analytics over integer app codes.
+
+Transitions are found once from a boolean change mask over the code array;
+per-hour counts come from np.bincount and the from->to histogram from
+encoding each pair as ``from * K + to`` and counting with np.unique. Callers
+supply codes (ActivityFrame.app_id, or pd.factorize of a name column) and,
+for hourly figures, each row's hour index with rows grouped by hour.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+TOP_PAIRS_LIMIT = 8
+
+
+def change_mask(codes: np.ndarray) -> np.ndarray:
+    """True where a row's app differs from the previous row's; the first row is False."""
+    mask = np.zeros(len(codes), dtype=bool)
+    if len(codes) > 1:
+        mask[1:] = codes[1:] != codes[:-1]
+    return mask
+
+
+def hour_segments(codes: np.ndarray, hour_index: np.ndarray, n_hours: int) -> np.ndarray:
+    """
+    App segments per hour: the hour's first row plus every switch inside it.
+    Rows must be ordered so each hour's rows are contiguous; negative hour
+    indexes (unparseable timestamps) are ignored.
+    """
+    if not len(codes):
+        return np.zeros(n_hours, dtype=np.int64)
+    starts = change_mask(codes)
+    starts[0] = True
+    starts[1:] |= hour_index[1:] != hour_index[:-1]
+    valid = starts & (hour_index >= 0)
+    return np.bincount(hour_index[valid], minlength=n_hours)
+
+
+def top_pairs(codes: np.ndarray, limit: int = TOP_PAIRS_LIMIT) -> list[tuple[int, int, int]]:
+    """
+    Most frequent (from_code, to_code, count) transitions, highest count first;
+    ties keep the order in which the pairs first occurred (like Counter.most_common).
+    """
+    changed = np.flatnonzero(change_mask(codes))
+    if not len(changed):
+        return []
+    from_codes = codes[changed - 1].astype(np.int64)
+    to_codes = codes[changed].astype(np.int64)
+    offset = min(int(from_codes.min()), int(to_codes.min()), 0)
+    width = max(int(from_codes.max()), int(to_codes.max())) - offset + 1
+    encoded = (from_codes - offset) * width + (to_codes - offset)
+
+    pairs, first, counts = np.unique(encoded, return_index=True, return_counts=True)
+    order = np.lexsort((first, -counts))[:limit]
+    return [
+        (int(pairs[idx] // width + offset), int(pairs[idx] % width + offset), int(counts[idx]))
+        for idx in order
+    ]
@@ -0,0 +1,172 @@
+"""
+Timestamp decoding for activity.jsonl.
+
+The tracker writes naive local timestamps in exactly one shape,
+``YYYY-MM-DDTHH:MM:SS``. Those are decoded with slicing and integer arithmetic;
+anything else (``Z``, explicit offsets, fractions) goes through
+datetime.fromisoformat. The UTC offset is cached per local calendar day, and
+days containing a DST transition always take the slow path so they stay exact.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, tzinfo
+from typing import Optional, Sequence
+
+import numpy as np
+
+_FAST_LEN = 19
+_SEPARATORS = {4: "-", 7: "-", 10: "T", 13: ":", 16: ":"}
+_DIGIT_SLOTS = [idx for idx in range(_FAST_LEN) if idx not in _SEPARATORS]
+_DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def _days_from_civil(year, month, day):
+    """Days since 1970-01-01 for a proleptic Gregorian date (works on ints and arrays)."""
+    year = year - (month <= 2)
+    era = year // 400
+    yoe = year - era * 400
+    mp = (month + 9) % 12
+    doy = (153 * mp + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def _is_leap(year):
+    return (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+
+
+class TimestampDecoder:
+    """
+    Decode ISO timestamps to (UTC epoch seconds, UTC offset seconds, canonical),
+    treating naive strings as local time in ``tz``. ``canonical`` is True when
+    the raw string equals the local naive ISO form, so it need not be stored.
+    """
+
+    def __init__(self, tz: tzinfo) -> None:
+        self.tz = tz
+        self._day_offsets: dict[int, Optional[int]] = {}
+
+    def _day_offset(self, days: int) -> Optional[int]:
+        """UTC offset for a whole local day, or None if it changes during that day."""
+        if days in self._day_offsets:
+            return self._day_offsets[days]
+        start = datetime(1970, 1, 1) + timedelta(days=days)
+        first = self.tz.utcoffset(start)
+        last = self.tz.utcoffset(start + timedelta(hours=23, minutes=59, seconds=59))
+        offset = int(first.total_seconds()) if first == last else None
+        self._day_offsets[days] = offset
+        return offset
+
+    def _localize(self, naive: datetime) -> datetime:
+        """
+        ``naive`` as wall time in ``tz``, as timezone.make_aware reads it with
+        zoneinfo (fold 0): a repeated hour is its first occurrence and a skipped
+        one keeps the offset from before the change. pytz zones need localize()
+        for this; replace() would give them the zone's first (LMT) offset.
+        """
+        localize = getattr(self.tz, "localize", None)
+        if localize is None:
+            return naive.replace(tzinfo=self.tz, fold=0)
+        earlier, later = sorted((localize(naive, is_dst=True), localize(naive, is_dst=False)))
+        # Both instants show this wall time in a repeated hour, neither does in a skipped one
+        return earlier if earlier.astimezone(self.tz).replace(tzinfo=None) == naive else later
+
+    def _decode_slow(self, text: str) -> Optional[tuple[int, int, bool]]:
+        try:
+            dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        except (ValueError, TypeError, AttributeError):
+            return None
+        if dt.tzinfo is None:
+            # If the source string has no zone, interpret it as local time
+            dt_local = self._localize(dt)
+        else:
+            dt_local = dt.astimezone(self.tz)
+        offset = int(dt_local.utcoffset().total_seconds())
+        canonical = text == dt_local.replace(tzinfo=None).isoformat()
+        return int(dt_local.timestamp() // 1), offset, canonical
+
+    def decode(self, text: str) -> Optional[tuple[int, int, bool]]:
+        """Decode one timestamp; None when it cannot be parsed."""
+        if not isinstance(text, str) or not text:
+            return None
+        if len(text) == _FAST_LEN and text.isascii() and all(text[pos] == sep for pos, sep in _SEPARATORS.items()):
+            digits = text[0:4] + text[5:7] + text[8:10] + text[11:13] + text[14:16] + text[17:19]
+            if digits.isdigit():
+                year, month, day = int(digits[0:4]), int(digits[4:6]), int(digits[6:8])
+                hour, minute, second = int(digits[8:10]), int(digits[10:12]), int(digits[12:14])
+                if not 1 <= month <= 12:
+                    return None
+                max_day = _DAYS_IN_MONTH[month - 1] + (month == 2 and _is_leap(year))
+                if not (1 <= day <= max_day and hour < 24 and minute < 60 and second < 60):
+                    return None
+                days = _days_from_civil(year, month, day)
+                offset = self._day_offset(days)
+                if offset is not None:
+                    local = days * 86400 + hour * 3600 + minute * 60 + second
+                    return local - offset, offset, True
+        return self._decode_slow(text)
+
+    def decode_many(self, texts: Sequence[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vectorised decode of a chunk.
+        Returns (epoch int64, utc_offset int32, canonical bool, ok bool) arrays.
+        """
+        count = len(texts)
+        epoch = np.zeros(count, dtype=np.int64)
+        offsets = np.zeros(count, dtype=np.int32)
+        canonical = np.zeros(count, dtype=bool)
+        ok = np.zeros(count, dtype=bool)
+        if not count:
+            return epoch, offsets, canonical, ok
+
+        fast_idx = np.fromiter(
+            (isinstance(t, str) and len(t) == _FAST_LEN and t.isascii() for t in texts),
+            dtype=bool,
+            count=count,
+        ).nonzero()[0]
+        fast = np.zeros(count, dtype=bool)
+        if len(fast_idx):
+            buf = "".join(texts[i] for i in fast_idx).encode("ascii")
+            chars = np.frombuffer(buf, dtype=np.uint8).reshape(len(fast_idx), _FAST_LEN)
+            digits = chars[:, _DIGIT_SLOTS].astype(np.int64) - ord("0")
+            shape_ok = np.all((digits >= 0) & (digits <= 9), axis=1)
+            for pos, sep in _SEPARATORS.items():
+                shape_ok &= chars[:, pos] == ord(sep)
+
+            d = digits
+            year = d[:, 0] * 1000 + d[:, 1] * 100 + d[:, 2] * 10 + d[:, 3]
+            month = d[:, 4] * 10 + d[:, 5]
+            day = d[:, 6] * 10 + d[:, 7]
+            hour = d[:, 8] * 10 + d[:, 9]
+            minute = d[:, 10] * 10 + d[:, 11]
+            second = d[:, 12] * 10 + d[:, 13]
+
+            month_ok = (month >= 1) & (month <= 12)
+            max_day = np.asarray(_DAYS_IN_MONTH)[np.clip(month, 1, 12) - 1] + ((month == 2) & _is_leap(year))
+            valid = shape_ok & month_ok & (day >= 1) & (day <= max_day) & (hour < 24) & (minute < 60) & (second < 60)
+
+            days = _days_from_civil(year, month, day)
+            unique_days, day_inverse = np.unique(days[valid], return_inverse=True)
+            day_offsets = [self._day_offset(int(value)) for value in unique_days]
+            has_offset = np.array([value is not None for value in day_offsets], dtype=bool)
+            offset_values = np.array([value or 0 for value in day_offsets], dtype=np.int64)
+
+            rows = fast_idx[valid]
+            steady = has_offset[day_inverse.ravel()]
+            rows = rows[steady]
+            day_offset = offset_values[day_inverse.ravel()][steady]
+            local = (days * 86400 + hour * 3600 + minute * 60 + second)[valid][steady]
+            epoch[rows] = local - day_offset
+            offsets[rows] = day_offset
+            canonical[rows] = True
+            ok[rows] = True
+            fast[rows] = True
+            # Shape matched but the date is impossible: reject like fromisoformat would
+            fast[fast_idx[shape_ok & ~valid]] = True
+
+        for idx in np.flatnonzero(~fast):
+            decoded = self.decode(texts[idx])
+            if decoded:
+                epoch[idx], offsets[idx], canonical[idx] = decoded
+                ok[idx] = True
+        return epoch, offsets, canonical, ok
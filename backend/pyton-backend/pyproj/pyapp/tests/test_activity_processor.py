@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from pyapp.services import activity_processor
+
+
+def lines(*apps: str, start: int = 0) -> bytes:
+    return b"".join(
+        (json.dumps({
+            "timestamp": f"2025-10-06T09:{minute:02d}:00",
+            "app_name": app,
+            "window_title": "w",
+            "idle_seconds": 0,
+        }) + "\n").encode("utf-8")
+        for minute, app in enumerate(apps, start)
+    )
+
+
+class IngestCursorTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.activity = Path(tmp.name) / "activity.jsonl"
+        self.mtime_ns = 10**18
+        for patcher in (
+            mock.patch.object(activity_processor, "ACTIVITY_FILE", self.activity),
+            mock.patch.object(activity_processor, "ROLLUP_FILE", Path(tmp.name) / "rollup.json"),
+            mock.patch.object(activity_processor, "_CURSOR", activity_processor._IngestCursor()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write(self, data: bytes, mode: str = "wb") -> None:
+        with self.activity.open(mode) as fh:
+            fh.write(data)
+        # Coarse filesystem clocks can give two writes the same mtime
+        self.mtime_ns += 10**9
+        os.utime(self.activity, ns=(self.mtime_ns, self.mtime_ns))
+
+    def apps(self) -> list[str]:
+        return [record["app_name"] for record in activity_processor.load_activity_data()]
+
+    def test_records_are_a_list_of_enriched_dicts(self):
+        self.write(lines("Slack", "Code"))
+        records = activity_processor.load_activity_data()
+        self.assertIsInstance(records, list)
+        self.assertEqual(records, list(activity_processor.load_activity_frame()))
+        self.assertEqual(records[0]["timestamp_iso"][:19], "2025-10-06T09:00:00")
+        self.assertEqual(records[1]["app_name"], "Code")
+
+    def test_appended_lines_are_read_once(self):
+        self.write(lines("Slack", "Code"))
+        self.assertEqual(self.apps(), ["Slack", "Code"])
+        self.write(lines("Zoom", start=2), mode="ab")
+        self.assertEqual(self.apps(), ["Slack", "Code", "Zoom"])
+
+    def test_a_rewrite_to_the_same_size_is_rescanned(self):
+        self.write(lines("Slack", "Code"))
+        self.assertEqual(self.apps(), ["Slack", "Code"])
+        inode = self.activity.stat().st_ino
+        # Truncated and refilled in place: same inode, same size, other lines
+        self.write(lines("Zoom!", "Code"))
+        self.assertEqual(self.activity.stat().st_ino, inode)
+        self.assertEqual(self.apps(), ["Zoom!", "Code"])
+
+    def test_a_rewrite_to_a_larger_size_is_rescanned(self):
+        self.write(lines("Slack", "Code"))
+        self.assertEqual(self.apps(), ["Slack", "Code"])
+        self.write(lines("Zoom", "Mail", "Notes"))
+        self.assertEqual(self.apps(), ["Zoom", "Mail", "Notes"])
@@ -0,0 +1,215 @@
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from pyapp.services import analyze_jobs
+from pyapp.services.analyze_jobs import DONE, FAILED, AnalyzeQueue, QueueFull
+
+
+class FakeModel:
+    """Stands in for the Gemini call: each prompt blocks until the test releases it."""
+
+    def __init__(self) -> None:
+        self.gates: dict[str, threading.Event] = {}
+        self.lock = threading.Lock()
+
+    def gate(self, prompt: str) -> threading.Event:
+        with self.lock:
+            return self.gates.setdefault(prompt, threading.Event())
+
+    def __call__(self, image: str, prompt: str) -> dict:
+        self.gate(prompt).wait(10)
+        return {"app_name": "Terminal", "window_title": prompt, "productive": True}
+
+
+class QueueTestCase(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.model = FakeModel()
+        self.appended: list[dict] = []
+        self.addCleanup(lambda: [gate.set() for gate in self.model.gates.values()])
+
+    def queue(self, **kwargs) -> AnalyzeQueue:
+        clock = iter(range(10**6))
+        kwargs.setdefault("workers", 3)
+        return AnalyzeQueue(
+            self.model,
+            self.appended.append,
+            clock=lambda: f"2025-10-05T12:00:{next(clock):02d}",
+            **kwargs,
+        )
+
+    def submit(self, jobs: AnalyzeQueue, prompt: str) -> analyze_jobs.AnalyzeJob:
+        image = self.tmp / f"{prompt}.png"
+        image.write_bytes(b"png")
+        return jobs.submit(image, self.tmp / "latest.png", prompt)
+
+    def wait_for(self, jobs: AnalyzeQueue, job, states=(DONE, FAILED), timeout: float = 5.0) -> dict:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            status = jobs.status(job.id)
+            if status["status"] in states:
+                return status
+            time.sleep(0.01)
+        self.fail(f"job {job.id} still {jobs.status(job.id)['status']}")
+
+
+class AnalyzeQueueTests(QueueTestCase):
+    def test_appends_follow_ticket_order_when_calls_finish_out_of_order(self):
+        jobs = self.queue()
+        submitted = [self.submit(jobs, prompt) for prompt in ("a", "b", "c")]
+        for prompt in ("c", "b"):
+            self.model.gate(prompt).set()
+        self.wait_for(jobs, submitted[2], states=(analyze_jobs.RUNNING,))
+        time.sleep(0.05)
+        # b and c are done but wait behind a
+        self.assertEqual(self.appended, [])
+        self.model.gate("a").set()
+        statuses = [self.wait_for(jobs, job) for job in submitted]
+        self.assertEqual([entry["window_title"] for entry in self.appended], ["a", "b", "c"])
+        self.assertEqual([entry["timestamp"] for entry in self.appended], [job.timestamp for job in submitted])
+        self.assertEqual([status["status"] for status in statuses], [DONE, DONE, DONE])
+
+    def test_timed_out_ticket_is_skipped_and_its_late_result_dropped(self):
+        jobs = self.queue(timeout=0.2)
+        hung = self.submit(jobs, "hung")
+        later = self.submit(jobs, "later")
+        # Finished at once, but held back until the hung call ahead of it is given up on
+        self.model.gate("later").set()
+        self.assertEqual(self.wait_for(jobs, later)["status"], DONE)
+        status = jobs.status(hung.id)
+        self.assertEqual(status["status"], FAILED)
+        self.assertIn("Timed out", status["error"])
+
+        self.model.gate("hung").set()
+        time.sleep(0.1)
+        self.assertEqual([entry["window_title"] for entry in self.appended], ["later"])
+        self.assertIsNone(jobs.status(hung.id)["entry"])
+
+    def test_a_hung_call_does_not_cost_the_pool_a_worker(self):
+        jobs = self.queue(workers=1, timeout=0.2)
+        hung = self.submit(jobs, "hung")
+        self.assertEqual(self.wait_for(jobs, hung)["status"], FAILED)
+        self.assertEqual(jobs.stats()["stuck"], 1)
+
+        # The only original worker is still blocked in the call
+        later = self.submit(jobs, "later")
+        self.model.gate("later").set()
+        self.assertEqual(self.wait_for(jobs, later)["status"], DONE)
+
+        self.model.gate("hung").set()
+        deadline = time.monotonic() + 5
+        while jobs.stats()["stuck"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(jobs.stats()["stuck"], 0)
+        self.assertEqual([entry["window_title"] for entry in self.appended], ["later"])
+        self.assertEqual(len([thread for thread in jobs._threads if thread.is_alive()]), 1)
+
+    def test_status_files_follow_the_job_and_leave_with_it(self):
+        store = self.tmp / "jobs"
+        jobs = self.queue(store=store)
+        job = self.submit(jobs, "a")
+        path = store / f"{job.id}.json"
+        self.assertIn(json.loads(path.read_text())["status"], (analyze_jobs.QUEUED, analyze_jobs.RUNNING))
+        self.model.gate("a").set()
+        self.wait_for(jobs, job)
+        self.assertEqual(json.loads(path.read_text()), jobs.status(job.id))
+
+        with mock.patch.object(analyze_jobs, "JOB_HISTORY", 1):
+            self.model.gate("b").set()
+            self.wait_for(jobs, self.submit(jobs, "b"))
+        self.assertFalse(path.exists())
+        self.assertIsNone(jobs.status(job.id))
+        self.assertIsNone(jobs.status("../" + job.id))
+
+    def test_full_queue_refuses_with_a_retry_hint(self):
+        jobs = self.queue(workers=1, size=1)
+        self.submit(jobs, "running")
+        self.wait_for(jobs, jobs._jobs[next(iter(jobs._jobs))], states=(analyze_jobs.RUNNING,))
+        self.submit(jobs, "queued")
+        self.assertTrue(jobs.full())
+        with self.assertRaises(QueueFull) as raised:
+            self.submit(jobs, "refused")
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class AnalyzeViewTests(QueueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.jobs = self.queue()
+        screenshots = self.tmp / "screenshots"
+        screenshots.mkdir()
+        for patcher in (
+            mock.patch("pyapp.views.analyze.analyze_queue", return_value=self.jobs),
+            mock.patch.object(analyze_jobs, "_QUEUE", self.jobs),
+            mock.patch("pyapp.views.analyze.BASE_DIR", self.tmp),
+            mock.patch("pyapp.views.analyze.SCREENSHOT_DIR", screenshots),
+            mock.patch.object(analyze_jobs, "PENDING_DIR", screenshots / "pending"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post(self, name: str = "latest.png"):
+        upload = SimpleUploadedFile(name, b"png", content_type="image/png")
+        return self.client.post(reverse("analyze"), {"screenshot": upload, "prompt": "p"})
+
+    def test_upload_is_accepted_with_a_status_location(self):
+        response = self.post()
+        self.assertEqual(response.status_code, 202)
+        body = response.json()
+        status_url = reverse("analyze-status", args=[body["id"]])
+        self.assertEqual(response["Location"], status_url)
+        self.assertEqual(body["status_url"], status_url)
+        self.assertEqual(body["status"], analyze_jobs.QUEUED)
+        self.assertEqual(body["filename"], "latest.png")
+        self.assertEqual(body["file_path_rel"], "screenshots/latest.png")
+
+        polled = self.client.get(status_url)
+        self.assertEqual(polled.status_code, 200)
+        self.assertIn(polled.json()["status"], (analyze_jobs.QUEUED, analyze_jobs.RUNNING))
+
+        self.model.gate("p").set()
+        self.wait_for(self.jobs, self.jobs._jobs[body["id"]])
+        done = self.client.get(status_url).json()
+        self.assertEqual(done["status"], DONE)
+        self.assertEqual(done["entry"]["timestamp"], body["timestamp"])
+        self.assertTrue((self.tmp / "screenshots" / "latest.png").exists())
+
+    def test_status_is_found_from_another_server_process(self):
+        store = self.tmp / "jobs"
+        jobs = self.queue(store=store)
+        job = self.submit(jobs, "elsewhere")
+        self.model.gate("elsewhere").set()
+        self.wait_for(jobs, job)
+        # This process never built a queue; the accepting one left the status file
+        with mock.patch.object(analyze_jobs, "_QUEUE", None), mock.patch.object(analyze_jobs, "JOBS_DIR", store):
+            response = self.client.get(reverse("analyze-status", args=[job.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), jobs.status(job.id))
+        self.assertEqual(response.json()["status"], DONE)
+
+    def test_unknown_job_is_404(self):
+        response = self.client.get(reverse("analyze-status", args=["0" * 32]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_full_queue_answers_503_with_retry_after(self):
+        with mock.patch.object(self.jobs, "submit", side_effect=QueueFull(7)):
+            response = self.post()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "7")
+        self.assertEqual(response.json()["retry_after"], 7)
+        # The upload saved for the refused job is removed again
+        self.assertEqual(list((self.tmp / "screenshots" / "pending").iterdir()), [])
+
+    def test_upload_route_rejects_other_methods(self):
+        self.assertEqual(self.client.put(reverse("analyze")).status_code, 405)
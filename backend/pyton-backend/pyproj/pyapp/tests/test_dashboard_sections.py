@@ -0,0 +1,80 @@
+import pandas as pd
+from django.test import SimpleTestCase
+
+from pyapp.services import background_tasks
+from pyapp.services.dashboard_cache import cached_response
+from pyapp.services.dashboard_data import _long_breaks, build_section, section_inputs, section_versions
+
+
+def idle_frame(*idle_seconds: int) -> pd.DataFrame:
+    """One metrics row a minute from 08:00 with the given idle times."""
+    return pd.DataFrame(
+        {
+            "timestamp": pd.date_range("2025-10-05 08:00", periods=len(idle_seconds), freq="min"),
+            "idle_seconds": idle_seconds,
+        }
+    )
+
+
+def long_break(start: str, end: str, minutes: int) -> dict:
+    return {
+        "start": f"2025-10-05T{start}",
+        "end": f"2025-10-05T{end}",
+        "durationMin": minutes,
+        "reason": "Extended idle",
+    }
+
+
+class LongBreakTests(SimpleTestCase):
+    def test_no_idle_rows(self):
+        self.assertEqual(_long_breaks(idle_frame(0, 10, 299), 300), [])
+
+    def test_run_at_start_of_frame(self):
+        # Starts one idle time before the first row: 08:00 - 10 min
+        self.assertEqual(_long_breaks(idle_frame(600, 900, 0, 0), 300), [long_break("07:50:00", "08:01:00", 11)])
+
+    def test_run_at_end_of_frame(self):
+        self.assertEqual(_long_breaks(idle_frame(0, 0, 400, 500), 300), [long_break("07:55:20", "08:03:00", 8)])
+
+    def test_single_row_runs(self):
+        self.assertEqual(
+            _long_breaks(idle_frame(0, 360, 0, 0, 300), 300),
+            [long_break("07:55:00", "08:01:00", 6), long_break("07:59:00", "08:04:00", 5)],
+        )
+
+    def test_whole_frame_idle(self):
+        self.assertEqual(_long_breaks(idle_frame(300, 300, 300), 300), [long_break("07:55:00", "08:02:00", 7)])
+
+
+class SettingsSectionTests(SimpleTestCase):
+    def run_task(self) -> None:
+        name = "test-settings-section"
+        state = background_tasks._STATE.setdefault(name, background_tasks._TaskState())
+        self.addCleanup(background_tasks._STATE.pop, name, None)
+        background_tasks._run_task(background_tasks.TaskSpec(name, lambda: True, ()), state, ())
+
+    def test_task_runs_refresh_the_memoised_section(self):
+        first = build_section("settings")
+        self.assertIs(build_section("settings"), first)
+        self.run_task()
+        section = build_section("settings")
+        self.assertEqual(section["backgroundTasks"]["test-settings-section"]["runs"], 1)
+
+    def test_task_runs_change_the_cached_response(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            return {"settings": build_section("settings")}
+
+        names = ("settings",)
+
+        def respond():
+            return cached_response(("test", names), build, section_inputs(names), lambda: section_versions(names))
+
+        first = respond()
+        self.assertIs(respond(), first)
+        self.run_task()
+        second = respond()
+        self.assertEqual(len(builds), 2)
+        self.assertNotEqual(second.etag, first.etag)
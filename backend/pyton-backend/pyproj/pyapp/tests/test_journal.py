@@ -0,0 +1,116 @@
+import json
+import multiprocessing
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from pyapp.services import journal
+from pyapp.services.log_partitions import partitioned_log
+
+# Rotation runs the day after the lines' day, as the background task does
+TODAY = date(2025, 10, 6)
+
+PROCESSES = 3
+THREADS = 4
+APPENDS = 50
+
+
+def append_from_threads(hot: str, proc: int) -> list[tuple]:
+    """Worker process: THREADS threads appending through one writer; (proc, thread, n, seq, offset, end) per line."""
+    writer = journal.JournalWriter(hot, durable=False)
+    results = []
+    results_lock = threading.Lock()
+
+    def run(thread: int) -> None:
+        for n in range(APPENDS):
+            entry = {
+                "timestamp": f"2025-10-05T{n * 24 // APPENDS:02d}:00:00-07:00",
+                "proc": proc,
+                "thread": thread,
+                "n": n,
+                # Lines of different lengths, so a wrong offset cannot line up by chance
+                "window_title": "x" * ((proc * 31 + thread * 7 + n) % 97),
+            }
+            commit = writer.append(json.dumps(entry))
+            with results_lock:
+                results.append((proc, thread, n, commit.seq, commit.offset, commit.end))
+
+    workers = [threading.Thread(target=run, args=(thread,)) for thread in range(THREADS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    writer.close()
+    return results
+
+
+class JournalConcurrencyTests(SimpleTestCase):
+    def test_processes_and_threads_append_whole_ordered_lines(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        hot = Path(tmp.name) / "q_analysis.jsonl"
+        log = partitioned_log(hot)
+        total = PROCESSES * THREADS * APPENDS
+
+        rotations = 0
+        with multiprocessing.get_context("fork").Pool(PROCESSES) as pool:
+            pending = pool.starmap_async(append_from_threads, [(str(hot), proc) for proc in range(PROCESSES)])
+            # Rotation runs alongside the writers and takes the same lock
+            while not pending.ready():
+                rotations += bool(log.rotate(TODAY))
+                time.sleep(0.005)
+            commits = [row for rows in pending.get(timeout=60) for row in rows]
+
+        data = log.read_from(0).data
+        lines = data.splitlines(keepends=True)
+        self.assertEqual(len(lines), total)
+        entries = [json.loads(line) for line in lines]
+
+        self.assertEqual(sorted(seq for _, _, _, seq, _, _ in commits), list(range(1, total + 1)))
+        for proc, thread, n, seq, offset, end in commits:
+            self.assertEqual(data[offset:end], lines[seq - 1])
+            entry = entries[seq - 1]
+            self.assertEqual((entry["proc"], entry["thread"], entry["n"]), (proc, thread, n))
+
+        by_thread = defaultdict(list)
+        for proc, thread, n, seq, _, _ in commits:
+            by_thread[proc, thread].append((n, seq))
+        for key, appended in by_thread.items():
+            seqs = [seq for _, seq in sorted(appended)]
+            self.assertEqual(seqs, sorted(seqs), f"thread {key} lines out of order")
+
+        self.assertEqual(journal.committed(hot), journal.JournalPosition(total, len(data)))
+        self.assertGreater(rotations, 0)
+
+
+class ForeignLineTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.hot = Path(tmp.name) / "q_analysis.jsonl"
+        self.writer = journal.JournalWriter(self.hot, durable=False)
+        self.addCleanup(self.writer.close)
+
+    def test_lines_written_around_the_writer_are_counted(self):
+        self.assertEqual(self.writer.append('{"n": 0}'), journal.JournalCommit(1, 0, 9))
+        with self.hot.open("ab") as fh:
+            fh.write(b'{"n": 1}\n{"n": 2}\n')
+        self.assertEqual(self.writer.append('{"n": 3}'), journal.JournalCommit(4, 27, 36))
+
+    def test_a_torn_line_is_closed_before_the_next_batch(self):
+        self.writer.append('{"n": 0}')
+        with self.hot.open("ab") as fh:
+            fh.write(b'{"n": 1')
+        self.assertEqual(self.writer.append('{"n": 2}'), journal.JournalCommit(3, 17, 26))
+        self.assertEqual(self.hot.read_bytes(), b'{"n": 0}\n{"n": 1\n{"n": 2}\n')
+
+    def test_close_brings_the_sidecar_up_to_date(self):
+        for n in range(3):
+            self.writer.append('{"n": %d}' % n)
+        self.writer.close()
+        self.assertEqual(journal.committed(self.hot), journal.JournalPosition(3, 27))
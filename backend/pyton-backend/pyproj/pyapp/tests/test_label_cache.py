@@ -0,0 +1,198 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.utils import timezone as dj_timezone
+from PIL import Image, ImageDraw
+
+from pyapp.services import activity_processor, analyze_jobs
+from pyapp.services.label_cache import HASH_SIZE, Fingerprint, LabelCache
+
+EDITOR = ("Code", "views.py")
+BROWSER = ("Google Chrome", "Docs")
+
+
+def screen(path: Path, lines: int = 12, cursor: int = 0) -> str:
+    """A dark editor-like screenshot: ``lines`` text bars and a cursor at column ``cursor``."""
+    image = Image.new("RGB", (640, 360), (30, 30, 30))
+    draw = ImageDraw.Draw(image)
+    for line in range(lines):
+        draw.rectangle([20, 20 + line * 24, 60 + (line * 97) % 500, 30 + line * 24], fill=(200, 220, 180))
+    draw.rectangle([300 + cursor, 20, 301 + cursor, 30], fill=(255, 255, 255))
+    image.save(path)
+    return str(path)
+
+
+def flipped(key: Fingerprint, bits: int) -> Fingerprint:
+    """``key`` with its lowest ``bits`` hash bits inverted."""
+    return Fingerprint(key.bits ^ ((1 << bits) - 1), key.brightness)
+
+
+class FakeModel:
+    def __init__(self, title: str = "views.py") -> None:
+        self.calls = 0
+        self.title = title
+
+    def __call__(self, image: str, prompt: str) -> dict:
+        self.calls += 1
+        return {"app_name": "Code", "window_title": self.title, "productive": True}
+
+
+class LabelCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.cache = LabelCache(ttl=300, max_distance=6, capacity=3, clock=lambda: self.now)
+        self.key = Fingerprint(0b1011 << 100, 40.0)
+        self.label = {"app_name": "Code", "window_title": "views.py", "productive": True}
+
+    def test_near_duplicate_within_the_threshold_is_a_hit(self):
+        self.cache.store(self.key, "p", EDITOR, self.label)
+        self.assertEqual(self.cache.lookup(flipped(self.key, 6), "p", EDITOR), self.label)
+        self.assertEqual((self.cache.stats()["hits"], self.cache.stats()["misses"]), (1, 0))
+
+    def test_beyond_the_threshold_is_a_miss(self):
+        self.cache.store(self.key, "p", EDITOR, self.label)
+        self.assertIsNone(self.cache.lookup(flipped(self.key, 7), "p", EDITOR))
+        # Same edges, different brightness: a blank dark page is not a blank white one
+        self.assertIsNone(self.cache.lookup(Fingerprint(self.key.bits, 200.0), "p", EDITOR))
+        self.assertEqual((self.cache.stats()["hits"], self.cache.stats()["misses"]), (0, 2))
+
+    def test_another_window_or_prompt_is_a_miss(self):
+        self.cache.store(self.key, "p", EDITOR, self.label)
+        self.assertIsNone(self.cache.lookup(self.key, "p", BROWSER))
+        self.assertIsNone(self.cache.lookup(self.key, "q", EDITOR))
+        self.assertIsNone(self.cache.lookup(self.key, "p", ("Code", "models.py")))
+
+    def test_entries_expire_after_the_ttl(self):
+        self.cache.store(self.key, "p", EDITOR, self.label)
+        self.now = 300
+        self.assertIsNotNone(self.cache.lookup(self.key, "p", EDITOR))
+        self.now = 300.5
+        self.assertIsNone(self.cache.lookup(self.key, "p", EDITOR))
+        self.assertEqual((self.cache.stats()["expired"], self.cache.stats()["entries"]), (1, 0))
+
+    def test_least_recently_used_entry_goes_at_capacity(self):
+        # Eight bits apiece, so any two are 16 bits apart
+        keys = [Fingerprint(0xFF << (n * HASH_SIZE), 40.0) for n in range(4)]
+        for key in keys[:3]:
+            self.cache.store(key, "p", EDITOR, self.label)
+        # Using the oldest entry makes the second one the least recently used
+        self.assertIsNotNone(self.cache.lookup(keys[0], "p", EDITOR))
+        self.cache.store(keys[3], "p", EDITOR, self.label)
+        self.assertIsNone(self.cache.lookup(keys[1], "p", EDITOR))
+        for key in (keys[0], keys[2], keys[3]):
+            self.assertIsNotNone(self.cache.lookup(key, "p", EDITOR))
+        self.assertEqual(self.cache.stats()["evicted"], 1)
+
+
+class WrappedModelTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.cache = LabelCache(ttl=300, max_distance=6)
+        self.model = FakeModel()
+        self.focus = EDITOR
+        self.classify = self.cache.wrap(self.model, lambda: self.focus)
+
+    def test_a_near_duplicate_capture_skips_the_model(self):
+        first = self.classify(screen(self.tmp / "a.png"), "p")
+        second = self.classify(screen(self.tmp / "b.png", cursor=7), "p")
+        self.assertEqual(second, first)
+        self.assertEqual(self.model.calls, 1)
+        self.assertEqual((self.cache.stats()["hits"], self.cache.stats()["misses"]), (1, 1))
+
+    def test_a_new_window_title_asks_the_model_again(self):
+        self.classify(screen(self.tmp / "a.png"), "p")
+        # The same pixels as far as the hash can tell, but the tracker saw another file open
+        self.focus, self.model.title = ("Code", "models.py"), "models.py"
+        label = self.classify(screen(self.tmp / "b.png"), "p")
+        self.assertEqual(label["window_title"], "models.py")
+        self.assertEqual(self.model.calls, 2)
+
+    def test_without_a_tracked_window_the_model_is_always_asked(self):
+        self.focus = None
+        for name in ("a.png", "b.png"):
+            self.classify(screen(self.tmp / name), "p")
+        self.assertEqual(self.model.calls, 2)
+        self.assertEqual(self.cache.stats()["untracked"], 2)
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_unhashable_input_falls_through_to_the_model(self):
+        broken = self.tmp / "broken.png"
+        broken.write_bytes(b"not a png")
+        self.assertTrue(self.classify(str(broken), "p")["productive"])
+        self.assertTrue(self.classify(str(self.tmp / "missing.png"), "p")["productive"])
+        self.assertEqual(self.model.calls, 2)
+        self.assertEqual(self.cache.stats()["unhashable"], 2)
+        self.assertEqual(self.cache.stats()["hits"] + self.cache.stats()["misses"], 0)
+
+    def test_labels_without_a_verdict_are_not_cached(self):
+        model = mock.Mock(return_value={"app_name": "Code", "window_title": "views.py", "productive": None})
+        classify = self.cache.wrap(model, lambda: EDITOR)
+        for name in ("a.png", "b.png"):
+            classify(screen(self.tmp / name), "p")
+        self.assertEqual(model.call_count, 2)
+
+
+class AnalyzeStatsTests(SimpleTestCase):
+    def test_counts_come_from_the_running_cache(self):
+        cache = LabelCache()
+        cache.store(Fingerprint(0, 40.0), "p", EDITOR, {"productive": True})
+        cache.lookup(Fingerprint(0, 40.0), "p", EDITOR)
+        cache.lookup(Fingerprint(0, 40.0), "p", BROWSER)
+        jobs = analyze_jobs.AnalyzeQueue(FakeModel(), lambda entry: None, workers=1)
+        with mock.patch.object(analyze_jobs, "_QUEUE", jobs), mock.patch.object(analyze_jobs, "_LABEL_CACHE", cache):
+            stats = analyze_jobs.analyze_stats()
+        self.assertEqual((stats["labelCache"]["hits"], stats["labelCache"]["misses"]), (1, 1))
+        self.assertEqual(stats["queue"]["workers"], 1)
+
+    def test_zeros_before_the_first_upload_without_starting_workers(self):
+        env = {key: value for key, value in os.environ.items() if key != "GEMINI_API_KEY"}
+        with (
+            mock.patch.dict(os.environ, env, clear=True),
+            mock.patch.object(analyze_jobs, "_QUEUE", None),
+            mock.patch.object(analyze_jobs, "_LABEL_CACHE", None),
+            mock.patch.object(analyze_jobs, "AnalyzeQueue") as queue,
+        ):
+            stats = analyze_jobs.analyze_stats()
+            self.assertIsNone(analyze_jobs._QUEUE)
+        queue.assert_not_called()
+        self.assertEqual(stats["queue"]["queued"], 0)
+        self.assertEqual(stats["queue"]["jobs"], {})
+        self.assertEqual((stats["labelCache"]["hits"], stats["labelCache"]["misses"]), (0, 0))
+
+
+class ForegroundWindowTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.activity = Path(tmp.name) / "activity.jsonl"
+        patcher = mock.patch.object(activity_processor, "ACTIVITY_FILE", self.activity)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, *rows: tuple[int, str, str], tail: bytes = b"") -> None:
+        now = dj_timezone.localtime()
+        lines = [
+            json.dumps({
+                "timestamp": (now - timedelta(seconds=age)).isoformat(timespec="seconds"),
+                "app_name": app,
+                "window_title": title,
+            })
+            for age, app, title in rows
+        ]
+        self.activity.write_bytes("".join(line + "\n" for line in lines).encode("utf-8") + tail)
+
+    def test_the_last_line_is_the_window_in_focus(self):
+        self.write((20, *BROWSER), (2, *EDITOR), tail=b'{"timestamp": "20')
+        self.assertEqual(activity_processor.foreground_window(), EDITOR)
+
+    def test_an_old_line_or_no_file_is_unknown(self):
+        self.assertIsNone(activity_processor.foreground_window())
+        self.write((600, *EDITOR))
+        self.assertIsNone(activity_processor.foreground_window())
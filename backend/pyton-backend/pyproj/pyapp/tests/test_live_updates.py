@@ -0,0 +1,52 @@
+import asyncio
+import threading
+
+from django.test import SimpleTestCase
+
+from pyapp.services import live_updates
+from pyapp.services.live_updates import LiveHub, Subscription
+
+
+class AsyncSubscriptionTests(SimpleTestCase):
+    def subscribe(self, hub: LiveHub, loop: asyncio.AbstractEventLoop) -> Subscription:
+        # Registered directly: subscribe() would also start the file watcher
+        subscription = Subscription(hub, loop)
+        hub._subscribers.add(subscription)
+        return subscription
+
+    def test_messages_published_from_a_thread_reach_the_loop(self):
+        async def scenario():
+            hub = LiveHub()
+            subscription = self.subscribe(hub, asyncio.get_running_loop())
+            threads = threading.active_count()
+            waiting = asyncio.ensure_future(subscription.get_async(5.0))
+            await asyncio.sleep(0.05)
+            # Waiting costs no thread
+            self.assertEqual(threading.active_count(), threads)
+            publisher = threading.Thread(target=hub._publish, args=("metrics", {"sections": ["idle"]}))
+            publisher.start()
+            publisher.join()
+            message = await waiting
+            self.assertEqual((message.event, message.data), ("metrics", {"sections": ["idle"]}))
+            self.assertIsNone(await subscription.get_async(0.01))
+
+        asyncio.run(scenario())
+
+    def test_subscriber_that_falls_behind_is_dropped(self):
+        async def scenario():
+            hub = LiveHub()
+            subscription = self.subscribe(hub, asyncio.get_running_loop())
+            for n in range(live_updates.SUBSCRIBER_QUEUE_SIZE + 1):
+                hub._publish("metrics", {"n": n})
+            await asyncio.sleep(0)
+            self.assertTrue(subscription.closed)
+
+        asyncio.run(scenario())
+
+    def test_closed_loop_drops_the_subscriber(self):
+        loop = asyncio.new_event_loop()
+        hub = LiveHub()
+        subscription = self.subscribe(hub, loop)
+        loop.close()
+        hub._publish("metrics", {})
+        self.assertTrue(subscription.closed)
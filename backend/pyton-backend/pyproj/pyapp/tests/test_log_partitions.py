@@ -0,0 +1,58 @@
+import multiprocessing
+import tempfile
+from datetime import date
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from pyapp.services.journal import JournalWriter
+from pyapp.services.log_partitions import partitioned_log
+
+# Rotation runs the day after the lines' day, so compaction also gzips it
+TODAY = date(2025, 10, 6)
+
+
+def log_line(n: int) -> bytes:
+    return b'{"timestamp": "2025-10-05T08:00:00", "n": %d}\n' % n
+
+
+def append_and_rotate(hot: str, lines: int) -> None:
+    """Child process: append lines one by one, rotating and compacting as it goes."""
+    writer = JournalWriter(hot, durable=False)
+    log = partitioned_log(hot)
+    for n in range(lines):
+        writer.append(log_line(n))
+        if n % 5 == 0:
+            log.rotate(TODAY)
+        if n % 40 == 0:
+            log.compact(TODAY, retention_days=365)
+    writer.close()
+
+
+class CrossProcessReadTests(SimpleTestCase):
+    def test_reads_see_a_prefix_while_another_process_rotates(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        hot = Path(tmp.name) / "q_analysis.jsonl"
+        hot.touch()
+        lines = 400
+        expected = b"".join(log_line(n) for n in range(lines))
+
+        child = multiprocessing.get_context("fork").Process(target=append_and_rotate, args=(str(hot), lines))
+        child.start()
+        self.addCleanup(child.join)
+        log = partitioned_log(hot)
+        reads = 0
+        while True:
+            running = child.is_alive()
+            read = log.read_from(0)
+            reads += 1
+            self.assertEqual(read.start, 0)
+            self.assertTrue(expected.startswith(read.data), f"read {reads} is not a prefix of the log")
+            self.assertEqual(read.end, len(read.data))
+            if not running:
+                break
+        child.join()
+        self.assertEqual(child.exitcode, 0)
+        self.assertEqual(log.read_from(0).data, expected)
+        self.assertGreater(reads, 10)
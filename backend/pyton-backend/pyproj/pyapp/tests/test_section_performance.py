@@ -0,0 +1,67 @@
+"""
+Time budget for the metrics-based dashboard sections at 1M rows. Slow, so
+opt-in: TRACKLET_SLOW_TESTS=1 python -m pytest pyapp/tests/test_section_performance.py
+(TRACKLET_SECTION_BUDGET_MS overrides the budget for slower machines).
+"""
+import os
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from pyapp.services import dashboard_data
+
+ROWS = 1_000_000
+BUDGET_MS = float(os.environ.get("TRACKLET_SECTION_BUDGET_MS", 5_000))
+
+WINDOWS = [
+    ("Visual Studio Code", "dashboard_data.py"),
+    ("Google Chrome", "YouTube"),
+    ("Google Chrome", "Stack Overflow"),
+    ("Slack", "general"),
+    ("Notion", "Weekly Planner"),
+    ("Spotify", "Discover Weekly"),
+    ("Terminal", "zsh"),
+]
+
+
+def metrics_frame(rows: int, seed: int = 7) -> pd.DataFrame:
+    """One metrics.jsonl row a minute, mostly labelled, with ~1% of rows starting a long idle run."""
+    rng = np.random.default_rng(seed)
+    pair = rng.integers(0, len(WINDOWS), rows)
+    apps = np.array([app for app, _ in WINDOWS], dtype=object)[pair]
+    titles = np.array([title for _, title in WINDOWS], dtype=object)[pair]
+    idle = rng.choice([0, 0, 0, 5, 10, 20, 30], rows).astype(float)
+    for start in np.flatnonzero(rng.random(rows) < 0.01):
+        idle[start : start + rng.integers(1, 21)] = rng.integers(300, 1500)
+    return pd.DataFrame(
+        {
+            "timestamp": pd.Timestamp("2025-10-05 08:00") + pd.to_timedelta(np.arange(rows), unit="min"),
+            "app_name": apps,
+            "window_title": titles,
+            "idle_seconds": idle,
+            "source_app_name": apps,
+            "source_window_title": titles,
+            "productive": rng.choice(np.array([True, False, "unknown"], dtype=object), rows, p=[0.5, 0.45, 0.05]),
+        }
+    )
+
+
+@unittest.skipUnless(os.environ.get("TRACKLET_SLOW_TESTS") == "1", "set TRACKLET_SLOW_TESTS=1 to run")
+class SectionBudgetTests(SimpleTestCase):
+    def test_metrics_sections_within_budget_at_1m_rows(self):
+        df = dashboard_data._prepare_metrics_dataframe(metrics_frame(ROWS))
+        best = float("inf")
+        for _ in range(3):
+            lap = time.perf_counter()
+            sections = {
+                "idle": dashboard_data.build_idle_section(df),
+                "apps": dashboard_data.build_apps_section(df),
+                "timeline": dashboard_data.build_timeline_section(df),
+                "focus": dashboard_data.build_focus_section(df),
+            }
+            best = min(best, time.perf_counter() - lap)
+        self.assertTrue(all(sections.values()))
+        self.assertLessEqual(best * 1000, BUDGET_MS, f"Sections took {best * 1000:.0f} ms at {ROWS:,} rows")
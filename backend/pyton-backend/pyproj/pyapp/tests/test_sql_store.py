@@ -0,0 +1,167 @@
+import json
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.db import connection
+from django.test import SimpleTestCase
+from django.utils import timezone as dj_timezone
+
+from pyapp.services import activity_processor, dashboard_data, sql_store
+from pyapp.services.activity_frame import ActivityFrame
+from pyapp.services.metrics_snapshot import get_metrics_snapshot
+from pyapp.services.timestamp_decoder import TimestampDecoder
+from pyapp.utils import script_combiner
+
+START = datetime(2025, 10, 6, 9, 0)
+
+# (first second, app, window, idle seconds) runs of activity, one row every 20 s
+RUNS = [
+    (0, "Terminal", "vim", 0),
+    (170, "Google Chrome", "Docs", 0),
+    (350, "Terminal", "vim", 12),
+    # Several apps in one minute, so rows share a timestamp once labelled
+    (420, "Slack", "general", 0),
+    (440, "Terminal", "vim", 0),
+    (460, "Slack", "general", 0),
+    # Beyond the last label's tolerance: matched forward, or left unknown
+    (1000, "Slack", "general", 40),
+    (1160, "Slack", "random", 0),
+    (1300, "Finder", "Downloads", 0),
+    (1500, "Terminal", "vim", 0),
+]
+END = 1800
+
+LABELS = [
+    (0, "Terminal", "vim", True),
+    (180, "Google Chrome", "Docs", None),
+    (420, "Slack", "general", False),
+    (2400, "Slack", "general", True),
+]
+
+
+def jsonl(records: list[dict]) -> bytes:
+    return b"".join((json.dumps(record) + "\n").encode("utf-8") for record in records)
+
+
+def activity_records() -> list[dict]:
+    records = []
+    for (first, app, window, idle), (stop, *_) in zip(RUNS, RUNS[1:] + [(END,)]):
+        for second in range(first, stop, 20):
+            records.append({
+                "timestamp": (START + timedelta(seconds=second)).strftime("%Y-%m-%dT%H:%M:%S"),
+                "app_name": app,
+                "window_title": window,
+                "idle_seconds": idle,
+            })
+    return records
+
+
+def label_records() -> list[dict]:
+    return [
+        {
+            "timestamp": (START + timedelta(seconds=second)).strftime("%Y-%m-%dT%H:%M:%S"),
+            "app_name": app,
+            "window_title": window,
+            "productive": productive,
+        }
+        for second, app, window, productive in LABELS
+    ]
+
+
+def metrics_sections(df) -> dict:
+    return {
+        "idle": dashboard_data.build_idle_section(df),
+        "apps": dashboard_data.build_apps_section(df),
+        "timeline": dashboard_data.build_timeline_section(df),
+        "focus": dashboard_data.build_focus_section(df),
+    }
+
+
+class SqlStoreParityTests(SimpleTestCase):
+    """The sqlite backend's queries against what the JSONL backend serves for the same lines."""
+
+    databases = {"default"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        tmp = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tmp.cleanup)
+        cls.tmp = Path(tmp.name)
+        cls.activity_file = cls.tmp / "activity.jsonl"
+        cls.history_file = cls.tmp / "q_analysis.jsonl"
+        cls.activity_file.write_bytes(jsonl(activity_records()))
+        cls.history_file.write_bytes(jsonl(label_records()))
+
+        # A throwaway database file, so the project's db.sqlite3 is untouched
+        test_settings = connection.settings_dict["TEST"]
+        previous = test_settings.get("NAME")
+        test_settings["NAME"] = str(cls.tmp / "test.sqlite3")
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+        def restore():
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            test_settings["NAME"] = previous
+
+        cls.addClassCleanup(restore)
+        cls.imported = {
+            sql_store.SOURCE_ACTIVITY: sql_store.import_log(sql_store.SOURCE_ACTIVITY, cls.activity_file),
+            sql_store.SOURCE_LABELS: sql_store.import_log(sql_store.SOURCE_LABELS, cls.history_file),
+        }
+
+    def jsonl_frame(self) -> ActivityFrame:
+        decoder = TimestampDecoder(dj_timezone.get_current_timezone())
+        frame = ActivityFrame()
+        activity_processor._append_rows(frame, activity_processor._decode_activities(activity_records(), decoder))
+        return frame
+
+    def jsonl_metrics(self):
+        metrics_file = self.tmp / "metrics.jsonl"
+        script_combiner.label_activity_with_productivity(
+            str(self.history_file), str(self.activity_file), str(metrics_file)
+        )
+        return dashboard_data._prepare_metrics_dataframe(get_metrics_snapshot(metrics_file).frame)
+
+    def test_import_stores_each_line_once(self):
+        self.assertEqual(self.imported[sql_store.SOURCE_ACTIVITY], len(activity_records()))
+        self.assertEqual(self.imported[sql_store.SOURCE_LABELS], len(LABELS))
+        self.assertEqual(sql_store.import_log(sql_store.SOURCE_ACTIVITY, self.activity_file), 0)
+
+    def test_aggregate_matches_the_activity_frame(self):
+        expected = activity_processor._build_aggregate(self.jsonl_frame())
+        actual = sql_store._query_aggregate(None, None)
+        for build in (
+            activity_processor.build_overview_data,
+            activity_processor.build_timeline_data,
+            activity_processor.compute_context_switches,
+            dashboard_data.build_activity_switches_section,
+        ):
+            self.assertEqual(build(actual), build(expected), build.__name__)
+
+    def test_labelled_rows_match_metrics_jsonl(self):
+        expected = self.jsonl_metrics()
+        actual = dashboard_data._prepare_metrics_dataframe(sql_store._query_labelled(None, None))
+        columns = ["timestamp", "app_name", "window_title", "idle_seconds", "productive_bool"]
+        self.assertEqual(
+            actual[columns].astype(object).values.tolist(),
+            expected[columns].astype(object).values.tolist(),
+        )
+        # Backward match, null verdict, forward match and no match at all
+        self.assertEqual(set(actual["productive_bool"].astype(object)), {True, False, None})
+        self.assertEqual(metrics_sections(actual), metrics_sections(expected))
+
+    def test_windowed_rows_match_the_sliced_file(self):
+        expected = self.jsonl_metrics()
+        prepared = dashboard_data._prepare_metrics_dataframe(sql_store._query_labelled(None, None))
+        start = int(dj_timezone.make_aware(START + timedelta(minutes=7)).timestamp())
+        query = dashboard_data.DashboardQuery(start, start + 15 * 60)
+        window = dashboard_data._window_rows(prepared, dashboard_data._timestamp_index(prepared), query)
+        sliced = dashboard_data._window_rows(expected, dashboard_data._timestamp_index(expected), query)
+        self.assertEqual(metrics_sections(window), metrics_sections(sliced))
+        # The window query holds the same rows as the slice
+        rows = sql_store._query_labelled(query.start, query.stop)
+        self.assertEqual(
+            sorted(zip(rows["app_name"], rows["idle_seconds"])),
+            sorted(zip(sliced["app_name"].astype(str), sliced["idle_seconds"])),
+        )
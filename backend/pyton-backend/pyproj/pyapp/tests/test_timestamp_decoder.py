@@ -0,0 +1,52 @@
+import unittest
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from pyapp.services.timestamp_decoder import TimestampDecoder
+
+try:  # Optional: only some deployments hand the decoder a pytz zone
+    import pytz
+except ImportError:  # pragma: no cover
+    pytz = None
+
+ZONE = "America/Vancouver"
+
+# Naive local strings that take the slow path: fractions, a repeated hour, a skipped hour
+SLOW = [
+    "2025-07-01T12:00:00.500",
+    "2025-11-02T01:30:00",
+    "2025-11-02T01:30:00.250",
+    "2025-03-09T02:30:00",
+    "2025-03-09T12:00:00",
+]
+
+
+def make_aware_epoch(text: str) -> int:
+    return int(timezone.make_aware(datetime.fromisoformat(text), ZoneInfo(ZONE)).timestamp() // 1)
+
+
+class NaiveTimestampTests(SimpleTestCase):
+    def check(self, decoder: TimestampDecoder) -> None:
+        for text in SLOW:
+            with self.subTest(text=text):
+                epoch, offset, _ = decoder.decode(text)
+                self.assertEqual(epoch, make_aware_epoch(text))
+                self.assertEqual(offset, TimestampDecoder(ZoneInfo(ZONE)).decode(text)[1])
+        epochs, _, _, ok = decoder.decode_many(SLOW)
+        self.assertTrue(ok.all())
+        self.assertEqual(epochs.tolist(), [make_aware_epoch(text) for text in SLOW])
+
+    def test_zoneinfo_reads_wall_time_as_make_aware_does(self):
+        self.check(TimestampDecoder(ZoneInfo(ZONE)))
+
+    @unittest.skipIf(pytz is None, "pytz is not installed")
+    def test_pytz_zone_is_localized_not_given_its_lmt_offset(self):
+        self.check(TimestampDecoder(pytz.timezone(ZONE)))
+
+    def test_repeated_hour_is_its_first_occurrence(self):
+        epoch, offset, canonical = TimestampDecoder(ZoneInfo(ZONE)).decode("2025-11-02T01:30:00")
+        self.assertEqual((offset, canonical), (-7 * 3600, True))
+        self.assertEqual(epoch, int(datetime(2025, 11, 2, 8, 30, tzinfo=ZoneInfo("UTC")).timestamp()))
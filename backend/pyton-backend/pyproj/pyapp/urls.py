@@ -1,12 +1,15 @@
 from django.urls import path
 
-from .views.analyze import analyze_screenshot
+from .views.analyze import analyze_screenshot, analyze_status
 from .views.overlay_assist import overlay_assist_view
-from .views.dashboard import dashboard_summary
+from .views.dashboard import dashboard_section, dashboard_stream, dashboard_summary
 
 
 urlpatterns = [
     path("analyze/", analyze_screenshot, name="analyze"),
+    path("analyze/<str:job_id>/", analyze_status, name="analyze-status"),
     path("overlay-assist/", overlay_assist_view, name="overlay-assist"),
     path("dashboard/", dashboard_summary, name="dashboard"),
+    path("dashboard/stream/", dashboard_stream, name="dashboard-stream"),
+    path("dashboard/<str:section>/", dashboard_section, name="dashboard-section"),
 ]
@@ -1,4 +1,5 @@
 from google import genai
+from google.genai import types
 import os, json, mimetypes, re
 from typing import Any, Dict
 from django.utils import timezone
@@ -12,10 +13,24 @@ except Exception:
     _load_metrics_dataframe = None  # type: ignore
 
 api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError("GEMINI_API_KEY not found in environment (.env).")
 
-client = genai.Client(api_key=api_key)
+# A call that hangs ends here, a little before the analyze queue gives up on it
+# (ANALYZE_TIMEOUT_SECONDS), so the worker thread it held comes back
+REQUEST_TIMEOUT_SECONDS = 110
+
+_client = None
+
+def get_client() -> genai.Client:
+    """The Gemini client, created on first use so the app can start (and be tested) without a key."""
+    global _client
+    if _client is None:
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment (.env).")
+        _client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(timeout=REQUEST_TIMEOUT_SECONDS * 1000),  # milliseconds
+        )
+    return _client
 
 def _force_parse_json(s: str) -> dict:
     try:
@@ -54,6 +69,10 @@ def _load_system_prompt(default_text: str) -> str:
 
     return default_text
 
+# Only these payload sections feed the compact context; the rest are not built
+COMPACT_SECTIONS = ("overview", "timeline", "focus", "settings")
+
+
 def _build_compact_dashboard_context() -> str | None:
     """Return a compact JSON string with key stats for optional LLM context.
     Only include lightweight, high-signal fields. Return None on failure.
@@ -61,7 +80,7 @@ def _build_compact_dashboard_context() -> str | None:
     if build_dashboard_payload is None:
         return None
     try:
-        payload: Dict[str, Any] = build_dashboard_payload()  # type: ignore
+        payload: Dict[str, Any] = build_dashboard_payload(COMPACT_SECTIONS)  # type: ignore
         compact: Dict[str, Any] = {}
 
         # Overview: include high-level series lengths and last points only
@@ -118,7 +137,7 @@ def _build_compact_dashboard_context() -> str | None:
                     recent = None
                 if recent is not None and not recent.empty:
                     try:
-                        grp = recent.groupby("app_name").agg(active_seconds=("active_seconds", "sum"))
+                        grp = recent.groupby("app_name", observed=True).agg(active_seconds=("active_seconds", "sum"))
                         top = grp.sort_values("active_seconds", ascending=False).head(5)
                         compact["recentByApp"] = [
                             {"app": app, "minutes": round(float(row["active_seconds"]) / 60.0, 2)}
@@ -156,7 +175,7 @@ Additional instruction from caller:
 {prompt}
 """.strip()
 
-    resp = client.models.generate_content(
+    resp = get_client().models.generate_content(
         model="gemini-2.5-flash",
         contents=[{
             "role": "user",
@@ -213,7 +232,7 @@ def overlay_assist(image_path: str, prompt: str) -> str:
         parts.append({"text": gate_note})
         parts.append({"text": f"[STATS_BEGIN]\n{dashboard_context}\n[STATS_END]"})
 
-    resp = client.models.generate_content(
+    resp = get_client().models.generate_content(
         model="gemini-2.5-flash",
         contents=[
             {
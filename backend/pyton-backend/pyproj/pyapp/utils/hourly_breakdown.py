@@ -5,19 +5,11 @@ from pathlib import Path
 
 import pandas as pd
 
+from ..services.metrics_snapshot import metrics_frame
 
-def safe_read_jsonl(path: str | Path) -> pd.DataFrame:
-    file_path = Path(path)
-    if not file_path.exists():
-        raise FileNotFoundError(f"File not found: {file_path}")
-    lines = [line.strip() for line in file_path.read_text(encoding="utf-8").splitlines() if line.strip()]
-    if not lines:
-        raise ValueError(f"No valid JSON lines found in {file_path}")
-    return pd.read_json("\n".join(lines), lines=True)
 
-
-def compute_hourly_productivity(path: str | Path) -> list[dict]:
-    df = safe_read_jsonl(path)
+def compute_hourly_productivity(source: str | Path | pd.DataFrame) -> list[dict]:
+    df = metrics_frame(source).copy()
     if not {"productive", "idle_seconds"}.issubset(df.columns):
         raise ValueError("Missing required columns: 'productive' and 'idle_seconds'")
 
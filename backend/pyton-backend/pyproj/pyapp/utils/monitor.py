@@ -1,24 +1,153 @@
 ﻿from __future__ import annotations
 
+import json
+import os
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Iterator, Optional
 
 import pandas as pd
 
+BLOCK_SIZE = 64 * 1024
+MAX_EVENTS = 20
 
-def is_unproductive_streak(path: str | Path, threshold_minutes: int = 10) -> bool:
-    file_path = Path(path)
+
+def _iter_lines_reversed(path: Path, block_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+    """Yield the non-empty lines of ``path`` last to first, reading block by block from the end."""
+    with path.open("rb") as fh:
+        position = fh.seek(0, os.SEEK_END)
+        remainder = b""
+        while position > 0:
+            step = min(block_size, position)
+            position -= step
+            fh.seek(position)
+            chunk = fh.read(step) + remainder
+            lines = chunk.split(b"\n")
+            # The first piece may be the tail of a line that starts in an earlier block
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line
+        if remainder.strip():
+            yield remainder
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if isinstance(value, pd.Timestamp):
+        value = value.to_pydatetime()
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
     try:
-        df = pd.read_json(file_path, lines=True)
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
     except ValueError:
+        return None
+
+
+def _is_unproductive(value) -> bool:
+    return str(value).lower() == "false"
+
+
+def _tail_records(source: str | Path | pd.DataFrame) -> Iterator[tuple[datetime, object]]:
+    """(timestamp, productive) pairs, newest first."""
+    if isinstance(source, pd.DataFrame):
+        if "productive" not in source.columns or "timestamp" not in source.columns:
+            return
+        for ts, productive in zip(source["timestamp"].iloc[::-1], source["productive"].iloc[::-1]):
+            parsed = _parse_timestamp(ts)
+            if parsed is not None:
+                yield parsed, productive
+        return
+
+    for line in _iter_lines_reversed(Path(source)):
+        try:
+            row = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(row, dict):
+            continue
+        parsed = _parse_timestamp(row.get("timestamp"))
+        if parsed is not None:
+            yield parsed, row.get("productive")
+
+
+def unproductive_streak_state(
+    source: str | Path | pd.DataFrame,
+    threshold_minutes: int = 10,
+) -> tuple[bool, Optional[datetime], Optional[datetime]]:
+    """
+    Whether every row in the last ``threshold_minutes`` of data is unproductive.
+
+    The window is (latest - threshold, latest] and only counts once the data
+    reaches back to its start. Rows are read newest first and reading stops at
+    the first row at or before the window start, so the cost depends on the
+    window, not the file size. Returns (streak, started_at, latest_timestamp).
+    """
+    latest: Optional[datetime] = None
+    window_start: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    covered = False
+    for ts, productive in _tail_records(source):
+        if latest is None:
+            latest = ts
+            window_start = latest - timedelta(minutes=threshold_minutes)
+        if not _is_unproductive(productive):
+            covered = ts <= window_start
+            break
+        started_at = ts
+        if ts <= window_start:
+            covered = True
+            break
+
+    streak = covered and started_at is not None
+    return streak, (started_at if streak else None), latest
+
+
+def is_unproductive_streak(source: str | Path | pd.DataFrame, threshold_minutes: int = 10) -> bool:
+    try:
+        streak, _, latest = unproductive_streak_state(source, threshold_minutes)
+    except (OSError, ValueError):
         print("File is empty or invalid JSONL.")
         return False
-
-    if df.empty or "productive" not in df.columns:
+    if latest is None:
         print("No data or 'productive' column missing.")
-        return False
+    return streak
+
+
+def update_monitor_status(
+    source: str | Path | pd.DataFrame,
+    previous: Optional[dict] = None,
+    threshold_minutes: int = 10,
+) -> dict:
+    """
+    Build the next monitor_status.json payload from the previous one, appending a
+    ``streak_start`` or ``streak_end`` event when the streak state flips.
+    """
+    previous = previous or {}
+    streak, started_at, latest = unproductive_streak_state(source, threshold_minutes)
+    now = datetime.now(timezone.utc).isoformat()
+    events = list(previous.get("events") or [])
+
+    was_streak = bool(previous.get("unproductive_streak"))
+    if streak and was_streak and previous.get("streak_started_at"):
+        # The scan stops at the window edge; the streak began when it was first seen
+        started_at = _parse_timestamp(previous["streak_started_at"]) or started_at
+    if streak != was_streak:
+        at = started_at if streak else latest
+        events.append({
+            "type": "streak_start" if streak else "streak_end",
+            "at": at.isoformat() if at else None,
+            "detected_at": now,
+        })
 
-    recent = df.tail(threshold_minutes)
-    return all(str(value).lower() == "false" for value in recent["productive"])
+    return {
+        "unproductive_streak": streak,
+        "streak_started_at": started_at.isoformat() if started_at else None,
+        "window_minutes": threshold_minutes,
+        "latest_timestamp": latest.isoformat() if latest else None,
+        "checked_at": now,
+        "last_event": events[-1] if events else None,
+        "events": events[-MAX_EVENTS:],
+    }
 
 
 if __name__ == "__main__":
@@ -4,10 +4,11 @@ from pathlib import Path
 
 import pandas as pd
 
+from ..services.metrics_snapshot import metrics_frame
 
-def compute_productivity_stats(path: str | Path) -> dict:
-    file_path = Path(path)
-    df = pd.read_json(file_path, lines=True)
+
+def compute_productivity_stats(source: str | Path | pd.DataFrame) -> dict:
+    df = metrics_frame(source).copy()
 
     if not {"productive", "idle_seconds"}.issubset(df.columns):
         raise ValueError("Missing required columns: 'productive' and 'idle_seconds'")
@@ -1,23 +1,41 @@
 import argparse
+import io
 import json
 import logging
 import time
 from pathlib import Path
 from typing import Optional
 
+import numpy as np
 import pandas as pd
 
+from ..services.log_partitions import partitioned_log
+from ..services.metrics_snapshot import update_columns
+
 LOG = logging.getLogger(__name__)
 
+# Screenshot labels apply to activity up to this long after the capture.
+LABEL_TOLERANCE = pd.Timedelta("10m")
+STATE_VERSION = 2
+# How a committed row still waiting for a label ends; see _copy_committed()
+UNKNOWN_SUFFIX = b'"productive":"unknown"}\n'
 
-def _load_jsonl(path: Path) -> pd.DataFrame:
+
+def _check_input(path: Path) -> None:
     if not path.exists():
         raise FileNotFoundError(f"Missing file: {path}")
-    if path.stat().st_size == 0:
+    # The hot file is empty right after a rotation; its partitions still count
+    if partitioned_log(path).end() == 0:
         raise ValueError(f"File is empty: {path}")
+
+
+def _load_jsonl(path: Path) -> pd.DataFrame:
+    """Every retained line of ``path``: its daily partitions, then the hot file."""
+    _check_input(path)
+    data = partitioned_log(path).read_from(0).data
     # Try fast path first via pandas
     try:
-        df = pd.read_json(path, lines=True)
+        df = pd.read_json(io.BytesIO(data), lines=True)
         if df.empty:
             raise ValueError(f"No rows found in {path}")
         return df
@@ -28,23 +46,22 @@ def _load_jsonl(path: Path) -> pd.DataFrame:
     parsed_rows = []
     skipped = 0
     tried_encodings = ("utf-8", "utf-8-sig", "cp1252", "latin-1")
-    with path.open("rb") as fh:
-        for raw in fh:
-            if not raw.strip():
-                continue
-            text = None
-            for enc in tried_encodings:
-                try:
-                    text = raw.decode(enc)
-                    break
-                except UnicodeDecodeError:
-                    continue
-            if text is None:
-                text = raw.decode("utf-8", errors="replace")
+    for raw in data.splitlines():
+        if not raw.strip():
+            continue
+        text = None
+        for enc in tried_encodings:
             try:
-                parsed_rows.append(json.loads(text))
-            except json.JSONDecodeError:
-                skipped += 1
+                text = raw.decode(enc)
+                break
+            except UnicodeDecodeError:
+                continue
+        if text is None:
+            text = raw.decode("utf-8", errors="replace")
+        try:
+            parsed_rows.append(json.loads(text))
+        except json.JSONDecodeError:
+            skipped += 1
     if not parsed_rows:
         raise ValueError(f"No parseable rows in {path}")
     if skipped:
@@ -64,7 +81,8 @@ def _normalise_timestamps(df: pd.DataFrame, column: str = "timestamp") -> pd.Dat
     except TypeError:
         pass
     df[column] = df[column].dt.floor("min")
-    df.sort_values(column, inplace=True)
+    # Stable, so rows sharing a minute keep file order and incremental runs agree
+    df.sort_values(column, inplace=True, kind="stable")
     return df
 
 
@@ -82,31 +100,58 @@ def _coerce_productive(value) -> Optional[bool]:
     return None
 
 
-def label_activity_with_productivity(
-    screenshot_path: str,
-    activity_path: str,
-    output_path: str,
-) -> int:
-    screenshot_file = Path(screenshot_path)
-    activity_file = Path(activity_path)
-    output_file = Path(output_path)
+def _infer_future_labels(merged: pd.DataFrame, ss_df: pd.DataFrame) -> pd.Series:
+    """
+    Fill "unknown" rows from the next screenshot strictly after them with the
+    same app and window, via one forward merge_asof grouped by app+window.
+    """
+    labels = merged["productive"].copy()
+    unknown = (labels == "unknown").to_numpy()
+    if not unknown.any() or ss_df.empty:
+        return labels
+
+    left = pd.DataFrame(
+        {
+            "timestamp": merged["timestamp"].to_numpy()[unknown],
+            "app_name": merged["app_name_x"].to_numpy()[unknown],
+            "window_title": merged["window_title_x"].to_numpy()[unknown],
+            "_position": unknown.nonzero()[0],
+        }
+    )
+    left = left.dropna(subset=["app_name", "window_title"])
+    right = ss_df[["timestamp", "app_name", "window_title", "productive"]].dropna(
+        subset=["app_name", "window_title"]
+    )
+    right = right.rename(columns={"productive": "_future"}).assign(_matched=True)
+    if left.empty or right.empty:
+        return labels
 
-    ss_df = _load_jsonl(screenshot_file)
-    act_df = _load_jsonl(activity_file)
+    future = pd.merge_asof(
+        left,
+        right,
+        on="timestamp",
+        by=["app_name", "window_title"],
+        direction="forward",
+        allow_exact_matches=False,
+    )
+    found = future["_matched"].eq(True).to_numpy()
+    values = labels.to_numpy(dtype=object, copy=True)
+    values[future["_position"].to_numpy()[found]] = future["_future"].to_numpy(dtype=object)[found]
+    return pd.Series(values, index=labels.index, name=labels.name)
 
-    ss_df = _normalise_timestamps(ss_df)
-    act_df = _normalise_timestamps(act_df)
 
+def _label_frames(ss_df: pd.DataFrame, act_df: pd.DataFrame) -> pd.DataFrame:
+    """Label normalised activity rows with the productivity of nearby screenshots."""
     merged = pd.merge_asof(
         act_df,
         ss_df[["timestamp", "app_name", "window_title", "productive"]],
         on="timestamp",
         direction="backward",
-        tolerance=pd.Timedelta("10m"),
+        tolerance=LABEL_TOLERANCE,
     )
 
     merged["productive"] = merged["productive"].astype(object)
-    merged["productive"].fillna("unknown", inplace=True)
+    merged["productive"] = merged["productive"].fillna("unknown")
 
     merged["session_change"] = (
         (merged["app_name_x"] != merged["app_name_x"].shift())
@@ -115,21 +160,7 @@ def label_activity_with_productivity(
 
     merged["productive"] = merged.groupby("session_change")["productive"].ffill()
 
-    def infer_future_label(row):
-        if row["productive"] != "unknown":
-            return row["productive"]
-
-        future_ss = ss_df[
-            (ss_df["timestamp"] > row["timestamp"])
-            & (ss_df["app_name"] == row.get("app_name_x"))
-            & (ss_df["window_title"] == row.get("window_title_x"))
-        ]
-        if not future_ss.empty:
-            future_ss = future_ss.sort_values("timestamp")
-            return future_ss.iloc[0]["productive"]
-        return "unknown"
-
-    merged["productive"] = merged.apply(infer_future_label, axis=1)
+    merged["productive"] = _infer_future_labels(merged, ss_df)
 
     merged.drop(columns=["session_change"], inplace=True)
 
@@ -146,16 +177,311 @@ def label_activity_with_productivity(
     merged["productive"] = merged["productive"].apply(
         lambda value: value if value == "unknown" else _coerce_productive(value)
     )
+    return merged
 
-    output_file.parent.mkdir(parents=True, exist_ok=True)
 
-    json_lines = merged.to_json(orient="records", lines=True, date_format="iso")
+def _to_json_lines(df: pd.DataFrame) -> str:
+    if df.empty:
+        return ""
+    json_lines = df.to_json(orient="records", lines=True, date_format="iso")
     if not json_lines.endswith("\n"):
         json_lines += "\n"
+    return json_lines
+
+
+def label_activity_with_productivity(
+    screenshot_path: str,
+    activity_path: str,
+    output_path: str,
+) -> int:
+    screenshot_file = Path(screenshot_path)
+    activity_file = Path(activity_path)
+    output_file = Path(output_path)
 
+    ss_df = _load_jsonl(screenshot_file)
+    act_df = _load_jsonl(activity_file)
+
+    ss_df = _normalise_timestamps(ss_df)
+    act_df = _normalise_timestamps(act_df)
+
+    merged = _label_frames(ss_df, act_df)
+
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+
+    text = _to_json_lines(merged).encode("utf-8")
     tmp = output_file.with_suffix(output_file.suffix + ".tmp")
-    tmp.write_text(json_lines, encoding="utf-8")
+    tmp.write_bytes(text)
     tmp.replace(output_file)
+    update_columns(output_file, None, 0, text, b"")
+
+    return len(merged)
+
+
+def _state_path(output_file: Path) -> Path:
+    return output_file.with_name(output_file.name + ".state.json")
+
+
+def _read_lines_from(path: Path, offset: int) -> tuple[pd.DataFrame, int]:
+    """
+    Parse complete JSONL lines from logical ``offset`` onwards (see log_partitions).
+    Returns rows with their starting byte offset in ``_offset`` and the byte
+    offset just past the last complete line.
+    """
+    read = partitioned_log(path).read_from(offset)
+    chunk, offset = read.data, read.start
+    end = chunk.rfind(b"\n") + 1
+    tail = chunk[end:]
+    if tail.strip():
+        # A final line without a newline is taken once it parses; the writer
+        # may still be mid-line otherwise.
+        try:
+            json.loads(tail.decode("utf-8", errors="replace"))
+            end = len(chunk)
+        except json.JSONDecodeError:
+            pass
+    rows = []
+    position = offset
+    for raw in chunk[:end].splitlines(keepends=True):
+        start, position = position, position + len(raw)
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw.decode("utf-8", errors="replace"))
+        except json.JSONDecodeError:
+            continue
+        if isinstance(row, dict):
+            row["_offset"] = start
+            rows.append(row)
+    return pd.DataFrame(rows), offset + end
+
+
+def _first_offset_at_or_after(df: pd.DataFrame, cutoff: pd.Timestamp, default: int) -> int:
+    later = df.loc[df["timestamp"] >= cutoff, "_offset"] if not df.empty else pd.Series(dtype="int64")
+    return int(later.min()) if not later.empty else default
+
+
+def _pending_rows(rows: pd.DataFrame, text: bytes, start: int) -> list[list]:
+    """
+    [output offset, app, window, timestamp] of the rows in ``text`` (written at
+    byte ``start``) still labelled "unknown" that a later screenshot of the
+    same app and window would label.
+    """
+    if rows.empty:
+        return []
+    lengths = np.fromiter((len(line) for line in text.splitlines(keepends=True)), dtype="int64", count=len(rows))
+    offsets = start + np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    open_rows = (
+        rows["productive"].eq("unknown") & rows["app_name"].notna() & rows["window_title"].notna()
+    ).to_numpy()
+    return [
+        [int(offset), app, window, timestamp.isoformat()]
+        for offset, app, window, timestamp in zip(
+            offsets[open_rows],
+            rows["app_name"].to_numpy()[open_rows],
+            rows["window_title"].to_numpy()[open_rows],
+            rows["timestamp"].loc[open_rows],
+        )
+    ]
+
+
+def _resolve_pending(pending: list[list], ss_df: pd.DataFrame) -> dict[int, Optional[bool]]:
+    """Labels the screenshots in ``ss_df`` give pending rows, keyed by output offset."""
+    if not pending or ss_df.empty:
+        return {}
+    rows = pd.DataFrame(pending, columns=["_out", "app_name_x", "window_title_x", "timestamp"])
+    rows["timestamp"] = pd.to_datetime(rows["timestamp"]).astype(ss_df["timestamp"].dtype)
+    rows = rows.sort_values("timestamp", kind="stable").reset_index(drop=True)
+    rows["productive"] = "unknown"
+    labels = _infer_future_labels(rows, ss_df)
+    found = labels.ne("unknown").to_numpy()
+    return {
+        int(offset): _coerce_productive(value)
+        for offset, value in zip(rows["_out"].to_numpy()[found], labels.to_numpy()[found])
+    }
+
+
+def _copy_bytes(src, dst, count: int) -> None:
+    while count > 0:
+        chunk = src.read(min(count, 1 << 20))
+        if not chunk:
+            raise ValueError("Output is shorter than its committed offset")
+        dst.write(chunk)
+        count -= len(chunk)
+
+
+def _copy_committed(src, dst, length: int, pending: list[list], labels: dict[int, Optional[bool]]) -> list[list]:
+    """
+    Copy the first ``length`` bytes of ``src`` to ``dst``, writing ``labels``
+    into the pending rows they resolve. Returns the rows still pending, at
+    their offsets in ``dst``. Raises ValueError if a row is not where the
+    state says.
+    """
+    remaining = []
+    position = shift = 0
+    for entry in pending:
+        offset = entry[0]
+        if offset not in labels:
+            remaining.append([offset + shift, *entry[1:]])
+            continue
+        _copy_bytes(src, dst, offset - position)
+        line = src.readline()
+        if not line.endswith(UNKNOWN_SUFFIX):
+            raise ValueError(f"No unknown label at byte {offset} of the output")
+        # The label is the last field the combiner writes
+        patched = line[: -len(UNKNOWN_SUFFIX)] + b'"productive":' + json.dumps(labels[offset]).encode("ascii") + b"}\n"
+        dst.write(patched)
+        shift += len(patched) - len(line)
+        position = offset + len(line)
+    _copy_bytes(src, dst, length - position)
+    return remaining
+
+
+def update_metrics_incremental(
+    screenshot_path: str,
+    activity_path: str,
+    output_path: str,
+) -> int:
+    """
+    Incrementally maintain ``output_path`` (metrics.jsonl), producing the same
+    file label_activity_with_productivity() would.
+
+    A watermark state file next to the output records byte offsets into both
+    inputs and the output. Input offsets are logical offsets into the
+    partitioned logs, so rotating an input into daily partitions is not a
+    change. Rows older than the newest activity minus the label tolerance are
+    committed: no later screenshot can change their backward match. Each run
+    re-labels only the uncommitted tail against the screenshots that can
+    still reach it. A committed row left "unknown" can still take the label
+    of the next screenshot of its app and window, however late; the state
+    keeps those rows (output offset, app, window, time) and each run writes
+    the labels new screenshots give them. The output is written to a temp
+    file and swapped in with os.replace(). Truncated or replaced inputs, or an
+    output changed behind our back, trigger a rebuild from zero. The columnar
+    sidecar readers map is extended the same way.
+
+    Returns the number of rows (re)written this run.
+    """
+    screenshot_file = Path(screenshot_path)
+    activity_file = Path(activity_path)
+    output_file = Path(output_path)
+    state_file = _state_path(output_file)
+
+    for path in (screenshot_file, activity_file):
+        _check_input(path)
+
+    act_stat = activity_file.stat()
+    ss_stat = screenshot_file.stat()
+    # Logical sizes: daily partitions plus the hot file
+    act_size = partitioned_log(activity_file).end()
+    ss_size = partitioned_log(screenshot_file).end()
+    out_stat = output_file.stat() if output_file.exists() else None
+
+    state = None
+    if state_file.exists():
+        try:
+            state = json.loads(state_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            state = None
+
+    def valid(section: str, stat, size: int) -> bool:
+        info = (state or {}).get(section) or {}
+        return (
+            stat is not None
+            and info.get("inode") == stat.st_ino
+            and info.get("committed", 0) <= info.get("end", -1) <= size
+        )
+
+    resume = (
+        state is not None
+        and state.get("version") == STATE_VERSION
+        and valid("activity", act_stat, act_size)
+        and valid("screenshots", ss_stat, ss_size)
+        and out_stat is not None
+        and state["output"].get("inode") == out_stat.st_ino
+        and state["output"].get("end") == out_stat.st_size
+    )
+    if resume:
+        if act_size == state["activity"]["end"] and ss_size == state["screenshots"]["end"]:
+            return 0
+    else:
+        if state is not None:
+            LOG.info("Combiner state invalid or inputs rotated; rebuilding %s", output_file)
+        state = {
+            "version": STATE_VERSION,
+            "activity": {"committed": 0},
+            "screenshots": {"committed": 0},
+            "output": {"committed": 0},
+            "pending": [],
+        }
+
+    act_df, act_end = _read_lines_from(activity_file, state["activity"]["committed"])
+    ss_df, ss_end = _read_lines_from(screenshot_file, state["screenshots"]["committed"])
+    if act_df.empty or "timestamp" not in act_df.columns:
+        return 0
+
+    act_df = _normalise_timestamps(act_df)
+    if ss_df.empty or "timestamp" not in ss_df.columns:
+        ss_df = pd.DataFrame(columns=["timestamp", "app_name", "window_title", "productive", "_offset"])
+        ss_df["timestamp"] = pd.to_datetime(ss_df["timestamp"])
+    else:
+        ss_df = _normalise_timestamps(ss_df)
+    if act_df.empty:
+        return 0
+
+    screenshots = ss_df.drop(columns=["_offset"])
+    merged = _label_frames(screenshots, act_df)
+    labels = _resolve_pending(state["pending"], screenshots)
+
+    # Later screenshots are stamped at capture time, so they can only reach rows
+    # within the label tolerance of the newest activity.
+    cutoff = act_df["timestamp"].max() - LABEL_TOLERANCE
+    act_committed = _first_offset_at_or_after(act_df, cutoff, act_end)
+    ss_committed = _first_offset_at_or_after(ss_df, cutoff - LABEL_TOLERANCE, ss_end)
+
+    done = merged["_offset"] < act_committed
+    committed_rows = merged.loc[done].drop(columns=["_offset"])
+    committed_text = _to_json_lines(committed_rows).encode("utf-8")
+    tail_text = _to_json_lines(merged.loc[~done].drop(columns=["_offset"])).encode("utf-8")
+
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    previous = (out_stat.st_ino, out_stat.st_size, out_stat.st_mtime_ns) if out_stat is not None else None
+    tmp = output_file.with_suffix(output_file.suffix + ".tmp")
+    try:
+        with tmp.open("wb") as dst:
+            pending = []
+            if state["output"]["committed"]:
+                with output_file.open("rb") as src:
+                    pending = _copy_committed(src, dst, state["output"]["committed"], state["pending"], labels)
+            start = dst.tell()
+            dst.write(committed_text)
+            output_committed = dst.tell()
+            dst.write(tail_text)
+            output_end = dst.tell()
+    except ValueError as exc:
+        tmp.unlink(missing_ok=True)
+        LOG.warning("Combiner output disagrees with its state (%s); rebuilding %s", exc, output_file)
+        state_file.unlink(missing_ok=True)
+        return update_metrics_incremental(screenshot_path, activity_path, output_path)
+    tmp.replace(output_file)
+    # Labels written into committed rows invalidate the sidecar's committed part
+    update_columns(output_file, None if labels else previous, start, committed_text, tail_text)
+
+    state.update(
+        {
+            "activity": {"inode": act_stat.st_ino, "committed": act_committed, "end": act_end},
+            "screenshots": {"inode": ss_stat.st_ino, "committed": ss_committed, "end": ss_end},
+            "output": {
+                "inode": output_file.stat().st_ino,
+                "committed": output_committed,
+                "end": output_end,
+            },
+            "pending": pending + _pending_rows(committed_rows, committed_text, start),
+            "watermark": cutoff.isoformat(),
+        }
+    )
+    tmp = state_file.with_suffix(state_file.suffix + ".tmp")
+    tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    tmp.replace(state_file)
 
     return len(merged)
 
@@ -164,7 +490,8 @@ def _run_loop(args) -> None:
     interval = max(1, args.interval)
     while True:
         try:
-            count = label_activity_with_productivity(
+            combine = label_activity_with_productivity if args.full else update_metrics_incremental
+            count = combine(
                 args.screenshot_path,
                 args.activity_path,
                 args.output_path,
@@ -184,6 +511,7 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument("--output-path", default="../../../../data-backend/metrics.jsonl")
     parser.add_argument("--interval", type=int, default=60, help="Seconds between runs when looping")
     parser.add_argument("--once", action="store_true", help="Run a single update then exit")
+    parser.add_argument("--full", action="store_true", help="Rebuild the whole output instead of appending")
     return parser
 
 
@@ -1,4 +1,4 @@
-from .analyze import analyze_screenshot
+from .analyze import analyze_screenshot, analyze_status
 from .overlay_assist import overlay_assist_view
 
-__all__ = ["analyze_screenshot", "overlay_assist_view"]
+__all__ = ["analyze_screenshot", "analyze_status", "overlay_assist_view"]
@@ -3,15 +3,16 @@ import re, os
 from datetime import datetime
 from pathlib import Path
 from django.http import JsonResponse
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
 from django.utils import timezone
 import sys, subprocess
 from pathlib import Path
 import sys, subprocess
 from pathlib import Path
-from ..utils.gemini_api import analyze_image
+from ..services.analyze_jobs import QueueFull, analyze_queue, analyze_stats, job_status, pending_path
 from ..services.paths import BASE_DIR, SCREENSHOT_DIR, HISTORY_FILE
-from ..services.history_store import append_history
 
 def _sanitize_filename(name: str) -> str:
     import os, re
@@ -28,6 +29,9 @@ def _rel_or_abs(p: Path, base: Path) -> str:
 
 @csrf_exempt
 def analyze_screenshot(request):
+    if request.method == "GET":
+        # Queue depth and label cache hit/miss counts
+        return JsonResponse(analyze_stats())
     if request.method != "POST":
         return JsonResponse({"error": "Use POST"}, status=405)
 
@@ -40,34 +44,49 @@ def analyze_screenshot(request):
         "Return JSON with keys app_name, window_title, productive (true/false).",
     )
 
-    # Save file
+    jobs = analyze_queue()
+    if jobs.full():
+        return _queue_full(jobs.retry_after())
+
+    # Save under a name of its own: the next upload may reuse this filename
+    # before the job runs. The worker moves it to SCREENSHOT_DIR/<name> after.
     safe_name = _sanitize_filename(upload.name)
     abs_path: Path = SCREENSHOT_DIR / safe_name
-    with abs_path.open("wb") as out:
+    pending = pending_path(safe_name)
+    with pending.open("wb") as out:
         for chunk in upload.chunks():
             out.write(chunk)
 
-    # Analyze with Gemini -> dict with app_name, window_title, productive
-    result = analyze_image(str(abs_path), prompt)
-
-    # Local timestamp to seconds
-    ts = timezone.localtime(timezone.now()).replace(microsecond=0).isoformat(timespec="seconds")
-
-    # Minimal entry you want to persist
-    entry = {
-        "timestamp": ts,
-        "app_name": result.get("app_name", "unknown"),
-        "window_title": result.get("window_title", "unknown"),
-        "productive": result.get("productive", None),
-    }
-
-    # Append ONLY; no reads
-    append_history(entry)
+    # Gemini classification and the q_analysis.jsonl append happen in a worker;
+    # the entry's timestamp is taken now, on arrival, so labels keep capture order
+    try:
+        job = jobs.submit(pending, abs_path, prompt)
+    except QueueFull as exc:
+        pending.unlink(missing_ok=True)
+        return _queue_full(exc.retry_after)
 
-    # Return a simple acknowledgment
-    return JsonResponse({
+    status_url = reverse("analyze-status", args=[job.id])
+    response = JsonResponse({
+        "id": job.id,
+        "status": job.status,
+        "status_url": status_url,
         "saved_to": _rel_or_abs(HISTORY_FILE, BASE_DIR),
         "file_path_rel": abs_path.relative_to(BASE_DIR).as_posix(),
         "filename": safe_name,
-        "entry": entry
-    })
+        "timestamp": job.timestamp,
+    }, status=202)
+    response["Location"] = status_url
+    return response
+
+def _queue_full(retry_after: int) -> JsonResponse:
+    response = JsonResponse({"error": "Analyze queue is full", "retry_after": retry_after}, status=503)
+    response["Retry-After"] = str(retry_after)
+    return response
+
+@require_GET
+def analyze_status(request, job_id: str):
+    """Where an analyze job is: queued, running, done (with its entry and seq) or failed."""
+    status = job_status(job_id)
+    if status is None:
+        return JsonResponse({"error": "Unknown job"}, status=404)
+    return JsonResponse(status)
@@ -1,19 +1,138 @@
 from __future__ import annotations
 
-from django.http import JsonResponse
+import asyncio
+from datetime import datetime, time, timedelta
+from typing import Iterable, Optional
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.views.decorators.http import require_GET
 
-from ..services.dashboard_data import build_dashboard_payload
+from ..services.dashboard_cache import cached_response, etag_matches
+from ..services.dashboard_data import (
+    SECTIONS,
+    DashboardQuery,
+    build_dashboard_payload,
+    section_inputs,
+    section_versions,
+)
+from ..services.live_updates import HEARTBEAT_SECONDS, HUB
+
+
+def _parse_bound(value: Optional[str], param: str, end: bool) -> Optional[int]:
+    """
+    Epoch seconds for a ``from``/``to`` value. A date covers the whole local
+    day (``to`` is inclusive); a naive datetime is local time.
+    """
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+        moment = parse_datetime(value) if day is None else None
+    except ValueError:
+        day = moment = None
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    if moment is None:
+        raise ValueError(f"'{param}' must be an ISO date or datetime, got {value!r}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, timezone.get_current_timezone())
+    return int(moment.timestamp())
+
+
+def _dashboard_query(request) -> DashboardQuery:
+    """``?from=&to=&granularity=hour|day|week``; raises ValueError for bad values."""
+    params = request.GET
+    return DashboardQuery(
+        start=_parse_bound(params.get("from"), "from", end=False),
+        stop=_parse_bound(params.get("to"), "to", end=True),
+        granularity=params.get("granularity") or "hour",
+    )
+
+
+def _cached_payload_response(request, sections: Optional[Iterable[str]]) -> HttpResponse:
+    names = tuple(SECTIONS) if sections is None else tuple(name for name in SECTIONS if name in set(sections))
+    try:
+        query = _dashboard_query(request)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    # Rebuilt only when an input of the requested sections changed (or, for
+    # settings, a background task ran); polls in between get the same bytes
+    entry = cached_response(
+        ("dashboard", names, query),
+        lambda: build_dashboard_payload(names, query),
+        section_inputs(names),
+        lambda: section_versions(names),
+    )
+    if etag_matches(request.headers.get("If-None-Match"), entry.etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entry.body, content_type="application/json")
+    response["ETag"] = entry.etag
+    response["Cache-Control"] = "no-cache"
+    return response
 
 
 @require_GET
 def dashboard_summary(request):
-    payload = build_dashboard_payload()
-    return JsonResponse(
-        {
-            "data": payload,
-            "generated_at": timezone.now().isoformat(),
-        }
-    )
+    sections = None
+    raw = request.GET.get("sections")
+    if raw:
+        sections = [name.strip() for name in raw.split(",") if name.strip()]
+        unknown = sorted(set(sections) - SECTIONS.keys())
+        if unknown:
+            return JsonResponse(
+                {"error": f"Unknown section(s): {', '.join(unknown)}", "sections": list(SECTIONS)},
+                status=400,
+            )
+    return _cached_payload_response(request, sections)
+
 
+@require_GET
+def dashboard_section(request, section: str):
+    if section not in SECTIONS:
+        raise Http404(f"Unknown dashboard section: {section}")
+    return _cached_payload_response(request, [section])
+
+
+_SSE_HELLO = b"retry: 3000\nevent: hello\ndata: {}\n\n"
+_SSE_HEARTBEAT = b": keepalive\n\n"
+
+
+def _sync_stream():
+    subscription = HUB.subscribe()
+    try:
+        yield _SSE_HELLO
+        while not subscription.closed:
+            message = subscription.get(HEARTBEAT_SECONDS)
+            yield message.encode() if message else _SSE_HEARTBEAT
+    finally:
+        subscription.close()
+
+
+async def _async_stream():
+    # The first subscriber primes the hub from the activity log, so not on the loop
+    subscription = await asyncio.to_thread(HUB.subscribe, asyncio.get_running_loop())
+    try:
+        yield _SSE_HELLO
+        while not subscription.closed:
+            message = await subscription.get_async(HEARTBEAT_SECONDS)
+            yield message.encode() if message else _SSE_HEARTBEAT
+    finally:
+        subscription.close()
+
+
+@require_GET
+def dashboard_stream(request):
+    """
+    Server-sent events with live dashboard deltas (see services.live_updates).
+    Under ASGI (pyproj/asgi.py) an idle connection awaits an asyncio.Queue on
+    the event loop and holds no thread; under WSGI each open stream holds one.
+    """
+    stream = _async_stream if isinstance(request, ASGIRequest) else _sync_stream
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
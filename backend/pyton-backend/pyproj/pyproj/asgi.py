@@ -3,6 +3,10 @@ ASGI config for pyproj project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (``uvicorn pyproj.asgi:application``) so the
+/api/dashboard/stream/ server-sent events feed holds no worker thread per
+idle client.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from corsheaders.defaults import default_headers
 
@@ -102,6 +103,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # WAL lets dashboard reads proceed while the importer writes
+        'OPTIONS': {'init_command': 'PRAGMA journal_mode=WAL;PRAGMA synchronous=NORMAL'},
     }
 }
 
@@ -160,3 +163,22 @@ SPECTACULAR_SETTINGS = {
     'DESCRIPTION': 'Endpoints for screenshot analysis, overlay assist, and dashboard data.',
     'VERSION': '1.0.0',
 }
+
+# Days of activity and screenshot-label history kept in the daily log partitions
+TRACKLET_RETENTION_DAYS = int(os.environ.get("TRACKLET_RETENTION_DAYS", "30"))
+
+# Where the dashboard reads activity rows and screenshot labels: "jsonl" (the
+# files under data-backend) or "sqlite" (indexed tables in the default database,
+# filled from those files; see pyapp/services/sql_store.py)
+TRACKLET_STORAGE_BACKEND = os.environ.get("TRACKLET_STORAGE_BACKEND", "jsonl")
+
+# POST /api/analyze/ classifies screenshots in this many worker threads; uploads
+# beyond the queue size are refused with 503 and Retry-After
+TRACKLET_ANALYZE_WORKERS = int(os.environ.get("TRACKLET_ANALYZE_WORKERS", "4"))
+TRACKLET_ANALYZE_QUEUE_SIZE = int(os.environ.get("TRACKLET_ANALYZE_QUEUE_SIZE", "32"))
+
+# A screenshot whose perceptual hash is within this many bits (of 256) of one
+# classified in the last TTL seconds reuses its label; a TTL of 0 turns the
+# cache off (see pyapp/services/label_cache.py)
+TRACKLET_LABEL_CACHE_TTL = float(os.environ.get("TRACKLET_LABEL_CACHE_TTL", "300"))
+TRACKLET_LABEL_CACHE_DISTANCE = int(os.environ.get("TRACKLET_LABEL_CACHE_DISTANCE", "6"))
@@ -16,7 +16,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pyproj.settings')
 django.setup()
 
 from pyapp.services.activity_processor import (
-    load_activity_data,
+    load_activity_frame,
     build_overview_data,
     build_timeline_data,
     compute_hourly_productivity,
@@ -30,7 +30,7 @@ def main():
     
     # Load activities
     print("\n1. Loading activity.jsonl...")
-    activities = load_activity_data()
+    activities = load_activity_frame()
     print(f"   Loaded {len(activities)} activity records")
     
     if activities:
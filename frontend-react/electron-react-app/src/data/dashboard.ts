@@ -328,10 +328,21 @@ export type SettingsData = {
   }
   monitorStatus?: {
     unproductive_streak?: boolean
+    streak_started_at?: string | null
+    window_minutes?: number
+    latest_timestamp?: string | null
     checked_at?: string
+    last_event?: MonitorEvent | null
+    events?: MonitorEvent[]
   }
 }
 
+export type MonitorEvent = {
+  type: "streak_start" | "streak_end"
+  at: string | null
+  detected_at: string
+}
+
 export type PartialDashboardData = Partial<DashboardData>
 
 export type DashboardData = {